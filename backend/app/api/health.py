@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from backend.app.services.health import health
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness: fails only when a restart is the fix (producer loop stuck)."""
+    problems = health.liveness_problems()
+    return JSONResponse(
+        status_code=503 if problems else 200,
+        content={"status": "fail" if problems else "ok", "problems": problems, **health.status()},
+    )
+
+
+@router.get("/readyz")
+async def readyz():
+    """Readiness: warmup done, producer running and the feed fresh during trading hours."""
+    problems = health.readiness_problems()
+    return JSONResponse(
+        status_code=503 if problems else 200,
+        content={"status": "fail" if problems else "ok", "problems": problems},
+    )
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from backend.app.services.tick_store import parse_day_time, tick_store
+
+router = APIRouter(prefix="/api/history", tags=["history"])
+
+
+def _open_day(date: Optional[str]):
+    key = date or tick_store.day_key()
+    if len(key) != 8 or not key.isdigit():
+        raise HTTPException(status_code=400, detail="date must be YYYYMMDD")
+    tick_day = tick_store.day(key)
+    if tick_day is None:
+        raise HTTPException(status_code=404, detail=f"No tick history for {key}")
+    return key, tick_day
+
+
+def _parse_time(key: str, value: Optional[str], default: float) -> float:
+    if not value:
+        return default
+    try:
+        return parse_day_time(key, value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time '{value}', expected HH:MM or HH:MM:SS")
+
+
+@router.get("/days")
+def history_days():
+    return {"days": tick_store.available_days()}
+
+
+@router.get("/ticks/{code}")
+async def symbol_series(
+    code: str,
+    date: Optional[str] = Query(None, description="Trading day YYYYMMDD (default today)"),
+    start: Optional[str] = Query(None, description="HH:MM[:SS]"),
+    end: Optional[str] = Query(None, description="HH:MM[:SS]"),
+):
+    key, tick_day = _open_day(date)
+    start_ts = _parse_time(key, start, 0.0)
+    end_ts = _parse_time(key, end, float("inf"))
+    series = await asyncio.to_thread(tick_day.symbol_series, code, start_ts, end_ts)
+    return {"code": code, "date": key, "count": len(series["ts"]), **series}
+
+
+@router.get("/cross-section")
+async def cross_section(
+    at: str = Query(..., description="HH:MM[:SS]"),
+    date: Optional[str] = Query(None, description="Trading day YYYYMMDD (default today)"),
+    codes: Optional[str] = Query(None, description="Comma-separated codes (default: all)"),
+    max_age: Optional[float] = Query(None, ge=0, description="Drop quotes older than this many seconds"),
+):
+    key, tick_day = _open_day(date)
+    at_ts = _parse_time(key, at, datetime.now().timestamp())
+    code_list = [c.strip() for c in codes.split(",") if c.strip()] if codes else None
+    rows = await asyncio.to_thread(tick_day.cross_section, at_ts, code_list, max_age)
+    return {"date": key, "at": at, "count": len(rows), "quotes": rows}
@@ -0,0 +1,63 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response
+
+from backend.app.services.frame_ring import require_producer_process
+from backend.app.services.market_view import MARKET_BULK_MAX_CODES, EncodedBody, market_view
+from backend.app.services.websocket_manager import manager
+
+router = APIRouter(prefix="/api/market", tags=["market"])
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _conditional(request: Request, etag: str, encoded: Optional[EncodedBody] = None) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoded is None:
+        raise ValueError("body required for a 200 response")
+    headers["X-Snapshot-Version"] = str(encoded[2])
+    return Response(content=encoded[1], media_type="application/json", headers=headers)
+
+
+@router.get("/selection")
+async def selection(
+    request: Request,
+    index: Optional[str] = Query(None, description="HS300 / ZZ500 / ZZ1000 / ZZ2000 (default: all)"),
+):
+    updated_at = manager.last_update_time.isoformat(timespec="seconds") if manager.has_data() else None
+    encoded = market_view.selection(manager.last_snapshot, manager.snapshot_version, updated_at, index)
+    return _conditional(request, encoded[0], encoded)
+
+
+@router.get("/quote/{code}", dependencies=[Depends(require_producer_process)])
+async def quote(request: Request, code: str):
+    encoded = market_view.quote(code)
+    if encoded is None:
+        raise HTTPException(status_code=404, detail=f"No cached quote for {code}")
+    return _conditional(request, encoded[0], encoded)
+
+
+@router.get("/quotes", dependencies=[Depends(require_producer_process)])
+async def quotes(
+    request: Request,
+    codes: str = Query(..., description="Comma-separated codes"),
+):
+    code_list = list(dict.fromkeys(c.strip() for c in codes.split(",") if c.strip()))
+    if not code_list:
+        raise HTTPException(status_code=400, detail="codes must not be empty")
+    if len(code_list) > MARKET_BULK_MAX_CODES:
+        raise HTTPException(status_code=400, detail=f"At most {MARKET_BULK_MAX_CODES} codes per request")
+    # The ETag only needs version numbers, so a matching poll never builds the body.
+    etag = market_view.bulk_etag(code_list)
+    if _not_modified(request, etag):
+        return _conditional(request, etag)
+    return _conditional(request, etag, market_view.quotes_body(code_list))
@@ -1,8 +1,27 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
 
+from typing import Dict
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from backend.app.core.metrics import metrics
+from backend.app.core.startup import startup_timer
+from backend.app.core.profiler import (
+    PROFILER_ENABLED,
+    PROFILER_MAX_SECONDS,
+    ProfilerBusyError,
+    loop_lag_monitor,
+    profiler,
+)
+from backend.app.services.fetch_tuner import fetch_tuner
+from backend.app.services.frame_ring import require_producer_process
+from backend.app.services.scoring import scoring_registry
+from backend.app.services.websocket_manager import manager
 from backend.app.services.producer_task import (
     get_available_profiles,
     get_runtime_policy,
+    regime_controller,
     set_runtime_profile,
 )
 
@@ -14,14 +33,89 @@ def polling_profiles():
     return {"profiles": get_available_profiles()}
 
 
-@router.get("/polling-config")
+@router.get("/polling-config", dependencies=[Depends(require_producer_process)])
 def polling_config():
-    return get_runtime_policy()
+    policy = get_runtime_policy()
+    return {**policy, "scoring": scoring_registry.strategy_for(policy).name, "fetch_tuning": fetch_tuner.status()}
 
 
-@router.post("/polling-profile/{profile}")
+@router.post("/polling-profile/{profile}", dependencies=[Depends(require_producer_process)])
 def switch_polling_profile(profile: str):
     try:
         return set_runtime_profile(profile)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/regime", dependencies=[Depends(require_producer_process)])
+def regime_status():
+    return regime_controller.status()
+
+
+@router.post("/regime/thresholds", dependencies=[Depends(require_producer_process)])
+def update_regime_thresholds(overrides: Dict[str, float] = Body(...)):
+    try:
+        return {"thresholds": regime_controller.update_thresholds(overrides)}
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/scoring")
+def scoring_status():
+    return scoring_registry.status()
+
+
+@router.put("/scoring/strategies/{name}", dependencies=[Depends(require_producer_process)])
+def put_scoring_strategy(name: str, body: Dict[str, str] = Body(...)):
+    try:
+        return scoring_registry.register(name, body.get("expression", ""), body.get("description", "")).to_dict()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.delete("/scoring/strategies/{name}", dependencies=[Depends(require_producer_process)])
+def delete_scoring_strategy(name: str):
+    try:
+        scoring_registry.remove(name)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return scoring_registry.status()
+
+
+@router.post("/scoring/profiles", dependencies=[Depends(require_producer_process)])
+def select_scoring_strategies(mapping: Dict[str, str] = Body(...)):
+    try:
+        return {"by_profile": scoring_registry.select_for_profiles(mapping)}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/startup")
+def startup_report():
+    return startup_timer.report()
+
+
+@router.get("/metrics")
+def runtime_metrics():
+    return {
+        **metrics.snapshot(),
+        "clients": manager.get_client_stats(),
+        "event_loop": loop_lag_monitor.status(),
+    }
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def sample_profile(
+    seconds: float = Query(5.0, gt=0),
+    interval_ms: float = Query(10.0, ge=1.0, le=1000.0),
+    thread: str = "",
+):
+    """Collapsed-stack wall-clock profile (feed to flamegraph.pl or speedscope)."""
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiler disabled. Set ENABLE_PROFILER=true to enable.")
+    duration = min(seconds, PROFILER_MAX_SECONDS)
+    try:
+        collapsed = await asyncio.to_thread(profiler.profile, duration, interval_ms / 1000.0, thread)
+    except ProfilerBusyError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return PlainTextResponse(collapsed)
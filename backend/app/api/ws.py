@@ -1,5 +1,5 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from backend.app.services.websocket_manager import manager
+from backend.app.services.websocket_manager import heatmap_manager, manager
 
 router = APIRouter()
 
@@ -8,11 +8,26 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            # Keep connection alive, maybe handle client heartbeat
-            # We mostly push data, but receive pong
-            await websocket.receive_text()
+            # Heartbeats and subscription messages (see ConnectionManager.handle_client_message)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            data = message.get("text")
+            await manager.handle_client_message(websocket, data if data is not None else message.get("bytes"))
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         # Handle other exceptions
         manager.disconnect(websocket)
+
+
+@router.websocket("/ws/heatmap")
+async def heatmap_endpoint(websocket: WebSocket):
+    await heatmap_manager.connect(websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        heatmap_manager.disconnect(websocket)
+    except Exception:
+        heatmap_manager.disconnect(websocket)
@@ -0,0 +1,206 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# Seconds. Covers sub-millisecond ranking passes up to multi-second provider stalls.
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _HistogramState:
+    __slots__ = ("bucket_counts", "count", "total")
+
+    def __init__(self, bucket_count: int):
+        self.bucket_counts = [0] * (bucket_count + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process registry for counters, gauges and fixed-bucket histograms.
+    Producer worker threads and the event loop both record into it; rendering is
+    done on demand by the /metrics and /api/runtime/metrics endpoints.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauge_callbacks: Dict[str, Callable[[], float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _HistogramState]] = {}
+
+    # --- Declaration ---
+
+    def describe_counter(self, name: str, help_text: str) -> None:
+        with self._lock:
+            self._meta[name] = ("counter", help_text)
+            self._counters.setdefault(name, {})
+
+    def describe_gauge(self, name: str, help_text: str) -> None:
+        with self._lock:
+            self._meta[name] = ("gauge", help_text)
+            self._gauges.setdefault(name, {})
+
+    def describe_histogram(
+        self,
+        name: str,
+        help_text: str,
+        buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        with self._lock:
+            self._meta[name] = ("histogram", help_text)
+            self._buckets[name] = tuple(sorted(buckets))
+            self._histograms.setdefault(name, {})
+
+    def register_gauge_callback(self, name: str, help_text: str, fn: Callable[[], float]) -> None:
+        """Gauge evaluated lazily at render time (e.g. rate limiter usage)."""
+        with self._lock:
+            self._meta[name] = ("gauge", help_text)
+            self._gauge_callbacks[name] = fn
+
+    # --- Recording ---
+
+    def inc(self, name: str, amount: float = 1.0, **labels: object) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: object) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = float(value)
+
+    def observe(self, name: str, value: float, **labels: object) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            buckets = self._buckets.get(name)
+            if buckets is None:
+                buckets = DEFAULT_LATENCY_BUCKETS
+                self._buckets[name] = buckets
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = _HistogramState(len(buckets))
+                series[key] = state
+            state.bucket_counts[bisect.bisect_left(buckets, value)] += 1
+            state.count += 1
+            state.total += value
+
+    @contextmanager
+    def timer(self, name: str, **labels: object) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # --- Rendering ---
+
+    @staticmethod
+    def _quantile(buckets: Tuple[float, ...], state: _HistogramState, q: float) -> float:
+        """Upper-bound estimate of quantile q from bucket counts."""
+        if state.count == 0:
+            return 0.0
+        rank = q * state.count
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, state.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return buckets[-1] if buckets else 0.0
+
+    def _evaluate_callbacks(self) -> Dict[str, float]:
+        with self._lock:
+            callbacks = dict(self._gauge_callbacks)
+        values: Dict[str, float] = {}
+        for name, fn in callbacks.items():
+            try:
+                values[name] = float(fn())
+            except Exception:
+                continue
+        return values
+
+    def render_prometheus(self) -> str:
+        callback_values = self._evaluate_callbacks()
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._meta):
+                metric_type, help_text = self._meta[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+
+                if metric_type == "counter":
+                    for key, value in self._counters.get(name, {}).items():
+                        lines.append(f"{name}{_format_labels(key)} {value:g}")
+                elif metric_type == "gauge":
+                    if name in callback_values:
+                        lines.append(f"{name} {callback_values[name]:g}")
+                    for key, value in self._gauges.get(name, {}).items():
+                        lines.append(f"{name}{_format_labels(key)} {value:g}")
+                else:
+                    buckets = self._buckets[name]
+                    for key, state in self._histograms.get(name, {}).items():
+                        cumulative = 0
+                        for bound, bucket_count in zip(buckets, state.bucket_counts):
+                            cumulative += bucket_count
+                            lines.append(
+                                f"{name}_bucket{_format_labels(key, (('le', f'{bound:g}'),))} {cumulative}"
+                            )
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {state.count}")
+                        lines.append(f"{name}_sum{_format_labels(key)} {state.total:.6f}")
+                        lines.append(f"{name}_count{_format_labels(key)} {state.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, object]:
+        """JSON-friendly view with count/avg/p50/p90/p99 per histogram series."""
+        callback_values = self._evaluate_callbacks()
+        result: Dict[str, object] = {"counters": {}, "gauges": {}, "histograms": {}}
+        with self._lock:
+            for name, series in self._counters.items():
+                result["counters"][name] = [
+                    {"labels": dict(key), "value": value} for key, value in series.items()
+                ]
+            for name, series in self._gauges.items():
+                result["gauges"][name] = [
+                    {"labels": dict(key), "value": value} for key, value in series.items()
+                ]
+            for name, value in callback_values.items():
+                result["gauges"].setdefault(name, []).append({"labels": {}, "value": value})
+            for name, series in self._histograms.items():
+                buckets = self._buckets[name]
+                rows = []
+                for key, state in series.items():
+                    rows.append({
+                        "labels": dict(key),
+                        "count": state.count,
+                        "avg_ms": round(state.total / state.count * 1000.0, 3) if state.count else 0.0,
+                        "p50_ms": round(self._quantile(buckets, state, 0.50) * 1000.0, 3),
+                        "p90_ms": round(self._quantile(buckets, state, 0.90) * 1000.0, 3),
+                        "p99_ms": round(self._quantile(buckets, state, 0.99) * 1000.0, 3),
+                    })
+                result["histograms"][name] = rows
+        return result
+
+
+metrics = MetricsRegistry()
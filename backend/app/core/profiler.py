@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Dict, Optional
+
+from backend.app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILER_ENABLED = os.getenv("ENABLE_PROFILER", "false").lower() == "true"
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+LOOP_LAG_MONITOR = os.getenv("LOOP_LAG_MONITOR", "true").lower() == "true"
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.1"))
+LOOP_LAG_THRESHOLD_SECONDS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "250")) / 1000.0
+
+metrics.describe_histogram(
+    "tidesonar_event_loop_lag_seconds",
+    "Extra delay of a periodic loop heartbeat (how long callbacks held the event loop).",
+)
+metrics.describe_counter("tidesonar_event_loop_stalls_total", "Heartbeats late by more than the stall threshold.")
+
+_THREAD_SUFFIX = re.compile(r"[_-]\d+(_\d+)?$")
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+def _thread_group(name: str, ident: int, loop_ident: Optional[int]) -> str:
+    """Collapse numbered pool threads (asyncio_3, biying-fetch_12) into one flamegraph root."""
+    if ident == loop_ident:
+        return "event-loop"
+    if name.startswith("asyncio_"):
+        return "to_thread-worker"
+    return _THREAD_SUFFIX.sub("", name) or name
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Wall-clock stack sampler built on sys._current_frames().
+    Covers the event loop thread and every worker thread (asyncio.to_thread pool,
+    Biying fetch pool). Output is Brendan Gregg's collapsed-stack format, which
+    flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self):
+        self._busy = threading.Lock()
+        self.loop_thread_ident: Optional[int] = None
+
+    def profile(self, seconds: float, interval_seconds: float = 0.01, thread_filter: str = "") -> str:
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            stacks = self._sample(seconds, interval_seconds, thread_filter)
+        finally:
+            self._busy.release()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+    def _sample(self, seconds: float, interval_seconds: float, thread_filter: str) -> Counter:
+        own_ident = threading.get_ident()
+        stacks: Counter = Counter()
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline:
+            names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, f"thread-{ident}")
+                if ident == own_ident or name == "loop-lag-watchdog":
+                    continue
+                group = _thread_group(name, ident, self.loop_thread_ident)
+                if thread_filter and thread_filter not in group:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(group)
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval_seconds)
+
+        return stacks
+
+
+class LoopLagMonitor:
+    """
+    Heartbeat coroutine + watchdog thread.
+    The coroutine measures how late each periodic wake-up is (event loop lag).
+    The watchdog notices a heartbeat that stopped beating and logs the loop
+    thread's current stack, i.e. the callback that is blocking it.
+    """
+
+    def __init__(self, interval_seconds: float, threshold_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.threshold_seconds = threshold_seconds
+        self.max_lag_seconds = 0.0
+        self.stall_count = 0
+        self._last_beat = time.monotonic()
+        self._loop_ident: Optional[int] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    async def run(self):
+        self._loop_ident = threading.get_ident()
+        profiler.loop_thread_ident = self._loop_ident
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(
+            "Event loop lag monitor started (interval=%.0fms threshold=%.0fms)",
+            self.interval_seconds * 1000,
+            self.threshold_seconds * 1000,
+        )
+        try:
+            while True:
+                expected = time.monotonic() + self.interval_seconds
+                self._last_beat = time.monotonic()
+                await asyncio.sleep(self.interval_seconds)
+                lag = max(0.0, time.monotonic() - expected)
+                metrics.observe("tidesonar_event_loop_lag_seconds", lag)
+                self.max_lag_seconds = max(self.max_lag_seconds, lag)
+                if lag > self.threshold_seconds:
+                    self.stall_count += 1
+                    metrics.inc("tidesonar_event_loop_stalls_total")
+                    logger.warning("Event loop blocked for %.0fms", lag * 1000)
+        finally:
+            self._stop.set()
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.threshold_seconds / 2):
+            beat = self._last_beat
+            if beat == reported_beat:
+                continue
+            stalled_for = time.monotonic() - beat - self.interval_seconds
+            if stalled_for <= self.threshold_seconds:
+                continue
+            frame = sys._current_frames().get(self._loop_ident)
+            if frame is None:
+                continue
+            reported_beat = beat
+            stack = "".join(traceback.format_stack(frame, limit=12))
+            logger.warning("Event loop stalled >%.0fms, current stack:\n%s", stalled_for * 1000, stack)
+
+    def status(self) -> Dict[str, float | int]:
+        return {
+            "interval_ms": round(self.interval_seconds * 1000, 1),
+            "threshold_ms": round(self.threshold_seconds * 1000, 1),
+            "max_lag_ms": round(self.max_lag_seconds * 1000, 3),
+            "stall_count": self.stall_count,
+        }
+
+
+profiler = SamplingProfiler()
+loop_lag_monitor = LoopLagMonitor(LOOP_LAG_INTERVAL_SECONDS, LOOP_LAG_THRESHOLD_SECONDS)
@@ -0,0 +1,75 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from backend.app.core.metrics import metrics
+
+metrics.describe_gauge("tidesonar_startup_phase_seconds", "Duration of each startup phase.")
+metrics.describe_gauge("tidesonar_startup_ready_seconds", "Seconds from process start until warmup finished.")
+
+
+class StartupTimer:
+    """
+    Per-phase startup timing (imports, lifespan, warmup steps) and readiness.
+
+    Offsets are measured from the first import of this module, which `main.py`
+    does before anything else. Phases may run in worker threads.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.phases: List[Dict[str, object]] = []
+        self.milestones: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def offset(self) -> float:
+        return time.perf_counter() - self.started
+
+    def record(self, name: str, seconds: float, started_offset: Optional[float] = None) -> None:
+        if started_offset is None:
+            started_offset = self.offset() - seconds
+        with self._lock:
+            self.phases.append({"name": name, "start": round(started_offset, 4), "seconds": round(seconds, 4)})
+        metrics.set_gauge("tidesonar_startup_phase_seconds", seconds, phase=name)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started_offset = self.offset()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, started_offset)
+
+    def milestone(self, name: str) -> None:
+        """Record the first time something happens (e.g. first snapshot)."""
+        with self._lock:
+            self.milestones.setdefault(name, round(self.offset(), 4))
+
+    def mark_ready(self) -> None:
+        if self.ready_after is None:
+            self.ready_after = self.offset()
+            metrics.set_gauge("tidesonar_startup_ready_seconds", self.ready_after)
+
+    def is_ready(self) -> bool:
+        return self.ready_after is not None
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            phases = list(self.phases)
+            milestones = dict(self.milestones)
+        return {
+            "started_at": self.started_at,
+            "uptime_seconds": round(self.offset(), 3),
+            "ready": self.is_ready(),
+            "ready_after_seconds": round(self.ready_after, 4) if self.ready_after is not None else None,
+            "phases": phases,
+            "milestones": milestones,
+        }
+
+
+startup_timer = StartupTimer()
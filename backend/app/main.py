@@ -1,23 +1,50 @@
+import time
+_imports_started = time.perf_counter()
+
 import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from backend.app.api import runtime, ws
+from backend.app.core.startup import startup_timer
+from backend.app.api import health, history, market, metrics, runtime, ws
 from backend.app.services.redis_listener import redis_listener
 from backend.app.services.producer_task import run_mock_producer
 
+startup_timer.record("imports", time.perf_counter() - _imports_started)
+
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TideSonar")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Start background tasks
+    # Startup: Start background tasks. Heavy initialisation (universe, baselines, Redis probe)
+    # runs in the producer's warmup thread so the server accepts connections immediately.
+    lifespan_started = time.perf_counter()
     from backend.app.core.config import settings
     masked_key = settings.BIYING_LICENSE[:5] + "***" if settings.BIYING_LICENSE and "YOUR_LICENSE" not in settings.BIYING_LICENSE else "DEFAULT/MOCK"
     logger.info(f"🚀 Server Starting. License Status: {masked_key}")
 
+    from backend.app.services.frame_ring import ring_name_from_env, run_ring_reader
+    ring_name = ring_name_from_env()
+    if ring_name:
+        # Multi-process web worker: the producer process polls Biying and feeds us through the frame ring.
+        from backend.app.services.health import health
+        health.role = "worker"
+        reader_task = asyncio.create_task(run_ring_reader(ring_name))
+        redis_task = asyncio.create_task(redis_listener())
+        startup_timer.record("lifespan", time.perf_counter() - lifespan_started)
+        yield
+        reader_task.cancel()
+        redis_task.cancel()
+        try:
+            await reader_task
+            await redis_task
+        except asyncio.CancelledError:
+            pass
+        return
+
     # NEW: Schedule Daily History Update (After Market Close)
     # We create a simple loop that checks time, or trigger it manually via API.
     # For now, we will add a trivial check loop or just expose an endpoint.
@@ -26,11 +53,20 @@ async def lifespan(app: FastAPI):
     scheduler_task = asyncio.create_task(start_scheduler())
 
     redis_task = asyncio.create_task(redis_listener())
-    producer_task = asyncio.create_task(run_mock_producer())
-    
+    from backend.app.services.health import supervise_producer
+    producer_task = asyncio.create_task(supervise_producer(run_mock_producer))
+
+    from backend.app.core.profiler import LOOP_LAG_MONITOR, loop_lag_monitor
+    lag_task = asyncio.create_task(loop_lag_monitor.run()) if LOOP_LAG_MONITOR else None
+    startup_timer.record("lifespan", time.perf_counter() - lifespan_started)
+
     yield
     
     # Shutdown: Clean up
+    if lag_task:
+        lag_task.cancel()
+    from backend.app.services.tick_store import tick_store
+    await asyncio.to_thread(tick_store.stop)
     scheduler_task.cancel()
     producer_task.cancel()
     redis_task.cancel()
@@ -54,7 +90,11 @@ app.add_middleware(
 
 # Routes
 app.include_router(ws.router)
+app.include_router(health.router)
 app.include_router(runtime.router)
+app.include_router(metrics.router)
+app.include_router(history.router)
+app.include_router(market.router)
 
 @app.get("/")
 def read_root():
@@ -91,6 +131,26 @@ if __name__ == "__main__":
     
     # 3. Start Uvicorn
     # Use reload=True for development. Spawned process will inherit os.environ["BIYING_LICENSE"]
-    uvicorn.run("backend.app.main:app", host="0.0.0.0", port=port, reload=True)
+    # permessage-deflate for /ws/alerts is negotiated per connection; WS_PER_MESSAGE_DEFLATE=false disables it.
+    from backend.app.services.wire_format import WS_PER_MESSAGE_DEFLATE
+    web_workers = int(os.getenv("WEB_WORKERS", "1"))
+    if web_workers > 1:
+        # One producer process + N WebSocket workers fed through shared memory (no reload).
+        from backend.app.services.frame_ring import serve_multiprocess
+        serve_multiprocess(
+            "backend.app.main:app",
+            host="0.0.0.0",
+            port=port,
+            workers=web_workers,
+            ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE,
+        )
+    else:
+        uvicorn.run(
+            "backend.app.main:app",
+            host="0.0.0.0",
+            port=port,
+            reload=True,
+            ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE,
+        )
 
 
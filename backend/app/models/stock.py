@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 
 class StockData(BaseModel):
@@ -10,6 +10,7 @@ class StockData(BaseModel):
     volume: int     # Current minute volume (mocked as total volume for simplicity in snapshot)
     amount: float   # Transaction amount
     timestamp: datetime = datetime.now()
+    prev_close: Optional[float] = None # Previous close (yc); price limits are derived from it when present
     
     # Optional field to identify index membership roughly for mock
     index_code: Optional[str] = None # HS300, ZZ500, ZZ1000, ZZ2000
@@ -31,3 +32,6 @@ class StockAlert(BaseModel):
     concept: Optional[str] = None
     timestamp: str  # ISO Serialized string
     reason: str     # Why it triggered
+    excess_pct: Optional[float] = None # pct_chg minus its index's pct_chg (None until the index is known)
+    order_book: Optional[Dict[str, float]] = None # five-level summary for top hot-tier alerts (see services/order_book.py)
+    features: Optional[Dict[str, float]] = None # rolling ret_1m/ret_3m/ret_5m, vwap_dev, vol_accel (see services/features.py)
@@ -7,14 +7,45 @@ import urllib.parse
 import concurrent.futures
 import threading
 from collections import deque
-from typing import List, Dict, Optional, TypedDict, Any
+from typing import List, Dict, Optional, Tuple, TypedDict, Any
 from datetime import datetime, date
 from backend.app.models.stock import StockData
 from backend.app.core.interfaces import BaseDataSource
 from backend.app.core.config import settings
+from backend.app.core.metrics import metrics
+from backend.app.services.fetch_resilience import (
+    FETCH_ATTEMPT_TIMEOUT_SECONDS,
+    FETCH_BATCH_DEADLINE_SECONDS,
+    FETCH_EXTRA_BUDGET_RATIO,
+    FETCH_MAX_RETRIES,
+    CircuitBreaker,
+    FetchReport,
+    LatencyTracker,
+    backoff_delay,
+    iter_json_array,
+)
+from backend.app.services.fetch_tuner import FETCH_MAX_CONCURRENCY, PROVIDER_MAX_BATCH_SIZE, fetch_tuner
+from backend.app.services.index_feed import IndexQuote
+from backend.app.services.index_membership import INDEX_SOURCES, apply_primary_index, load_index_members
 
 logger = logging.getLogger(__name__)
 
+metrics.describe_histogram("tidesonar_fetch_batch_seconds", "Latency of one ssjy_more batch request.")
+metrics.describe_histogram("tidesonar_rate_limiter_wait_seconds", "Time spent blocked in the rolling rate limiter.")
+metrics.describe_counter("tidesonar_biying_requests_total", "Biying batch requests by tier and outcome.")
+metrics.describe_histogram("tidesonar_bulk_fetch_seconds", "Latency of one hsrl/real/all request including streaming decode.")
+metrics.describe_counter("tidesonar_fetch_retries_total", "Batch requests retried after a failed attempt.")
+metrics.describe_counter("tidesonar_fetch_hedges_total", "Hedged duplicate batch requests by which request won.")
+metrics.describe_counter("tidesonar_fetch_missed_codes_total", "Requested codes that came back without a quote.")
+
+SNAPSHOT_BATCH_SIZE = PROVIDER_MAX_BATCH_SIZE # Codes per ssjy_more request (upper bound; see fetch_tuner)
+# hsrl/real/all (whole market in one request): auto | always | never
+BIYING_BULK_MODE = os.getenv("BIYING_BULK_MODE", "auto").lower()
+BULK_MIN_CODES = int(os.getenv("BULK_MIN_CODES", "400"))
+BULK_TIMEOUT_SECONDS = float(os.getenv("BULK_TIMEOUT_SECONDS", "10"))
+BULK_FAILURE_COOLDOWN_SECONDS = float(os.getenv("BULK_FAILURE_COOLDOWN_SECONDS", "120"))
+# Tiers that always use targeted ssjy_more requests.
+BULK_EXCLUDED_TIERS = {"hot"}
 CACHE_DIR = "backend/data"
 CACHE_FILE = os.path.join(CACHE_DIR, "index_constituents.json")
 
@@ -38,7 +69,9 @@ class RollingRateLimiter:
         self._calls = deque()
         self._lock = threading.Lock()
 
-    def acquire(self) -> None:
+    def acquire(self) -> float:
+        """Block until a call slot is free. Returns seconds spent waiting."""
+        started = time.monotonic()
         while True:
             now = time.monotonic()
             with self._lock:
@@ -47,12 +80,24 @@ class RollingRateLimiter:
 
                 if len(self._calls) < self.max_calls:
                     self._calls.append(now)
-                    return
+                    return now - started
 
                 wait_seconds = self.window_seconds - (now - self._calls[0])
 
             time.sleep(max(0.01, min(wait_seconds, 0.5)))
 
+    def try_acquire(self, limit: Optional[int] = None) -> bool:
+        """Take a slot only if fewer than `limit` (default: the cap) are in use; never waits."""
+        cap = self.max_calls if limit is None else min(self.max_calls, limit)
+        now = time.monotonic()
+        with self._lock:
+            while self._calls and (now - self._calls[0]) >= self.window_seconds:
+                self._calls.popleft()
+            if len(self._calls) >= cap:
+                return False
+            self._calls.append(now)
+            return True
+
     def usage(self) -> int:
         now = time.monotonic()
         with self._lock:
@@ -72,9 +117,34 @@ class BiyingDataSource(BaseDataSource):
             logger.warning("Configured BIYING_MAX_REQUESTS_PER_MINUTE=%s exceeds provider limit, clamping to 3000.", configured_rpm)
         self.max_requests_per_minute = max(1, min(configured_rpm, 3000))
         self._request_limiter = RollingRateLimiter(self.max_requests_per_minute, 60.0)
+        self.circuit = CircuitBreaker()
+        self._latency = LatencyTracker()
+        # Hedged requests need their own threads: the fetch pool's worker blocks waiting on both.
+        # Sized for every fetch thread the tuner can run (see pool_size) to have a primary and a
+        # hedge in flight; threads are only started on demand.
+        self._hedge_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=2 * FETCH_MAX_CONCURRENCY * 2,
+            thread_name_prefix="biying-hedge",
+        )
+        self.last_fetch_report: Optional[FetchReport] = None
+        self._bulk_disabled_until = 0.0
         
         # Load Universe
         self.stock_index_map: Dict[str, StockMeta] = self._load_or_update_stock_list()
+        # Official constituents (a few hszg/gg calls) replace the concept-tag index guess.
+        self.index_members: Dict[str, List[str]] = load_index_members(self.license)
+        apply_primary_index(self.stock_index_map, self.index_members, list(INDEX_SOURCES))
+
+    def adopt_request_state(self, previous: "BiyingDataSource") -> None:
+        """Take over the quota window, breaker and hedge threads of a source being replaced."""
+        own_executor = self._hedge_executor
+        self.max_requests_per_minute = previous.max_requests_per_minute
+        self._request_limiter = previous._request_limiter
+        self.circuit = previous.circuit
+        self._latency = previous._latency
+        self._hedge_executor = previous._hedge_executor
+        self._bulk_disabled_until = previous._bulk_disabled_until
+        own_executor.shutdown(wait=False)
 
     def update_rate_limit(self, max_requests_per_minute: int) -> int:
         target = max(1, min(int(max_requests_per_minute), 3000))
@@ -83,6 +153,10 @@ class BiyingDataSource(BaseDataSource):
             self._request_limiter = RollingRateLimiter(self.max_requests_per_minute, 60.0)
             logger.info("Biying request cap updated to %s req/min", self.max_requests_per_minute)
         return self.max_requests_per_minute
+
+    def rate_limit_usage(self) -> int:
+        """Requests issued within the current rolling minute."""
+        return self._request_limiter.usage()
         
     def _load_or_update_stock_list(self) -> Dict[str, StockMeta]:
         """
@@ -225,7 +299,8 @@ class BiyingDataSource(BaseDataSource):
                         # Fallback for display if nothing found
                         if not found_ind and tags: found_ind = tags[0].get("name", "")
                         
-                        # 2. Find Index Membership (Priority: HS300 > ZZ500 > ZZ1000 > ZZ2000)
+                        # 2. Guess Index Membership (Priority: HS300 > ZZ500 > ZZ1000 > ZZ2000)
+                        # Only a fallback: official hszg/gg constituents override it at load time.
                         temp_index = "OTHER"
                         
                         # Optimization: Check all tags
@@ -282,18 +357,32 @@ class BiyingDataSource(BaseDataSource):
     def get_snapshot(self) -> List[StockData]:
         return self.get_snapshot_for_codes(self.get_all_codes())
 
-    def get_snapshot_for_codes(self, codes: List[str]) -> List[StockData]:
+    def get_snapshot_for_codes(self, codes: List[str], tier: str = "all") -> List[StockData]:
         """
         Fetch real-time data for a subset of stocks using Batch API.
         Documentation: http://api.biyingapi.com/hsrl/ssjy_more/... (Limit 20 per request)
         Provider limit: 3000 calls/minute.
         """
-        target_codes = [str(c) for c in codes if c]
-        if not target_codes:
+        return self.get_snapshot_for_tiers({tier: codes})
+
+    def get_snapshot_for_tiers(self, tiered_codes: Dict[str, List[str]]) -> List[StockData]:
+        """
+        Same as get_snapshot_for_codes, but batches are built per tier so request
+        latency and outcome metrics can be attributed to hot/warm/cold polling.
+
+        Large non-hot sweeps may be served by one hsrl/real/all request instead
+        (see `_use_bulk`); the bulk response covers the whole universe, so the
+        result can then contain more codes than were requested.
+        """
+        tier_batches_input = {
+            tier: [str(c) for c in codes if c] for tier, codes in tiered_codes.items()
+        }
+        if not any(tier_batches_input.values()):
             return []
 
         result = []
         now = datetime.now()
+        report = {"retries": 0, "hedges": 0}
         
         # NOTE: User Confirmed Limits (2026/02/24)
         # Max Batch Size per Request: 20
@@ -302,87 +391,358 @@ class BiyingDataSource(BaseDataSource):
         # Max Cycles per Minute = 3000 / 260 = ~11.5 Cycles.
         # Safe Cycle Interval = 60s / 11.5 = ~5.2 seconds (rounding up to 6s).
         
-        BATCH_SIZE = 20
-        MAX_WORKERS = 30 # Reduced workers to avoid burst limits
-        
-        # Chunk the codes
-        batches = [target_codes[i:i + BATCH_SIZE] for i in range(0, len(target_codes), BATCH_SIZE)]
+        # Batch size and in-flight requests per tier come from the auto-tuner (fetch_tuner).
+
+        bulk_tiers = [tier for tier in tier_batches_input if tier not in BULK_EXCLUDED_TIERS]
+        use_bulk = self._use_bulk(sum(len(tier_batches_input[tier]) for tier in bulk_tiers))
+        batched_tiers = [tier for tier in tier_batches_input if not (use_bulk and tier in bulk_tiers)]
+
+        def chunk(tiers):
+            # Chunk the codes (per tier, so a batch never mixes tiers)
+            return [
+                (tier, batch)
+                for tier in tiers
+                for batch in fetch_tuner.plan_batches(tier, tier_batches_input[tier])
+            ]
         
-        def fetch_batch(batch_codes):
+        def fetch_batch(tier, batch_codes):
             if not batch_codes: return []
-            codes_str = ",".join(batch_codes)
-            url = f"http://api.biyingapi.com/hsrl/ssjy_more/{self.license}"
-            params = {"stock_codes": codes_str}
-            res_items = []
+            return self._fetch_batch_resilient(tier, batch_codes, report)
+
+        def collect(futures):
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    for item in future.result() or []:
+                        stock_obj = self._to_stock_data(item, now)
+                        if stock_obj is not None:
+                            result.append(stock_obj)
+                except Exception as e:
+                    logger.warning(f"Batch fetch failed: {e}")
+                    continue
+
+        max_workers = fetch_tuner.pool_size(list(tier_batches_input)) + 1
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="biying-fetch") as executor:
+            bulk_future = executor.submit(self._fetch_bulk, now) if use_bulk else None
+            collect([executor.submit(fetch_batch, tier, b) for tier, b in chunk(batched_tiers)])
+
+            if bulk_future is not None:
+                bulk = bulk_future.result()
+                if bulk is None:
+                    # Bulk failed: fall back to ssjy_more for the same codes in this cycle.
+                    use_bulk = False
+                    collect([executor.submit(fetch_batch, tier, b) for tier, b in chunk(bulk_tiers)])
+                else:
+                    # Targeted ssjy_more quotes win over the bulk copy of the same code.
+                    batched = {stock.code for stock in result}
+                    result.extend(stock for stock in bulk if stock.code not in batched)
+
+        fetched_codes = {stock.code for stock in result}
+        missed = {}
+        for tier, tier_codes in tier_batches_input.items():
+            tier_missed = [code for code in tier_codes if code not in fetched_codes]
+            if tier_missed:
+                missed[tier] = tier_missed
+                metrics.inc("tidesonar_fetch_missed_codes_total", len(tier_missed), tier=tier)
+        self.last_fetch_report = {
+            "requested": sum(len(tier_codes) for tier_codes in tier_batches_input.values()),
+            "fetched": len(fetched_codes),
+            "retries": report["retries"],
+            "hedges": report["hedges"],
+            "circuit": self.circuit.state,
+            "bulk": bool(use_bulk),
+            "missed": missed,
+        }
+        return result
+
+    def get_index_quotes(self, index_codes: Dict[str, str]) -> Dict[str, IndexQuote]:
+        """
+        Latest hsindex/real/time quote per index group (one request each, through
+        the shared rate limiter). Failed indices are simply absent.
+        """
+        quotes: Dict[str, IndexQuote] = {}
+        for index_name, code in index_codes.items():
+            if not self.circuit.allow():
+                metrics.inc("tidesonar_biying_requests_total", tier="index", outcome="circuit_open")
+                break
+            url = f"http://api.biyingapi.com/hsindex/real/time/{code}/{self.license}"
+            outcome = "ok"
+            waited = self._request_limiter.acquire()
+            metrics.observe("tidesonar_rate_limiter_wait_seconds", waited)
             try:
-                self._request_limiter.acquire()
-                # Reduced timeout to fail fast on slow chunks
-                resp = requests.get(url, params=params, timeout=2.5) 
+                resp = requests.get(url, timeout=FETCH_ATTEMPT_TIMEOUT_SECONDS)
                 if resp.status_code == 200:
                     data = resp.json()
-                    if isinstance(data, list):
-                        res_items = data
+                    # Object, or a list of ticks with the newest last.
+                    item = data[-1] if isinstance(data, list) and data else data
+                    if isinstance(item, dict) and item.get("p") is not None:
+                        quotes[index_name] = {
+                            "index_code": index_name,
+                            "code": code,
+                            "price": float(item.get("p") or 0),
+                            "pct_chg": float(item.get("pc", 0) or item.get("zdf", 0) or 0),
+                            "timestamp": str(item.get("t") or datetime.now().isoformat(timespec="seconds")),
+                        }
+                    else:
+                        outcome = "bad_payload"
+                else:
+                    outcome = "http_error"
+            except requests.exceptions.Timeout:
+                outcome = "timeout"
             except Exception:
-                pass 
-            return res_items
+                outcome = "error"
+            self.circuit.record(outcome == "ok")
+            metrics.inc("tidesonar_biying_requests_total", tier="index", outcome=outcome)
+        return quotes
+
+    def get_order_book(self, code: str, headroom_ratio: float = 1.0) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        hsstock/real/five for one code. Returns (outcome, book); never raises or waits
+        for quota: with the rolling minute at `headroom_ratio` of the cap the request
+        is skipped ("headroom") so snapshot batches keep their share.
+        """
+        if not self.circuit.allow():
+            return "circuit_open", None
+        if not self._request_limiter.try_acquire(int(headroom_ratio * self.max_requests_per_minute)):
+            self.circuit.release()
+            return "headroom", None
+        url = f"http://api.biyingapi.com/hsstock/real/five/{code}/{self.license}"
+        book = None
+        outcome = "ok"
+        try:
+            resp = requests.get(url, timeout=FETCH_ATTEMPT_TIMEOUT_SECONDS)
+            if resp.status_code == 200:
+                data = resp.json()
+                if isinstance(data, list):
+                    data = data[-1] if data else None
+                if isinstance(data, dict) and ("pb" in data or "ps" in data):
+                    book = data
+                else:
+                    outcome = "bad_payload"
+            else:
+                outcome = "http_error"
+        except requests.exceptions.Timeout:
+            outcome = "timeout"
+        except Exception:
+            outcome = "error"
+        self.circuit.record(outcome == "ok")
+        metrics.inc("tidesonar_biying_requests_total", tier="order_book", outcome=outcome)
+        return outcome, book
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_to_batch = {executor.submit(fetch_batch, b): b for b in batches}
+    def _to_stock_data(self, item: Any, now: datetime) -> Optional[StockData]:
+        """Normalize one quote object (ssjy_more and real/all share the schema)."""
+        try:
+            # 2. Validate Item
+            if not isinstance(item, dict):
+                return None
+
+            code = item.get('dm')
+            if not code: return None
+
+            # 3. Validate Metadata
+            meta = self.stock_index_map.get(str(code)) # Ensure code is string lookup
             
-            for future in concurrent.futures.as_completed(future_to_batch):
-                try:
-                    data_list = future.result()
-                    
-                    # 1. Validate Batch Result
-                    if not data_list or not isinstance(data_list, list):
-                        continue
+            # If meta is missing or corrupted, use defaults
+            if not meta or not isinstance(meta, dict):
+                meta = {"index": "OTHER", "name": str(code), "block": ""}
 
-                    for item in data_list:
-                        try:
-                            # 2. Validate Item
-                            if not isinstance(item, dict):
-                                continue
+            idx_code = meta.get("index", "OTHER")
+            final_name = meta.get("name") or item.get("mc") or str(code)
+            # final_block is kept for fallback, but industry override is preferred
+            final_block = meta.get("block") or ""
+            
+            # New Fields
+            final_ind = meta.get("industry") or final_block
+            final_con = meta.get("concept") or ""
 
-                            code = item.get('dm')
-                            if not code: continue
+            # 4. Construct Object
+            return StockData(
+                code=str(code),
+                name=str(final_name),
+                price=float(item.get('p', 0) or 0),
+                pct_chg=float(item.get('pc', 0) or item.get('zdf', 0) or 0),
+                volume=int(float(item.get('v', 0) or 0)),
+                amount=float(item.get('cje', 0) or 0),
+                timestamp=now,
+                prev_close=float(item.get('yc') or 0) or None,
+                index_code=idx_code,
+                block=final_block,
+                industry=final_ind,
+                concept=final_con
+            )
+        except Exception:
+            # Silently skip individual bad items to preserve batch
+            return None
 
-                            # 3. Validate Metadata
-                            meta = self.stock_index_map.get(str(code)) # Ensure code is string lookup
-                            
-                            # If meta is missing or corrupted, use defaults
-                            if not meta or not isinstance(meta, dict):
-                                meta = {"index": "OTHER", "name": str(code), "block": ""}
-
-                            idx_code = meta.get("index", "OTHER")
-                            final_name = meta.get("name") or item.get("mc") or str(code)
-                            # final_block is kept for fallback, but industry override is preferred
-                            final_block = meta.get("block") or ""
-                            
-                            # New Fields
-                            final_ind = meta.get("industry") or final_block
-                            final_con = meta.get("concept") or ""
-
-                            # 4. Construct Object
-                            stock_obj = StockData(
-                                code=str(code),
-                                name=str(final_name),
-                                price=float(item.get('p', 0) or 0),
-                                pct_chg=float(item.get('pc', 0) or item.get('zdf', 0) or 0),
-                                volume=int(float(item.get('v', 0) or 0)),
-                                amount=float(item.get('cje', 0) or 0),
-                                timestamp=now,
-                                index_code=idx_code,
-                                block=final_block,
-                                industry=final_ind,
-                                concept=final_con
-                            )
-                            result.append(stock_obj)
-                        except Exception:
-                            # Silently skip individual bad items to preserve batch
-                            continue
-                            
-                except Exception as e:
-                    logger.warning(f"Batch fetch failed: {e}")
-                    continue
+    def _use_bulk(self, due_codes: int) -> bool:
+        """
+        Serve the non-hot tiers of this cycle from hsrl/real/all?
 
-        return result
+        `auto` uses the bulk endpoint when the sweep is large (BULK_MIN_CODES)
+        or when the remaining per-minute quota cannot cover it with ssjy_more.
+        After a bulk failure, auto mode sticks to ssjy_more for a cooldown.
+        """
+        if not due_codes or BIYING_BULK_MODE == "never":
+            return False
+        if BIYING_BULK_MODE == "always":
+            return True
+        if time.monotonic() < self._bulk_disabled_until:
+            return False
+        batches = -(-due_codes // SNAPSHOT_BATCH_SIZE)
+        remaining = self.max_requests_per_minute - self._request_limiter.usage()
+        return due_codes >= BULK_MIN_CODES or batches > remaining
+
+    def _fetch_bulk(self, now: datetime) -> Optional[List[StockData]]:
+        """
+        Whole-market snapshot in one request, decoded as it streams in so the
+        multi-megabyte body is never held (or parsed) in one piece.
+        Returns None on failure.
+        """
+        if not self.circuit.allow():
+            metrics.inc("tidesonar_biying_requests_total", tier="bulk", outcome="circuit_open")
+            return None
+        url = f"https://all.biyingapi.com/hsrl/real/all/{self.license}"
+        waited = self._request_limiter.acquire()
+        metrics.observe("tidesonar_rate_limiter_wait_seconds", waited)
+        started = time.perf_counter()
+        stocks: List[StockData] = []
+        outcome = "ok"
+        try:
+            with requests.get(url, timeout=BULK_TIMEOUT_SECONDS, stream=True) as resp:
+                if resp.status_code != 200:
+                    outcome = "http_error"
+                else:
+                    for item in iter_json_array(resp.iter_content(chunk_size=65536)):
+                        stock = self._to_stock_data(item, now)
+                        if stock is not None:
+                            stocks.append(stock)
+        except requests.exceptions.Timeout:
+            outcome = "timeout"
+        except ValueError:
+            outcome = "bad_payload"
+        except Exception:
+            outcome = "error"
+        self.circuit.record(outcome == "ok")
+        metrics.observe("tidesonar_bulk_fetch_seconds", time.perf_counter() - started)
+        metrics.inc("tidesonar_biying_requests_total", tier="bulk", outcome=outcome)
+        if outcome == "ok" and not stocks:
+            outcome = "empty"
+        if outcome != "ok":
+            self._bulk_disabled_until = time.monotonic() + BULK_FAILURE_COOLDOWN_SECONDS
+            logger.warning("Bulk snapshot failed (%s); using ssjy_more for %.0fs", outcome, BULK_FAILURE_COOLDOWN_SECONDS)
+            return None
+        return stocks
+
+    def _extra_requests_allowed(self) -> bool:
+        """Retries and hedges may only use quota headroom, never the share first attempts need."""
+        return self._request_limiter.usage() < FETCH_EXTRA_BUDGET_RATIO * self.max_requests_per_minute
+
+    def _request_batch(self, tier: str, batch_codes: List[str], deadline: float, sent: Optional[threading.Event] = None):
+        """
+        One ssjy_more request. Returns (outcome, items); never raises.
+        Every attempt, retry or hedge goes through the rate limiter. `sent` is
+        set once the request is actually sent (after the tuner slot and quota).
+        """
+        if not self.circuit.allow():
+            metrics.inc("tidesonar_biying_requests_total", tier=tier, outcome="circuit_open")
+            return "circuit_open", []
+        url = f"http://api.biyingapi.com/hsrl/ssjy_more/{self.license}"
+        params = {"stock_codes": ",".join(batch_codes)}
+        items = []
+        outcome = "ok"
+        # The tuner's slot bounds requests in flight per tier; the limiter bounds requests per minute.
+        with fetch_tuner.slot(tier):
+            waited = self._request_limiter.acquire()
+            metrics.observe("tidesonar_rate_limiter_wait_seconds", waited)
+            timeout = min(FETCH_ATTEMPT_TIMEOUT_SECONDS, deadline - time.monotonic())
+            started = time.perf_counter()
+            if timeout <= 0.05:
+                outcome = "deadline"
+            else:
+                if sent is not None:
+                    sent.set()
+                try:
+                    try:
+                        resp = requests.get(url, params=params, timeout=timeout)
+                    finally:
+                        metrics.observe("tidesonar_fetch_batch_seconds", time.perf_counter() - started, tier=tier)
+                    if resp.status_code == 200:
+                        data = resp.json()
+                        if isinstance(data, list):
+                            items = data
+                        else:
+                            outcome = "bad_payload"
+                    else:
+                        outcome = "http_error"
+                except requests.exceptions.Timeout:
+                    outcome = "timeout"
+                except Exception:
+                    outcome = "error"
+            elapsed = time.perf_counter() - started
+        if outcome == "deadline":
+            self.circuit.release()
+        else:
+            self.circuit.record(outcome == "ok")
+        if outcome == "ok":
+            self._latency.observe(tier, elapsed)
+        if outcome != "deadline":
+            fetch_tuner.record(tier, elapsed, outcome)
+        metrics.inc("tidesonar_biying_requests_total", tier=tier, outcome=outcome)
+        return outcome, items
+
+    def _request_hedged(self, tier: str, batch_codes: List[str], deadline: float, hedge_delay: float, report: Dict[str, int]):
+        """
+        Send the request; if it is still pending after `hedge_delay` (the tier's
+        latency percentile), send a duplicate and take whichever succeeds first.
+        The delay counts from when the primary is sent, not while it waits for a
+        tuner slot or rate-limiter quota, so queueing alone never triggers a hedge.
+        """
+        sent = threading.Event()
+        primary = self._hedge_executor.submit(self._request_batch, tier, batch_codes, deadline, sent)
+        primary.add_done_callback(lambda _: sent.set())
+        sent.wait(max(0.0, deadline - time.monotonic()))
+        try:
+            return primary.result(timeout=hedge_delay)
+        except concurrent.futures.TimeoutError:
+            pass
+        if not self._extra_requests_allowed() or deadline - time.monotonic() <= hedge_delay:
+            return primary.result()
+        report["hedges"] += 1
+        hedge = self._hedge_executor.submit(self._request_batch, tier, batch_codes, deadline)
+        pending = {primary, hedge}
+        outcome, items = "error", []
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                outcome, items = future.result()
+                if outcome == "ok":
+                    metrics.inc("tidesonar_fetch_hedges_total", tier=tier, winner="hedge" if future is hedge else "primary")
+                    # The slower request is left to finish on its own; its result is discarded.
+                    return outcome, items
+        metrics.inc("tidesonar_fetch_hedges_total", tier=tier, winner="none")
+        return outcome, items
+
+    def _fetch_batch_resilient(self, tier: str, batch_codes: List[str], report: Dict[str, int]) -> List[Any]:
+        """
+        Fetch one batch with jittered retries inside FETCH_BATCH_DEADLINE_SECONDS.
+        Gives up early while the circuit is open; whatever is still missing is
+        reported back to the scheduler via `last_fetch_report`.
+        """
+        deadline = time.monotonic() + FETCH_BATCH_DEADLINE_SECONDS
+        attempt = 0
+        while True:
+            hedge_delay = self._latency.hedge_delay(tier)
+            if hedge_delay is not None:
+                outcome, items = self._request_hedged(tier, batch_codes, deadline, hedge_delay, report)
+            else:
+                outcome, items = self._request_batch(tier, batch_codes, deadline)
+            if outcome in ("ok", "circuit_open", "deadline"):
+                return items
+            attempt += 1
+            if attempt > FETCH_MAX_RETRIES or not self._extra_requests_allowed():
+                return items
+            delay = backoff_delay(attempt)
+            if time.monotonic() + delay >= deadline:
+                return items
+            time.sleep(delay)
+            report["retries"] += 1
+            metrics.inc("tidesonar_fetch_retries_total", tier=tier, reason=outcome)
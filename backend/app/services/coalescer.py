@@ -0,0 +1,82 @@
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from backend.app.services.subscriptions import SelectionEntry
+
+# Server-side cap on frames per second per /ws/alerts client; clients may only ask for less.
+WS_MAX_FRAME_RATE = float(os.getenv("WS_MAX_FRAME_RATE", "2.0"))
+WS_MIN_FRAME_RATE = 0.1
+
+
+def clamp_rate(value: Optional[object]) -> float:
+    """Client-requested frames per second, clamped to [WS_MIN_FRAME_RATE, WS_MAX_FRAME_RATE]."""
+    if value is None or value == "":
+        return WS_MAX_FRAME_RATE
+    try:
+        rate = float(value)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        raise ValueError("'max_rate' must be a number (frames per second)")
+    if rate != rate or rate <= 0:
+        raise ValueError("'max_rate' must be positive")
+    return min(WS_MAX_FRAME_RATE, max(WS_MIN_FRAME_RATE, rate))
+
+
+class ClientCoalescer:
+    """
+    Pending updates for one connection, keyed by stock code.
+
+    A newer alert (or quote) for a code replaces the pending one and moves it
+    to the end, so a flush carries exactly the latest state per code in the
+    order it last changed. The manager flushes at most once per `interval`.
+    """
+
+    def __init__(self, max_rate: float = WS_MAX_FRAME_RATE):
+        self.alerts: Dict[str, SelectionEntry] = {}
+        self.messages: Dict[str, Dict[str, object]] = {}
+        self.interval = 1.0 / max_rate
+        self.last_flush = 0.0
+        self.superseded = 0
+        # A ranking view update is due; its delta is built at flush time against what was last sent.
+        self.view_pending = False
+        self.flush_handle = None  # asyncio.Task while a flush is scheduled
+
+    @property
+    def max_rate(self) -> float:
+        return 1.0 / self.interval
+
+    def set_rate(self, max_rate: float) -> None:
+        self.interval = 1.0 / max_rate
+
+    def add_alerts(self, entries: List[SelectionEntry]) -> None:
+        pending = self.alerts
+        for entry in entries:
+            code = entry[0].code
+            if pending.pop(code, None) is not None:
+                self.superseded += 1
+            pending[code] = entry
+
+    def add_message(self, key: str, payload: Dict[str, object]) -> None:
+        if self.messages.pop(key, None) is not None:
+            self.superseded += 1
+        self.messages[key] = payload
+
+    def has_pending(self) -> bool:
+        return bool(self.alerts or self.messages or self.view_pending)
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """Seconds until the next flush is allowed (0 when idle long enough)."""
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.last_flush + self.interval - now)
+
+    def drain(self) -> Tuple[List[SelectionEntry], List[Dict[str, object]], int, bool]:
+        entries = list(self.alerts.values())
+        messages = list(self.messages.values())
+        superseded = self.superseded
+        view_pending = self.view_pending
+        self.alerts = {}
+        self.messages = {}
+        self.superseded = 0
+        self.view_pending = False
+        self.last_flush = time.monotonic()
+        return entries, messages, superseded, view_pending
@@ -0,0 +1,141 @@
+import os
+from datetime import date, datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+# One ring column per sample; every column holds the whole universe.
+FEATURE_SAMPLE_SECONDS = float(os.getenv("FEATURE_SAMPLE_SECONDS", "15"))
+FEATURE_WINDOW_MINUTES = int(os.getenv("FEATURE_WINDOW_MINUTES", "5"))
+# Anomaly rules on top of the turnover filter: tags in the alert reason.
+FEATURE_SPIKE_PCT = float(os.getenv("FEATURE_SPIKE_PCT", "1.5"))
+FEATURE_VOLUME_ACCEL = float(os.getenv("FEATURE_VOLUME_ACCEL", "3.0"))
+
+RETURN_MINUTES = (1, 3, 5)
+FEATURE_NAMES = ("ret_1m", "ret_3m", "ret_5m", "vwap_dev", "vol_accel")
+
+
+class FeatureEngine:
+    """
+    Rolling intraday indicators per symbol from fixed-size ring buffers.
+
+    Latest price / cumulative volume / cumulative amount are written in place
+    for the slots each snapshot refreshes. Every FEATURE_SAMPLE_SECONDS the
+    latest values of the whole universe are copied into the next ring column
+    (symbols not refreshed since carry their last quote), so an n-minute
+    lookback is a fixed column offset. Features are recomputed into
+    preallocated slot-aligned arrays after each update:
+
+    - ret_1m / ret_3m / ret_5m: % change of the latest price over the sample
+      taken n minutes earlier (nan until the ring holds that much history);
+    - vwap_dev: % deviation of the price from the session VWAP;
+    - vol_accel: volume of the last minute over the average per-minute volume
+      of the window's earlier minutes.
+
+    All work is whole-array operations: O(universe) per cycle, no per-symbol
+    Python loops. Buffers reset on a new trading day.
+    """
+
+    def __init__(self, size: int, sample_seconds: float = FEATURE_SAMPLE_SECONDS, window_minutes: int = FEATURE_WINDOW_MINUTES):
+        self.size = size
+        self.sample_seconds = max(1.0, sample_seconds)
+        self.steps = {minutes: max(1, int(round(minutes * 60 / self.sample_seconds))) for minutes in RETURN_MINUTES if minutes <= window_minutes}
+        self.capacity = max(self.steps.values()) + 1
+        self.price = np.zeros((self.capacity, size), dtype=np.float64)
+        self.volume = np.zeros((self.capacity, size), dtype=np.float64)
+        self.amount = np.zeros((self.capacity, size), dtype=np.float64)
+        self.last_price = np.zeros(size, dtype=np.float64)
+        self.last_volume = np.zeros(size, dtype=np.float64)
+        self.last_amount = np.zeros(size, dtype=np.float64)
+        self.values: Dict[str, np.ndarray] = {name: np.full(size, np.nan) for name in FEATURE_NAMES}
+        self.head = -1
+        self.samples = 0
+        self.next_sample = 0.0
+        self.day: Optional[date] = None
+        self._scratch = np.empty(size, dtype=np.float64)
+        self._mask = np.empty(size, dtype=bool)
+
+    def _reset(self, day: date) -> None:
+        for buffer in (self.price, self.volume, self.amount, self.last_price, self.last_volume, self.last_amount):
+            buffer.fill(0.0)
+        for values in self.values.values():
+            values.fill(np.nan)
+        self.head = -1
+        self.samples = 0
+        self.next_sample = 0.0
+        self.day = day
+
+    def update(self, slots: np.ndarray, price: np.ndarray, volume: np.ndarray, amount: np.ndarray, now: datetime) -> None:
+        """Write the refreshed slots (-1 = outside the universe), sample if due, recompute features."""
+        if now.date() != self.day:
+            self._reset(now.date())
+        known = slots >= 0
+        if not known.all():
+            slots, price, volume, amount = slots[known], price[known], volume[known], amount[known]
+        self.last_price[slots] = price
+        self.last_volume[slots] = volume
+        self.last_amount[slots] = amount
+
+        ts = now.timestamp()
+        if ts >= self.next_sample:
+            self.head = (self.head + 1) % self.capacity
+            self.price[self.head] = self.last_price
+            self.volume[self.head] = self.last_volume
+            self.amount[self.head] = self.last_amount
+            self.samples = min(self.samples + 1, self.capacity)
+            self.next_sample = (ts // self.sample_seconds + 1) * self.sample_seconds
+        self._compute()
+
+    def _column(self, steps: int) -> int:
+        return (self.head - steps) % self.capacity
+
+    def _compute(self) -> None:
+        scratch, mask = self._scratch, self._mask
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for minutes, steps in self.steps.items():
+                out = self.values[f"ret_{minutes}m"]
+                out.fill(np.nan)
+                if self.samples <= steps:
+                    continue
+                base = self.price[self._column(steps)]
+                np.greater(base, 0.0, out=mask)
+                np.divide(self.last_price, base, out=out, where=mask)
+                out -= 1.0
+                out *= 100.0
+
+            # amount / (volume * price) is the volume unit (1 for shares, 100 for lots)
+            # times VWAP / price; rounding to a power of ten recovers the unit.
+            out = self.values["vwap_dev"]
+            np.multiply(self.last_volume, self.last_price, out=scratch)
+            np.divide(self.last_amount, scratch, out=scratch)
+            np.log10(scratch, out=out)
+            np.round(out, out=out)
+            np.power(10.0, out, out=out)
+            np.divide(out, scratch, out=out)
+            out -= 1.0
+            out *= 100.0
+
+            out = self.values["vol_accel"]
+            out.fill(np.nan)
+            window = max(self.steps.values())
+            recent = self.steps[min(self.steps)]
+            if self.samples > window and window > recent:
+                older = self.volume[self._column(window)]
+                base = self.volume[self._column(recent)]
+                np.subtract(base, older, out=scratch)
+                scratch *= recent / (window - recent)  # earlier minutes' volume per `recent` steps
+                np.greater(scratch, 0.0, out=mask)
+                np.subtract(self.last_volume, base, out=out)
+                np.divide(out, scratch, out=out, where=mask)
+                np.logical_not(mask, out=mask)
+                out[mask] = np.nan
+
+            for values in self.values.values():
+                np.isfinite(values, out=mask)
+                np.logical_not(mask, out=mask)
+                values[mask] = np.nan
+
+    def at(self, slots: np.ndarray) -> Dict[str, np.ndarray]:
+        """Feature columns for the given slots (nan where unknown or outside the universe)."""
+        known = slots >= 0
+        return {name: np.where(known, values[slots], np.nan) for name, values in self.values.items()}
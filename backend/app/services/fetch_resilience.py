@@ -0,0 +1,190 @@
+import codecs
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, TypedDict
+
+# Total time one batch may spend across attempts (limiter waits included).
+FETCH_BATCH_DEADLINE_SECONDS = float(os.getenv("FETCH_BATCH_DEADLINE_SECONDS", "6.0"))
+FETCH_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("FETCH_ATTEMPT_TIMEOUT_SECONDS", "2.5"))
+FETCH_MAX_RETRIES = int(os.getenv("FETCH_MAX_RETRIES", "2"))
+FETCH_RETRY_BASE_SECONDS = float(os.getenv("FETCH_RETRY_BASE_SECONDS", "0.2"))
+# Retries and hedges only spend quota while the rolling minute is below this share of the cap.
+FETCH_EXTRA_BUDGET_RATIO = float(os.getenv("FETCH_EXTRA_BUDGET_RATIO", "0.85"))
+
+FETCH_HEDGE_ENABLED = os.getenv("FETCH_HEDGE_ENABLED", "true").lower() == "true"
+FETCH_HEDGE_TIERS = {tier.strip() for tier in os.getenv("FETCH_HEDGE_TIERS", "hot").split(",") if tier.strip()}
+FETCH_HEDGE_PERCENTILE = float(os.getenv("FETCH_HEDGE_PERCENTILE", "0.9"))
+FETCH_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("FETCH_HEDGE_MIN_DELAY_SECONDS", "0.15"))
+HEDGE_MIN_SAMPLES = 20
+
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "50"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "20"))
+CIRCUIT_FAILURE_RATIO = float(os.getenv("CIRCUIT_FAILURE_RATIO", "0.5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "15"))
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+CIRCUIT_STATE_VALUES = {CIRCUIT_CLOSED: 0, CIRCUIT_HALF_OPEN: 1, CIRCUIT_OPEN: 2}
+
+
+class FetchReport(TypedDict):
+    requested: int
+    fetched: int
+    retries: int
+    hedges: int
+    circuit: str
+    # non-hot tiers were served by hsrl/real/all
+    bulk: bool
+    # tier -> codes requested this cycle that came back without a quote
+    missed: Dict[str, List[str]]
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[object]:
+    """
+    Yield the elements of a top-level JSON array as its bytes arrive.
+
+    Only the current partial element is buffered. Raises ValueError when the
+    body is not an array (e.g. an error object) or is truncated.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    opened = False
+    for chunk in chunks:
+        buf += text.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (opened and buf[pos] == ",")):
+                pos += 1
+            if pos == len(buf):
+                break
+            if not opened:
+                if buf[pos] != "[":
+                    raise ValueError("expected a JSON array")
+                opened = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            if end == len(buf) and not isinstance(item, (dict, list)):
+                break  # a scalar at the chunk edge may still grow ("12" -> "123")
+            pos = end
+            yield item
+        buf = buf[pos:]
+    raise ValueError("truncated JSON array")
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (1-based)."""
+    return random.uniform(0.0, FETCH_RETRY_BASE_SECONDS * (2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Failure-ratio breaker over the last `window` requests.
+
+    Open: every request fails fast without touching the network or the quota.
+    After `open_seconds` one probe is let through (half-open); its outcome
+    closes the breaker or re-opens it for another period. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        window: int = CIRCUIT_WINDOW,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        failure_ratio: float = CIRCUIT_FAILURE_RATIO,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+    ):
+        self.min_calls = max(1, min_calls)
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self.state = CIRCUIT_CLOSED
+        self.opened_count = 0
+        self._outcomes: deque = deque(maxlen=max(self.min_calls, window))
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CIRCUIT_CLOSED:
+                return True
+            if self.state == CIRCUIT_OPEN:
+                if time.monotonic() < self._open_until:
+                    return False
+                self.state = CIRCUIT_HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if self.state == CIRCUIT_HALF_OPEN:
+                self._probe_in_flight = False
+                if success:
+                    self.state = CIRCUIT_CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            if self.state == CIRCUIT_OPEN:
+                return
+            self._outcomes.append(success)
+            if len(self._outcomes) >= self.min_calls:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_ratio:
+                    self._open()
+
+    def release(self) -> None:
+        """The allowed request was never sent; let another one probe."""
+        with self._lock:
+            if self.state == CIRCUIT_HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _open(self) -> None:
+        self.state = CIRCUIT_OPEN
+        self.opened_count += 1
+        self._open_until = time.monotonic() + self.open_seconds
+        self._outcomes.clear()
+
+    def state_value(self) -> int:
+        return CIRCUIT_STATE_VALUES[self.state]
+
+
+class LatencyTracker:
+    """Recent successful request latencies per tier, for the hedge trigger."""
+
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, tier: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(tier, deque(maxlen=self.size)).append(seconds)
+
+    def percentile(self, tier: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(tier, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self, tier: str) -> Optional[float]:
+        if not FETCH_HEDGE_ENABLED or tier not in FETCH_HEDGE_TIERS:
+            return None
+        threshold = self.percentile(tier, FETCH_HEDGE_PERCENTILE)
+        if threshold is None:
+            return None
+        return max(FETCH_HEDGE_MIN_DELAY_SECONDS, threshold)
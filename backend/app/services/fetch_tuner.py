@@ -0,0 +1,168 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from backend.app.core.metrics import metrics
+
+PROVIDER_MAX_BATCH_SIZE = 20  # ssjy_more accepts at most 20 codes per request
+
+FETCH_AUTOTUNE = os.getenv("FETCH_AUTOTUNE", "true").lower() == "true"
+FETCH_INITIAL_CONCURRENCY = int(os.getenv("FETCH_INITIAL_CONCURRENCY", "16"))
+FETCH_MIN_CONCURRENCY = int(os.getenv("FETCH_MIN_CONCURRENCY", "2"))
+FETCH_MAX_CONCURRENCY = int(os.getenv("FETCH_MAX_CONCURRENCY", "48"))
+FETCH_MIN_BATCH_SIZE = int(os.getenv("FETCH_MIN_BATCH_SIZE", "5"))
+# A window whose p90 latency exceeds this (or whose error rate exceeds the next) backs off.
+FETCH_LATENCY_TARGET_SECONDS = float(os.getenv("FETCH_LATENCY_TARGET_SECONDS", "1.2"))
+FETCH_TUNE_MAX_ERROR_RATE = float(os.getenv("FETCH_TUNE_MAX_ERROR_RATE", "0.1"))
+FETCH_TUNE_WINDOW = int(os.getenv("FETCH_TUNE_WINDOW", "10"))
+# Fixed settings when auto-tuning is off (the historical values).
+STATIC_CONCURRENCY = 30
+
+metrics.describe_gauge("tidesonar_fetch_concurrency", "Auto-tuned in-flight ssjy_more requests per tier.")
+metrics.describe_gauge("tidesonar_fetch_batch_size", "Auto-tuned codes per ssjy_more request per tier.")
+metrics.describe_counter("tidesonar_fetch_tuning_total", "Auto-tuner adjustments per tier and direction.")
+
+
+class TierTuning:
+    def __init__(self, concurrency: int, batch_size: int):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.in_flight = 0
+        self.latencies: List[float] = []
+        self.samples = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.last_p90: float | None = None
+        self.last_error_rate: float | None = None
+        self.increases = 0
+        self.decreases = 0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+            "in_flight": self.in_flight,
+            "last_p90_seconds": round(self.last_p90, 3) if self.last_p90 is not None else None,
+            "last_error_rate": round(self.last_error_rate, 3) if self.last_error_rate is not None else None,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+class FetchTuner:
+    """
+    AIMD control of in-flight requests and batch packing, per polling tier.
+
+    Every ssjy_more attempt reports its latency and outcome. Once a window of
+    max(FETCH_TUNE_WINDOW, concurrency) samples is complete:
+
+    - slow (p90 over target) or failing: halve concurrency; when the trouble is
+      latency or timeouts, also pack fewer codes per request;
+    - healthy: one more request in flight, and grow batches back towards the
+      provider cap of 20 (fewer requests per sweep, less quota).
+
+    The rolling rate limiter still caps requests per minute; this only decides
+    how many run at once and how codes are split. Thread-safe.
+    """
+
+    def __init__(self, enabled: bool = FETCH_AUTOTUNE):
+        self.enabled = enabled
+        self.tiers: Dict[str, TierTuning] = {}
+        self._cond = threading.Condition()
+
+    def _tier(self, tier: str) -> TierTuning:
+        state = self.tiers.get(tier)
+        if state is None:
+            concurrency = FETCH_INITIAL_CONCURRENCY if self.enabled else STATIC_CONCURRENCY
+            state = self.tiers[tier] = TierTuning(concurrency, PROVIDER_MAX_BATCH_SIZE)
+            self._publish(tier, state)
+        return state
+
+    def _publish(self, tier: str, state: TierTuning) -> None:
+        metrics.set_gauge("tidesonar_fetch_concurrency", state.concurrency, tier=tier)
+        metrics.set_gauge("tidesonar_fetch_batch_size", state.batch_size, tier=tier)
+
+    def plan_batches(self, tier: str, codes: List[str]) -> List[List[str]]:
+        """Split codes into evenly sized batches of at most the tier's batch size (no 1-code tail)."""
+        if not codes:
+            return []
+        with self._cond:
+            batch_size = self._tier(tier).batch_size
+        count = -(-len(codes) // batch_size)
+        size = -(-len(codes) // count)
+        return [codes[i:i + size] for i in range(0, len(codes), size)]
+
+    def pool_size(self, tiers: List[str]) -> int:
+        """Worker threads needed to run every tier at its current concurrency."""
+        with self._cond:
+            return max(1, min(FETCH_MAX_CONCURRENCY * 2, sum(self._tier(tier).concurrency for tier in tiers)))
+
+    @contextmanager
+    def slot(self, tier: str) -> Iterator[None]:
+        """Hold one of the tier's in-flight slots for the duration of a request."""
+        with self._cond:
+            state = self._tier(tier)
+            while state.in_flight >= state.concurrency:
+                self._cond.wait()
+            state.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                state.in_flight -= 1
+                self._cond.notify_all()
+
+    def record(self, tier: str, seconds: float, outcome: str) -> None:
+        if not self.enabled:
+            return
+        with self._cond:
+            state = self._tier(tier)
+            state.samples += 1
+            if outcome == "ok":
+                state.latencies.append(seconds)
+            else:
+                state.failures += 1
+                if outcome == "timeout":
+                    state.timeouts += 1
+            if state.samples >= max(FETCH_TUNE_WINDOW, state.concurrency):
+                self._adjust(tier, state)
+                self._cond.notify_all()
+
+    def _adjust(self, tier: str, state: TierTuning) -> None:
+        latencies = sorted(state.latencies)
+        p90 = latencies[min(len(latencies) - 1, int(0.9 * len(latencies)))] if latencies else None
+        error_rate = state.failures / state.samples
+        slow = (p90 is not None and p90 > FETCH_LATENCY_TARGET_SECONDS) or state.timeouts > 0
+        if slow or error_rate > FETCH_TUNE_MAX_ERROR_RATE:
+            state.concurrency = max(FETCH_MIN_CONCURRENCY, state.concurrency // 2)
+            if slow:
+                state.batch_size = max(FETCH_MIN_BATCH_SIZE, state.batch_size - 5)
+            state.decreases += 1
+            metrics.inc("tidesonar_fetch_tuning_total", tier=tier, direction="down")
+        else:
+            state.concurrency = min(FETCH_MAX_CONCURRENCY, state.concurrency + 1)
+            if p90 is not None and p90 < FETCH_LATENCY_TARGET_SECONDS / 2:
+                state.batch_size = min(PROVIDER_MAX_BATCH_SIZE, state.batch_size + 2)
+            state.increases += 1
+            metrics.inc("tidesonar_fetch_tuning_total", tier=tier, direction="up")
+        state.last_p90 = p90
+        state.last_error_rate = error_rate
+        state.latencies = []
+        state.samples = state.failures = state.timeouts = 0
+        self._publish(tier, state)
+
+    def status(self) -> Dict[str, object]:
+        with self._cond:
+            tiers = {tier: state.to_dict() for tier, state in self.tiers.items()}
+        return {
+            "enabled": self.enabled,
+            "latency_target_seconds": FETCH_LATENCY_TARGET_SECONDS,
+            "max_error_rate": FETCH_TUNE_MAX_ERROR_RATE,
+            "concurrency_range": [FETCH_MIN_CONCURRENCY, FETCH_MAX_CONCURRENCY],
+            "batch_size_range": [FETCH_MIN_BATCH_SIZE, PROVIDER_MAX_BATCH_SIZE],
+            "tiers": tiers,
+        }
+
+
+fetch_tuner = FetchTuner()
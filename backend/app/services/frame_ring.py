@@ -0,0 +1,313 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import struct
+import time
+import uuid
+from multiprocessing import get_context, shared_memory
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from backend.app.core.metrics import metrics
+from backend.app.core.startup import startup_timer
+from backend.app.models.stock import StockAlert
+from backend.app.services.subscriptions import SelectionEntry
+
+logger = logging.getLogger(__name__)
+
+# Set by the supervisor for the uvicorn workers it spawns (see serve_multiprocess).
+RING_ENV = "TIDESONAR_FRAME_RING"
+RING_SLOTS = int(os.getenv("FRAME_RING_SLOTS", "16"))
+RING_SLOT_BYTES = int(os.getenv("FRAME_RING_SLOT_BYTES", str(1 << 20)))
+RING_POLL_SECONDS = float(os.getenv("FRAME_RING_POLL_SECONDS", "0.02"))
+MAX_READERS = 64
+READER_STALE_SECONDS = 10.0
+
+CHANNEL_ALERTS = 0
+CHANNEL_HEATMAP = 1
+CHANNEL_INDEX = 2
+CHANNEL_LIMIT = 3
+CHANNELS = {"alerts": CHANNEL_ALERTS, "heatmap": CHANNEL_HEATMAP, "index": CHANNEL_INDEX, "limit": CHANNEL_LIMIT}
+
+# magic, slots, slot_bytes, write_seq, producer_pid
+_HEADER = struct.Struct("<8sIIQI")
+# heartbeat (unix time), pid, alert clients, heatmap clients
+_READER = struct.Struct("<dIII")
+# seq, channel, length
+_SLOT = struct.Struct("<QBI")
+_MAGIC = b"TSRING01"
+_READERS_OFFSET = 64
+_SLOTS_OFFSET = _READERS_OFFSET + MAX_READERS * _READER.size
+
+metrics.describe_counter("tidesonar_ring_frames_total", "Frames written to / read from the shared-memory ring by role.")
+metrics.describe_counter("tidesonar_ring_skipped_total", "Ring frames a worker missed because it fell behind or read a torn slot.")
+
+
+class FrameRing:
+    """
+    Single-writer ring of frames in POSIX shared memory.
+
+    Each slot is `[seq, channel, length, payload]`. The writer zeroes `seq`,
+    writes the payload, then stores `seq` and finally bumps the header's
+    `write_seq`; readers copy the payload and re-check `seq`, so a slot being
+    overwritten mid-read is detected and skipped. Frames are complete states
+    (a whole selection, a whole heat map), so a reader that falls behind jumps
+    to the newest frames instead of replaying the backlog.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.buf = shm.buf
+        self.owner = owner
+        magic, self.slots, self.slot_bytes, _, _ = _HEADER.unpack_from(self.buf, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Shared memory {shm.name} is not a frame ring")
+        self.payload_bytes = self.slot_bytes - _SLOT.size
+        self.read_seq = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def create(cls, slots: int = RING_SLOTS, slot_bytes: int = RING_SLOT_BYTES) -> "FrameRing":
+        name = f"tidesonar-{uuid.uuid4().hex[:12]}"
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_SLOTS_OFFSET + slots * slot_bytes)
+        shm.buf[:_SLOTS_OFFSET] = bytes(_SLOTS_OFFSET)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, slots, slot_bytes, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "FrameRing":
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            # Older Pythons register attachments too. Producer and workers are spawned by the
+            # creating process and share its resource tracker, so the creator's unlink clears it.
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    def close(self) -> None:
+        self.buf.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def write_seq(self) -> int:
+        return _HEADER.unpack_from(self.buf, 0)[3]
+
+    def _slot_offset(self, seq: int) -> int:
+        return _SLOTS_OFFSET + (seq % self.slots) * self.slot_bytes
+
+    # --- writer -----------------------------------------------------------
+
+    def write(self, channel: int, payload: bytes) -> bool:
+        if len(payload) > self.payload_bytes:
+            logger.error("Frame of %s bytes exceeds ring slot (%s); raise FRAME_RING_SLOT_BYTES", len(payload), self.payload_bytes)
+            return False
+        seq = self.write_seq() + 1
+        offset = self._slot_offset(seq)
+        _SLOT.pack_into(self.buf, offset, 0, channel, len(payload))
+        start = offset + _SLOT.size
+        self.buf[start:start + len(payload)] = payload
+        _SLOT.pack_into(self.buf, offset, seq, channel, len(payload))
+        _HEADER.pack_into(self.buf, 0, _MAGIC, self.slots, self.slot_bytes, seq, os.getpid())
+        metrics.inc("tidesonar_ring_frames_total", role="write")
+        return True
+
+    def remote_clients(self, channel: int) -> int:
+        now = time.time()
+        total = 0
+        for index in range(MAX_READERS):
+            heartbeat, pid, alerts, heatmap = _READER.unpack_from(self.buf, _READERS_OFFSET + index * _READER.size)
+            if pid and now - heartbeat <= READER_STALE_SECONDS:
+                total += alerts if channel == CHANNEL_ALERTS else heatmap
+        return total
+
+    # --- readers ----------------------------------------------------------
+
+    def claim_reader_slot(self) -> int:
+        pid = os.getpid()
+        for index in range(MAX_READERS):
+            offset = _READERS_OFFSET + index * _READER.size
+            heartbeat, owner, _, _ = _READER.unpack_from(self.buf, offset)
+            if owner == 0 or time.time() - heartbeat > READER_STALE_SECONDS:
+                _READER.pack_into(self.buf, offset, time.time(), pid, 0, 0)
+                time.sleep(0.01)
+                if _READER.unpack_from(self.buf, offset)[1] == pid:
+                    return index
+        raise RuntimeError(f"All {MAX_READERS} frame ring reader slots are in use")
+
+    def report_clients(self, index: int, alerts: int, heatmap: int) -> None:
+        _READER.pack_into(self.buf, _READERS_OFFSET + index * _READER.size, time.time(), os.getpid(), alerts, heatmap)
+
+    def release_reader_slot(self, index: int) -> None:
+        _READER.pack_into(self.buf, _READERS_OFFSET + index * _READER.size, 0.0, 0, 0, 0)
+
+    def read_new(self) -> Iterator[Tuple[int, bytes]]:
+        """Frames written since the last call, oldest first."""
+        latest = self.write_seq()
+        if latest <= self.read_seq:
+            return
+        first = max(self.read_seq + 1, latest - self.slots + 1)
+        if first > self.read_seq + 1:
+            metrics.inc("tidesonar_ring_skipped_total", first - self.read_seq - 1)
+        for seq in range(first, latest + 1):
+            offset = self._slot_offset(seq)
+            slot_seq, channel, length = _SLOT.unpack_from(self.buf, offset)
+            if slot_seq != seq:
+                metrics.inc("tidesonar_ring_skipped_total")
+                continue
+            start = offset + _SLOT.size
+            payload = bytes(self.buf[start:start + length])
+            if _SLOT.unpack_from(self.buf, offset)[0] != seq:
+                metrics.inc("tidesonar_ring_skipped_total")
+                continue
+            metrics.inc("tidesonar_ring_frames_total", role="read")
+            yield channel, payload
+        self.read_seq = latest
+
+
+def encode_selection(entries: List[SelectionEntry], context: Optional[Dict[str, object]] = None) -> bytes:
+    # One line per alert: "<score>\t<alert json>" (the JSON itself never contains a raw newline),
+    # after an optional "#<scoring context json>" line.
+    lines = [f"#{json.dumps(context, ensure_ascii=False)}"] if context else []
+    lines.extend(f"{score!r}\t{payload}" for _, payload, score in entries)
+    return "\n".join(lines).encode("utf-8")
+
+
+def decode_selection(frame: bytes) -> Tuple[List[SelectionEntry], Dict[str, object]]:
+    entries: List[SelectionEntry] = []
+    context: Dict[str, object] = {}
+    if not frame:
+        return entries, context
+    for line in frame.decode("utf-8").split("\n"):
+        if line.startswith("#"):
+            context = json.loads(line[1:])
+            continue
+        score, payload = line.split("\t", 1)
+        entries.append((StockAlert.model_validate_json(payload), payload, float(score)))
+    return entries, context
+
+
+class RingPublisher:
+    """Producer-side hook for ConnectionManager: mirrors broadcasts into the ring."""
+
+    def __init__(self, ring: FrameRing):
+        self.ring = ring
+
+    def publish_selection(self, channel: str, entries: List[SelectionEntry], context: Optional[Dict[str, object]] = None) -> None:
+        self.ring.write(CHANNELS[channel], encode_selection(entries, context))
+
+    def publish(self, channel: str, message: str) -> None:
+        self.ring.write(CHANNELS[channel], message.encode("utf-8"))
+
+    def remote_clients(self, channel: str) -> int:
+        return self.ring.remote_clients(CHANNELS[channel])
+
+
+async def run_ring_reader(ring_name: str) -> None:
+    """Worker-side loop: replay ring frames to this process's WebSocket clients."""
+    from backend.app.services.websocket_manager import heatmap_manager, manager
+
+    ring = FrameRing.attach(ring_name)
+    # Replay what is still in the ring so a fresh worker has the current selection and heat map.
+    ring.read_seq = max(0, ring.write_seq() - ring.slots)
+    index = ring.claim_reader_slot()
+    logger.info("Frame ring reader %s attached to %s", index, ring_name)
+    # Workers do no warmup of their own; the producer process owns the universe and baselines.
+    startup_timer.mark_ready()
+    try:
+        while True:
+            ring.report_clients(index, len(manager.active_connections), len(heatmap_manager.active_connections))
+            for channel, payload in ring.read_new():
+                try:
+                    if channel == CHANNEL_ALERTS:
+                        await manager.broadcast_selection(*decode_selection(payload))
+                    elif channel == CHANNEL_HEATMAP:
+                        frame = payload.decode("utf-8")
+                        heatmap_manager.update_snapshot([frame])
+                        await heatmap_manager.broadcast(frame)
+                    elif channel == CHANNEL_INDEX:
+                        await manager.send_index(json.loads(payload))
+                    elif channel == CHANNEL_LIMIT:
+                        await manager.send_limit_events(json.loads(payload))
+                except Exception as exc:
+                    logger.error("Frame ring dispatch error: %s", exc)
+            await asyncio.sleep(RING_POLL_SECONDS)
+    finally:
+        ring.release_reader_slot(index)
+        ring.close()
+
+
+async def _produce() -> None:
+    from backend.app.services.health import supervise_producer
+    from backend.app.services.history_scheduler import start_scheduler
+    from backend.app.services.producer_task import run_mock_producer
+    from backend.app.services.tick_store import tick_store
+
+    tasks = [asyncio.create_task(supervise_producer(run_mock_producer)), asyncio.create_task(start_scheduler())]
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda: [task.cancel() for task in tasks])
+    try:
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await asyncio.to_thread(tick_store.stop)
+
+
+def run_ring_producer(ring_name: str) -> None:
+    """Entry point of the producer process: the only process that polls Biying."""
+    logging.basicConfig(level=logging.INFO)
+    from backend.app.services.websocket_manager import heatmap_manager, manager
+
+    ring = FrameRing.attach(ring_name)
+    publisher = RingPublisher(ring)
+    manager.publisher = publisher
+    heatmap_manager.publisher = publisher
+    try:
+        asyncio.run(_produce())
+    finally:
+        ring.close()
+
+
+def serve_multiprocess(app: str, host: str, port: int, workers: int, **uvicorn_options: object) -> None:
+    """
+    One producer process + `workers` uvicorn worker processes sharing a frame ring.
+    Workers inherit RING_ENV and run `run_ring_reader` instead of the producer.
+    """
+    import uvicorn
+
+    ring = FrameRing.create()
+    os.environ[RING_ENV] = ring.name
+    producer = get_context("spawn").Process(target=run_ring_producer, args=(ring.name,), name="tidesonar-producer")
+    producer.start()
+    logger.info("Producer pid=%s, %s web workers, frame ring %s", producer.pid, workers, ring.name)
+    try:
+        uvicorn.run(app, host=host, port=port, workers=workers, **uvicorn_options)
+    finally:
+        producer.terminate()
+        producer.join(timeout=10)
+        ring.close()
+
+
+def ring_name_from_env() -> Optional[str]:
+    return os.getenv(RING_ENV) or None
+
+
+def require_producer_process() -> None:
+    """
+    Dependency for endpoints whose state lives in the producer process (runtime
+    policy, regime, scoring, quote cache). A multi-process web worker answers
+    503 instead of reading or changing its own idle copy.
+    """
+    if ring_name_from_env():
+        raise HTTPException(
+            status_code=503,
+            detail="Not available in multi-process mode: this state lives in the producer process (set it via the environment)",
+        )
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from backend.app.core.metrics import metrics
+from backend.app.core.startup import startup_timer
+from backend.app.services.market_schedule import MarketSchedule
+
+logger = logging.getLogger(__name__)
+
+# Readiness fails when no tier has fetched successfully for this long while the market is open.
+HEALTH_STALE_SECONDS = float(os.getenv("HEALTH_STALE_SECONDS", "120"))
+# Liveness fails when the producer loop has not iterated for this long (stuck fetch / deadlock).
+HEALTH_LOOP_STUCK_SECONDS = float(os.getenv("HEALTH_LOOP_STUCK_SECONDS", "300"))
+# Freshness objective: newest successful fetch is at most this old during trading hours.
+FRESHNESS_SLO_SECONDS = float(os.getenv("FRESHNESS_SLO_SECONDS", "30"))
+PRODUCER_RESTART_MAX_BACKOFF_SECONDS = float(os.getenv("PRODUCER_RESTART_MAX_BACKOFF_SECONDS", "60"))
+# A producer run that lasted this long resets the restart backoff.
+PRODUCER_STABLE_SECONDS = 300.0
+
+metrics.describe_counter("tidesonar_producer_restarts_total", "Producer task restarts after a crash or unexpected exit.")
+metrics.describe_counter("tidesonar_freshness_seconds_total", "Trading-hours seconds with the feed within / outside FRESHNESS_SLO_SECONDS.")
+
+
+class TierStatus:
+    def __init__(self):
+        self.last_attempt: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self.last_success_at: Optional[str] = None
+        self.last_codes = 0
+        self.last_hits = 0
+        self.consecutive_failures = 0
+
+    def to_dict(self, now: float) -> Dict[str, object]:
+        return {
+            "last_success_at": self.last_success_at,
+            "age_seconds": round(now - self.last_success, 1) if self.last_success is not None else None,
+            "last_codes": self.last_codes,
+            "last_hits": self.last_hits,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class HealthState:
+    """
+    Producer liveness, feed freshness and the freshness SLO.
+
+    The producer reports heartbeats and per-tier fetch outcomes. The
+    supervisor reports task state. Freshness is accounted exactly between
+    updates: the feed is stale from `last_success + FRESHNESS_SLO_SECONDS` on.
+    Time is counted only while the market is open and the producer is not
+    idling for lack of clients.
+    """
+
+    def __init__(self):
+        self.role = "producer"
+        self.producer_state = "starting"
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[str] = None
+        self.last_heartbeat: Optional[float] = None
+        self.idle = False
+        self.tiers: Dict[str, TierStatus] = {}
+        self.last_success: Optional[float] = None
+        self.fresh_seconds = 0.0
+        self.stale_seconds = 0.0
+        self.stale_episodes = 0
+        self._accounted_until: Optional[float] = None
+        self._was_stale = False
+        self._source = None
+        self._pulse = None
+        self._clients: Callable[[], int] = lambda: 0
+
+    def attach(self, source=None, pulse=None, clients: Optional[Callable[[], int]] = None) -> None:
+        if source is not None:
+            self._source = source
+        if pulse is not None:
+            self._pulse = pulse
+        if clients is not None:
+            self._clients = clients
+
+    # --- producer / supervisor hooks --------------------------------------
+
+    def set_state(self, state: str, error: Optional[BaseException] = None) -> None:
+        self.producer_state = state
+        if error is not None:
+            self.last_error = f"{type(error).__name__}: {error}"
+            self.last_error_at = datetime.now().isoformat(timespec="seconds")
+
+    def heartbeat(self, idle: bool = False) -> None:
+        now = time.monotonic()
+        self._account(now)
+        self.last_heartbeat = now
+        self.idle = idle
+
+    def record_fetch(self, due_tiers: Dict[str, List[str]], fetched_codes: set) -> None:
+        now = time.monotonic()
+        self._account(now)
+        success = False
+        for tier, codes in due_tiers.items():
+            status = self.tiers.setdefault(tier, TierStatus())
+            hits = sum(1 for code in codes if code in fetched_codes)
+            status.last_attempt = now
+            status.last_codes = len(codes)
+            status.last_hits = hits
+            if hits:
+                status.last_success = now
+                status.last_success_at = datetime.now().isoformat(timespec="seconds")
+                status.consecutive_failures = 0
+                success = True
+            else:
+                status.consecutive_failures += 1
+        if success:
+            self.last_success = now
+
+    # --- freshness accounting ---------------------------------------------
+
+    def feed_age(self, now: Optional[float] = None) -> Optional[float]:
+        if self.last_success is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.last_success
+
+    def _account(self, now: float) -> None:
+        start = self._accounted_until
+        self._accounted_until = now
+        if start is None or self.idle or not MarketSchedule.is_market_open():
+            return
+        if self.last_success is None:
+            stale = now - start
+        else:
+            stale = max(0.0, now - max(start, self.last_success + FRESHNESS_SLO_SECONDS))
+        fresh = (now - start) - stale
+        self.fresh_seconds += fresh
+        self.stale_seconds += stale
+        if fresh:
+            metrics.inc("tidesonar_freshness_seconds_total", fresh, state="fresh")
+        if stale:
+            metrics.inc("tidesonar_freshness_seconds_total", stale, state="stale")
+        is_stale = self.last_success is None or now - self.last_success > FRESHNESS_SLO_SECONDS
+        if is_stale and not self._was_stale:
+            self.stale_episodes += 1
+        self._was_stale = is_stale
+
+    # --- reports ----------------------------------------------------------
+
+    def quote_ages(self) -> Dict[str, object]:
+        if self._pulse is None or not len(self._pulse):
+            return {"count": 0}
+        ages = self._pulse.quote_ages(time.monotonic())
+        p50, p90, p99 = np.percentile(ages, [50, 90, 99])
+        return {
+            "count": int(ages.size),
+            "p50": round(float(p50), 1),
+            "p90": round(float(p90), 1),
+            "p99": round(float(p99), 1),
+            "max": round(float(ages.max()), 1),
+        }
+
+    def rate_limiter(self) -> Dict[str, object]:
+        if self._source is None:
+            return {}
+        usage = self._source.rate_limit_usage()
+        capacity = self._source.max_requests_per_minute
+        return {"usage": usage, "capacity": capacity, "saturation": round(usage / capacity, 3) if capacity else None}
+
+    def fetch(self) -> Dict[str, object]:
+        if self._source is None:
+            return {}
+        report = self._source.last_fetch_report or {}
+        return {
+            "circuit": self._source.circuit.state,
+            "circuit_opened": self._source.circuit.opened_count,
+            "last_requested": report.get("requested"),
+            "last_fetched": report.get("fetched"),
+            "last_retries": report.get("retries"),
+            "last_hedges": report.get("hedges"),
+            "last_bulk": report.get("bulk"),
+            "last_missed": {tier: len(codes) for tier, codes in report.get("missed", {}).items()},
+        }
+
+    def liveness_problems(self) -> List[str]:
+        problems = []
+        if self.role != "producer":
+            return problems
+        if self.producer_state == "running" and self.last_heartbeat is not None:
+            silent = time.monotonic() - self.last_heartbeat
+            if silent > HEALTH_LOOP_STUCK_SECONDS:
+                problems.append(f"producer loop silent for {silent:.0f}s")
+        return problems
+
+    def readiness_problems(self) -> List[str]:
+        problems = self.liveness_problems()
+        if not startup_timer.is_ready():
+            problems.append("warmup in progress")
+        if self.role != "producer":
+            return problems
+        if self.producer_state != "running":
+            problems.append(f"producer {self.producer_state}")
+        elif not self.idle and MarketSchedule.is_market_open():
+            age = self.feed_age()
+            if age is not None and age > HEALTH_STALE_SECONDS:
+                problems.append(f"no successful fetch for {age:.0f}s")
+        return problems
+
+    def status(self) -> Dict[str, object]:
+        now = time.monotonic()
+        self._account(now)
+        accounted = self.fresh_seconds + self.stale_seconds
+        age = self.feed_age(now)
+        return {
+            "role": self.role,
+            "producer": {
+                "state": self.producer_state,
+                "idle": self.idle,
+                "restarts": self.restarts,
+                "last_error": self.last_error,
+                "last_error_at": self.last_error_at,
+                "heartbeat_age_seconds": round(now - self.last_heartbeat, 1) if self.last_heartbeat is not None else None,
+            },
+            "market_open": MarketSchedule.is_market_open(),
+            "feed_age_seconds": round(age, 1) if age is not None else None,
+            "tiers": {tier: status.to_dict(now) for tier, status in self.tiers.items()},
+            "quote_age_seconds": self.quote_ages(),
+            "rate_limiter": self.rate_limiter(),
+            "fetch": self.fetch(),
+            "clients": self._clients(),
+            "freshness_slo": {
+                "target_seconds": FRESHNESS_SLO_SECONDS,
+                "fresh_seconds": round(self.fresh_seconds, 1),
+                "stale_seconds": round(self.stale_seconds, 1),
+                "compliance": round(self.fresh_seconds / accounted, 4) if accounted else None,
+                "stale_episodes": self.stale_episodes,
+            },
+        }
+
+
+health = HealthState()
+
+
+async def supervise_producer(factory: Callable[[], Awaitable[None]]) -> None:
+    """
+    Run the producer and restart it with exponential backoff when it crashes
+    or returns unexpectedly. Cancelling the supervisor stops the producer.
+    """
+    backoff = 1.0
+    while True:
+        health.set_state("running")
+        started = time.monotonic()
+        task = asyncio.create_task(factory())
+        try:
+            # shield: our own cancellation must not look like a producer exit.
+            await asyncio.shield(task)
+            error: Optional[BaseException] = RuntimeError("producer loop exited")
+        except asyncio.CancelledError:
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+            health.set_state("stopped")
+            raise
+        except Exception as exc:
+            error = exc
+
+        if time.monotonic() - started >= PRODUCER_STABLE_SECONDS:
+            backoff = 1.0
+        health.restarts += 1
+        health.set_state("restarting", error)
+        metrics.inc("tidesonar_producer_restarts_total")
+        logger.error("Producer stopped (%s); restarting in %.0fs", error, backoff)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, PRODUCER_RESTART_MAX_BACKOFF_SECONDS)
@@ -1,11 +1,13 @@
-import aiohttp
 import asyncio
 import logging
 import os
 import json
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, List, Dict, Optional
 import sys
 
+if TYPE_CHECKING:
+    import aiohttp  # imported lazily: only the post-close update needs it
+
 # Add project root to path for imports when running as script
 sys.path.append(os.getcwd())
 
@@ -28,7 +30,7 @@ HISTORY_DATA_FILE = os.path.join(DATA_DIR, "history_baseline.json")
 
 logger = logging.getLogger(__name__)
 
-async def fetch_history_data(stock_code: str, session: aiohttp.ClientSession) -> List[Dict]:
+async def fetch_history_data(stock_code: str, session: "aiohttp.ClientSession") -> List[Dict]:
     """
     Fetch historical K-line data (5-minute).
     """
@@ -132,6 +134,8 @@ async def update_history_baseline(stock_list: Optional[List[str]] = None):
     baselines = {}
     total = len(target_codes)
     
+    import aiohttp
+
     # Setup connection limit
     connector = aiohttp.TCPConnector(limit=20) 
     
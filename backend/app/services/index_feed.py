@@ -0,0 +1,79 @@
+import os
+import time
+from typing import Dict, List, Optional, TypedDict
+
+INDEX_FEED_ENABLED = os.getenv("INDEX_FEED_ENABLED", "true").lower() == "true"
+# 4 requests per poll: every 5 s is 48 of the per-minute budget.
+INDEX_FEED_INTERVAL_SECONDS = float(os.getenv("INDEX_FEED_INTERVAL_SECONDS", "5.0"))
+
+# Index group -> hsindex/real/time code.
+DEFAULT_INDEX_QUOTE_CODES: Dict[str, str] = {
+    "HS300": "000300",
+    "ZZ500": "000905",
+    "ZZ1000": "000852",
+    "ZZ2000": "932000",
+}
+
+
+def _parse_codes(raw: Optional[str]) -> Dict[str, str]:
+    """INDEX_QUOTE_CODES="HS300=000300,ZZ500=000905,..." overrides the defaults."""
+    if not raw:
+        return dict(DEFAULT_INDEX_QUOTE_CODES)
+    codes: Dict[str, str] = {}
+    for part in raw.split(","):
+        name, _, code = part.partition("=")
+        if name.strip() and code.strip():
+            codes[name.strip()] = code.strip()
+    return codes
+
+
+INDEX_QUOTE_CODES = _parse_codes(os.getenv("INDEX_QUOTE_CODES"))
+
+
+class IndexQuote(TypedDict):
+    index_code: str
+    code: str
+    price: float
+    pct_chg: float
+    timestamp: str
+
+
+class IndexFeed:
+    """
+    Latest index-level quotes (HS300/ZZ500/ZZ1000/ZZ2000).
+
+    The producer polls on the hot tier at most every INDEX_FEED_INTERVAL_SECONDS.
+    Detection reads `returns()` for each alert's excess return. Clients get the
+    ticks as a `{"type": "index", "data": [...]}` message.
+    """
+
+    def __init__(self, codes: Dict[str, str] = INDEX_QUOTE_CODES, interval_seconds: float = INDEX_FEED_INTERVAL_SECONDS):
+        self.codes = codes
+        self.interval_seconds = interval_seconds
+        self.quotes: Dict[str, IndexQuote] = {}
+        self.next_fetch = 0.0
+
+    def due(self, now: Optional[float] = None) -> bool:
+        return INDEX_FEED_ENABLED and bool(self.codes) and (time.monotonic() if now is None else now) >= self.next_fetch
+
+    def update(self, quotes: Dict[str, IndexQuote], now: Optional[float] = None) -> bool:
+        """Store fetched quotes; True when something changed."""
+        self.next_fetch = (time.monotonic() if now is None else now) + self.interval_seconds
+        changed = False
+        for index_code, quote in quotes.items():
+            if self.quotes.get(index_code) != quote:
+                self.quotes[index_code] = quote
+                changed = True
+        return changed
+
+    def returns(self) -> Dict[str, float]:
+        return {index_code: quote["pct_chg"] for index_code, quote in self.quotes.items()}
+
+    def message(self) -> Optional[Dict[str, object]]:
+        if not self.quotes:
+            return None
+        data: List[IndexQuote] = [self.quotes[name] for name in self.codes if name in self.quotes]
+        return {"type": "index", "data": data}
+
+
+index_feed = IndexFeed()
@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+MEMBERSHIP_FILE = os.path.join("backend", "data", "index_membership.json")
+# Constituents change at semi-annual rebalances; refresh the cache weekly.
+INDEX_MEMBERSHIP_MAX_AGE_DAYS = float(os.getenv("INDEX_MEMBERSHIP_MAX_AGE_DAYS", "7"))
+# Display group of stocks in none of the official lists; "OTHER" is not ranked or monitored.
+INDEX_MEMBERSHIP_FALLBACK = os.getenv("INDEX_MEMBERSHIP_FALLBACK", "OTHER")
+
+# Our index names -> hszg/gg codes, highest display priority first.
+DEFAULT_INDEX_SOURCES: Dict[str, str] = {
+    "HS300": "hs300",
+    "ZZ500": "zhishu_000905",
+    "ZZ1000": "zhishu_000852",
+    "ZZ2000": "zhishu_932000",
+}
+
+
+def _parse_sources(raw: Optional[str]) -> Dict[str, str]:
+    """INDEX_MEMBERSHIP_SOURCES="HS300=hs300,ZZ500=zhishu_000905,..." overrides the defaults."""
+    if not raw:
+        return dict(DEFAULT_INDEX_SOURCES)
+    sources: Dict[str, str] = {}
+    for part in raw.split(","):
+        name, _, code = part.partition("=")
+        if name.strip() and code.strip():
+            sources[name.strip()] = code.strip()
+    return sources
+
+
+INDEX_SOURCES = _parse_sources(os.getenv("INDEX_MEMBERSHIP_SOURCES"))
+
+
+def fetch_constituents(license_key: str, index_code: str) -> List[str]:
+    url = f"http://api.biyingapi.com/hszg/gg/{index_code}/{license_key}"
+    resp = requests.get(url, timeout=15)
+    resp.raise_for_status()
+    data = resp.json()
+    if not isinstance(data, list):
+        raise ValueError(f"unexpected hszg/gg payload for {index_code}")
+    return [str(item.get("dm", "")).split(".")[0] for item in data if isinstance(item, dict) and item.get("dm")]
+
+
+def _read_cache() -> Tuple[Dict[str, List[str]], float]:
+    try:
+        with open(MEMBERSHIP_FILE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        return dict(cached.get("members") or {}), float(cached.get("fetched_at") or 0.0)
+    except (OSError, ValueError):
+        return {}, 0.0
+
+
+def load_index_members(license_key: str, sources: Mapping[str, str] = INDEX_SOURCES) -> Dict[str, List[str]]:
+    """
+    Constituents per index: one hszg/gg request per index, cached on disk.
+
+    The cache is used as-is while younger than INDEX_MEMBERSHIP_MAX_AGE_DAYS.
+    Indices that fail to download keep their cached list; an index with neither
+    is left out, and callers fall back to the concept-derived guess.
+    """
+    cached, fetched_at = _read_cache()
+    if cached and time.time() - fetched_at < INDEX_MEMBERSHIP_MAX_AGE_DAYS * 86400 and set(sources) <= set(cached):
+        logger.info("✅ Loading index membership from local cache.")
+        return {name: cached[name] for name in sources}
+
+    members: Dict[str, List[str]] = {}
+    fresh = 0
+    for name, index_code in sources.items():
+        try:
+            codes = fetch_constituents(license_key, index_code)
+            if not codes:
+                raise ValueError("empty constituent list")
+            members[name] = codes
+            fresh += 1
+        except Exception as exc:
+            logger.warning("Index membership for %s (%s) unavailable: %s", name, index_code, exc)
+            if name in cached:
+                members[name] = cached[name]
+
+    if fresh:
+        os.makedirs(os.path.dirname(MEMBERSHIP_FILE), exist_ok=True)
+        with open(MEMBERSHIP_FILE, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(), "members": members}, f, ensure_ascii=False)
+        logger.info("✅ Index membership refreshed: %s", {name: len(codes) for name, codes in members.items()})
+    return members
+
+
+def apply_primary_index(stock_map: Dict[str, dict], members: Mapping[str, List[str]], priority: List[str]) -> None:
+    """
+    Rewrite each stock's display `index` from official membership: the first
+    index in `priority` that contains it, else INDEX_MEMBERSHIP_FALLBACK.
+    No-op when no membership is available.
+    """
+    if not members:
+        return
+    primary: Dict[str, str] = {}
+    for name in reversed([name for name in priority if name in members]):
+        for code in members[name]:
+            primary[code] = name
+    for code, meta in stock_map.items():
+        if isinstance(meta, dict):
+            meta["index"] = primary.get(code, INDEX_MEMBERSHIP_FALLBACK)
@@ -0,0 +1,205 @@
+import logging
+import os
+from collections import deque
+from datetime import date, datetime
+from typing import Deque, Dict, List, Optional, Tuple, TypedDict
+
+import numpy as np
+import requests
+
+from backend.app.core.metrics import metrics
+from backend.app.models.stock import StockData
+from backend.app.services.universe import UniverseIndex
+
+logger = logging.getLogger(__name__)
+
+LIMIT_EVENTS_ENABLED = os.getenv("LIMIT_EVENTS_ENABLED", "true").lower() == "true"
+# Seed today's sealed codes from hslt/ztgc and hslt/dtgc at startup (2 requests).
+LIMIT_POOL_SEED = os.getenv("LIMIT_POOL_SEED", "true").lower() == "true"
+LIMIT_EVENT_HISTORY = int(os.getenv("LIMIT_EVENT_HISTORY", "50"))
+
+# Per-code, per-side board state.
+STATE_NONE = 0
+STATE_SEALED = 1
+STATE_BROKEN = 2
+STATE_RESEALED = 3
+STATE_NAMES = ("none", "sealed", "broken", "resealed")
+
+metrics.describe_counter("tidesonar_limit_events_total", "Limit board breaks and reseals by side and kind.")
+metrics.describe_gauge("tidesonar_limit_sealed", "Codes currently sealed at their price limit, by side.")
+
+
+class LimitEvent(TypedDict):
+    type: str  # always "limit"; distinguishes the event from ranked alerts
+    kind: str  # "break" | "reseal"
+    side: str  # "up" | "down"
+    code: str
+    name: str
+    index_code: str
+    price: float
+    pct_chg: float
+    limit_price: float
+    # board breaks on this side today, including this one
+    breaks: int
+    timestamp: str
+
+
+def _round_price(values: np.ndarray) -> np.ndarray:
+    """Exchange rounding of limit prices to the 0.01 tick (half up, not half even)."""
+    return np.floor(values * 100.0 + 0.5 + 1e-6) / 100.0
+
+
+def limit_prices(price: np.ndarray, pct: np.ndarray, prev_close: np.ndarray, limit_pct: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Limit-up / limit-down prices. The previous close comes from the quote (`yc`)
+    when known, else it is implied by price and pct_chg.
+    """
+    implied = np.divide(price, 1.0 + pct / 100.0, out=np.zeros_like(price), where=pct > -100.0)
+    prev = np.where(prev_close > 0, prev_close, implied)
+    return _round_price(prev * (1.0 + limit_pct / 100.0)), _round_price(prev * (1.0 - limit_pct / 100.0))
+
+
+def limit_flags(price: np.ndarray, pct: np.ndarray, prev_close: np.ndarray, limit_pct: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quotes trading at their limit-up / limit-down price (half-tick tolerance); never for stocks without a limit."""
+    up_price, down_price = limit_prices(price, pct, prev_close, limit_pct)
+    traded = (price > 0) & (limit_pct > 0)
+    return traded & (price >= up_price - 0.005), traded & (price <= down_price + 0.005)
+
+
+def fetch_limit_pool(license_key: str, pool: str, day: date) -> List[str]:
+    """Codes in hslt/ztgc (limit-up) or hslt/dtgc (limit-down) for a trading day."""
+    url = f"http://api.biyingapi.com/hslt/{pool}/{day.isoformat()}/{license_key}"
+    resp = requests.get(url, timeout=10)
+    resp.raise_for_status()
+    data = resp.json()
+    if not isinstance(data, list):
+        raise ValueError(f"unexpected hslt/{pool} payload")
+    return [str(item.get("dm", "")).split(".")[0] for item in data if isinstance(item, dict) and item.get("dm")]
+
+
+class LimitStateTracker:
+    """
+    Price-limit state per code and side, updated from each fetched snapshot.
+
+    none -> sealed when a quote trades at the limit, sealed/resealed -> broken
+    when it leaves it (a board break), broken -> resealed when it returns.
+    Transitions are computed on the snapshot's slots as array operations; only
+    breaks and reseals become LimitEvents. State resets on a new trading day.
+    """
+
+    def __init__(self, universe: UniverseIndex):
+        self.universe = universe
+        size = universe.size
+        self.up_state = np.zeros(size, dtype=np.int8)
+        self.down_state = np.zeros(size, dtype=np.int8)
+        self.up_breaks = np.zeros(size, dtype=np.int32)
+        self.down_breaks = np.zeros(size, dtype=np.int32)
+        self.trade_date: Optional[date] = None
+        self.recent: Deque[LimitEvent] = deque(maxlen=LIMIT_EVENT_HISTORY)
+
+    def _reset(self, day: date) -> None:
+        self.up_state[:] = STATE_NONE
+        self.down_state[:] = STATE_NONE
+        self.up_breaks[:] = 0
+        self.down_breaks[:] = 0
+        self.recent.clear()
+        self.trade_date = day
+
+    def seed(self, license_key: str, day: Optional[date] = None) -> Dict[str, int]:
+        """Mark today's ztgc/dtgc pools as sealed so a mid-session start sees their breaks."""
+        day = day or date.today()
+        if self.trade_date != day:
+            self._reset(day)
+        seeded = {}
+        for pool, state in (("ztgc", self.up_state), ("dtgc", self.down_state)):
+            try:
+                slots = self.universe.slots_for(fetch_limit_pool(license_key, pool, day))
+            except Exception as exc:
+                logger.warning("Limit pool hslt/%s unavailable: %s", pool, exc)
+                continue
+            slots = slots[slots >= 0]
+            state[slots] = STATE_SEALED
+            seeded[pool] = int(slots.size)
+        if seeded:
+            logger.info("✅ Limit pools seeded: %s", seeded)
+        return seeded
+
+    def update(self, snapshot: List[StockData], today: Optional[date] = None) -> List[LimitEvent]:
+        today = today or date.today()
+        if self.trade_date != today:
+            self._reset(today)
+        if not snapshot:
+            return []
+        slots = self.universe.slots_for(stock.code for stock in snapshot)
+        known = np.flatnonzero(slots >= 0)
+        if known.size == 0:
+            return []
+        slots = slots[known]
+        count = int(known.size)
+        stocks = [snapshot[i] for i in known.tolist()]
+        price = np.fromiter((s.price for s in stocks), dtype=np.float64, count=count)
+        pct = np.fromiter((s.pct_chg for s in stocks), dtype=np.float64, count=count)
+        prev_close = np.fromiter((s.prev_close or 0.0 for s in stocks), dtype=np.float64, count=count)
+        limit_pct = self.universe.limit_pct[slots]
+        at_up, at_down = limit_flags(price, pct, prev_close, limit_pct)
+        up_price, down_price = limit_prices(price, pct, prev_close, limit_pct)
+
+        events: List[LimitEvent] = []
+        for side, state, breaks, at_limit, limit_price in (
+            ("up", self.up_state, self.up_breaks, at_up, up_price),
+            ("down", self.down_state, self.down_breaks, at_down, down_price),
+        ):
+            current = state[slots]
+            sealed = (current == STATE_SEALED) | (current == STATE_RESEALED)
+            broke = sealed & ~at_limit
+            resealed = (current == STATE_BROKEN) & at_limit
+            state[slots] = np.where(
+                at_limit,
+                np.where(current == STATE_NONE, STATE_SEALED, np.where(current == STATE_BROKEN, STATE_RESEALED, current)),
+                np.where(sealed, STATE_BROKEN, current),
+            )
+            np.add.at(breaks, slots[broke], 1)
+            for kind, mask in (("break", broke), ("reseal", resealed)):
+                for i in np.flatnonzero(mask).tolist():
+                    events.append(self._event(kind, side, stocks[i], float(limit_price[i]), int(breaks[slots[i]])))
+            metrics.set_gauge("tidesonar_limit_sealed", self.sealed_count(side), side=side)
+
+        for event in events:
+            metrics.inc("tidesonar_limit_events_total", side=event["side"], kind=event["kind"])
+            self.recent.append(event)
+        return events
+
+    @staticmethod
+    def _event(kind: str, side: str, stock: StockData, limit_price: float, breaks: int) -> LimitEvent:
+        timestamp = stock.timestamp if isinstance(stock.timestamp, datetime) else datetime.now()
+        return {
+            "type": "limit",
+            "kind": kind,
+            "side": side,
+            "code": stock.code,
+            "name": stock.name,
+            "index_code": stock.index_code or "",
+            "price": stock.price,
+            "pct_chg": stock.pct_chg,
+            "limit_price": round(limit_price, 2),
+            "breaks": breaks,
+            "timestamp": timestamp.isoformat(timespec="seconds"),
+        }
+
+    def sealed_count(self, side: str) -> int:
+        state = self.up_state if side == "up" else self.down_state
+        return int(np.count_nonzero((state == STATE_SEALED) | (state == STATE_RESEALED)))
+
+    def state_of(self, code: str) -> Dict[str, object]:
+        slot = self.universe.slot(code)
+        if slot < 0:
+            return {}
+        return {
+            "up": STATE_NAMES[self.up_state[slot]],
+            "down": STATE_NAMES[self.down_state[slot]],
+            "up_breaks": int(self.up_breaks[slot]),
+            "down_breaks": int(self.down_breaks[slot]),
+        }
+
+    def message(self, events: List[LimitEvent]) -> Dict[str, object]:
+        return {"type": "limit", "data": events}
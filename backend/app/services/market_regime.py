@@ -0,0 +1,528 @@
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Tuple, TypedDict
+
+import numpy as np
+
+from backend.app.models.stock import StockData
+from backend.app.services.limit_state import limit_flags
+from backend.app.services.universe import UniverseIndex
+
+logger = logging.getLogger(__name__)
+
+
+class PulseMetrics(TypedDict):
+    sample_size: int
+    total_amount: float
+    limit_up_count: int
+    strong_up_count: int
+    explosive_up_count: int
+    advance_count: int
+    decline_count: int
+    limit_down_count: int
+    strong_down_count: int
+    mean_pct: float
+    pct_dispersion: float
+    industry_spread: float
+    index_dispersion: Dict[str, float]
+    leading_industries: List[Tuple[str, float]]
+    lagging_industries: List[Tuple[str, float]]
+
+
+# (name, comparison, pct_chg threshold) for the breadth buckets counted in PulseMetrics.
+# limit_up_count / limit_down_count use each board's own price limit (see limit_state.limit_flags).
+PULSE_BUCKETS = (
+    ("strong_up_count", ">=", 5.0),
+    ("explosive_up_count", ">=", 7.0),
+    ("advance_count", ">", 0.0),
+    ("decline_count", "<", 0.0),
+    ("strong_down_count", "<=", -5.0),
+)
+LIMIT_BUCKETS = ("limit_up_count", "limit_down_count")
+
+# Industries with fewer cached members than this are ignored for spread/leader stats.
+MIN_INDUSTRY_MEMBERS = int(os.getenv("REGIME_MIN_INDUSTRY_MEMBERS", "5"))
+
+
+def empty_pulse_metrics() -> PulseMetrics:
+    return {
+        "sample_size": 0,
+        "total_amount": 0.0,
+        "limit_up_count": 0,
+        "strong_up_count": 0,
+        "explosive_up_count": 0,
+        "advance_count": 0,
+        "decline_count": 0,
+        "limit_down_count": 0,
+        "strong_down_count": 0,
+        "mean_pct": 0.0,
+        "pct_dispersion": 0.0,
+        "industry_spread": 0.0,
+        "index_dispersion": {},
+        "leading_industries": [],
+        "lagging_industries": [],
+    }
+
+
+def _bucket_mask(pct: np.ndarray, op: str, threshold: float) -> np.ndarray:
+    if op == ">=":
+        return pct >= threshold
+    if op == ">":
+        return pct > threshold
+    if op == "<":
+        return pct < threshold
+    return pct <= threshold
+
+
+class _GroupMoments:
+    """Running count / sum / sum of squares of pct_chg per group id."""
+
+    def __init__(self, group_ids: np.ndarray, group_count: int):
+        self.group_ids = group_ids
+        self.n = np.zeros(group_count, dtype=np.int64)
+        self.total = np.zeros(group_count, dtype=np.float64)
+        self.total_sq = np.zeros(group_count, dtype=np.float64)
+
+    def apply(self, slots: np.ndarray, pct: np.ndarray, sign: int) -> None:
+        ids = self.group_ids[slots]
+        np.add.at(self.n, ids, sign)
+        np.add.at(self.total, ids, sign * pct)
+        np.add.at(self.total_sq, ids, sign * pct * pct)
+
+    def reset(self) -> None:
+        self.n[:] = 0
+        self.total[:] = 0.0
+        self.total_sq[:] = 0.0
+
+    def mean_std(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        populated = self.n > 0
+        n = np.where(populated, self.n, 1)
+        mean = self.total / n
+        var = np.maximum(self.total_sq / n - mean * mean, 0.0)
+        return populated, mean, np.sqrt(var)
+
+
+class MarketPulseTracker:
+    """
+    Rolling market snapshot cache with running aggregates.
+
+    Each code's latest quote is kept for `ttl_seconds`. Bucket counts, total
+    amount and per-index / per-industry moments are adjusted by the delta of
+    the codes that changed, and expiry walks an insertion-ordered map from the
+    oldest entry, so a cycle costs O(updated + expired) instead of a rescan of
+    the whole cache.
+    """
+
+    def __init__(self, universe: UniverseIndex, ttl_seconds: float):
+        self.universe = universe
+        self.ttl_seconds = ttl_seconds
+        size = universe.size
+        self.pct = np.zeros(size, dtype=np.float64)
+        self.amount = np.zeros(size, dtype=np.float64)
+        self.price = np.zeros(size, dtype=np.float64)
+        self.prev_close = np.zeros(size, dtype=np.float64)
+        self.valid = np.zeros(size, dtype=bool)
+        self.snapshots: Dict[str, StockData] = {}
+        # code -> last seen (monotonic), ordered oldest first
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._counts: Dict[str, int] = self._empty_counts()
+        self._sample_size = 0
+        self._total_amount = 0.0
+        self._pct_sum = 0.0
+        self._pct_sq_sum = 0.0
+        self._by_index = _GroupMoments(universe.index_ids, len(universe.index_names))
+        self._by_industry = _GroupMoments(universe.industry_ids, len(universe.industry_names))
+
+    @staticmethod
+    def _empty_counts() -> Dict[str, int]:
+        return {**{name: 0 for name, _, _ in PULSE_BUCKETS}, **dict.fromkeys(LIMIT_BUCKETS, 0)}
+
+    def _apply(self, slots: np.ndarray, sign: int) -> None:
+        if slots.size == 0:
+            return
+        pct = self.pct[slots]
+        self._sample_size += sign * int(slots.size)
+        self._total_amount += sign * float(self.amount[slots].sum())
+        self._pct_sum += sign * float(pct.sum())
+        self._pct_sq_sum += sign * float(np.dot(pct, pct))
+        for name, op, threshold in PULSE_BUCKETS:
+            self._counts[name] += sign * int(np.count_nonzero(_bucket_mask(pct, op, threshold)))
+        at_up, at_down = limit_flags(self.price[slots], pct, self.prev_close[slots], self.universe.limit_pct[slots])
+        self._counts["limit_up_count"] += sign * int(np.count_nonzero(at_up))
+        self._counts["limit_down_count"] += sign * int(np.count_nonzero(at_down))
+        self._by_index.apply(slots, pct, sign)
+        self._by_industry.apply(slots, pct, sign)
+
+    def _reset(self) -> None:
+        self._counts = self._empty_counts()
+        self._sample_size = 0
+        self._total_amount = 0.0
+        self._pct_sum = 0.0
+        self._pct_sq_sum = 0.0
+        self._by_index.reset()
+        self._by_industry.reset()
+
+    def update(self, snapshot: List[StockData], now: float) -> None:
+        latest = {stock.code: stock for stock in snapshot}
+        if not latest:
+            return
+
+        codes = list(latest.keys())
+        slots = self.universe.slots_for(codes)
+        known = slots >= 0
+        slots = slots[known]
+
+        self._apply(slots[self.valid[slots]], -1)
+
+        stocks = [latest[code] for code, ok in zip(codes, known) if ok]
+        self.pct[slots] = np.fromiter((s.pct_chg for s in stocks), dtype=np.float64, count=len(stocks))
+        self.amount[slots] = np.fromiter((max(0.0, s.amount) for s in stocks), dtype=np.float64, count=len(stocks))
+        self.price[slots] = np.fromiter((s.price for s in stocks), dtype=np.float64, count=len(stocks))
+        self.prev_close[slots] = np.fromiter((s.prev_close or 0.0 for s in stocks), dtype=np.float64, count=len(stocks))
+        self.valid[slots] = True
+        self._apply(slots, +1)
+
+        seen = self._seen
+        for stock in stocks:
+            self.snapshots[stock.code] = stock
+            seen[stock.code] = now
+            seen.move_to_end(stock.code)
+
+    def expire(self, now: float) -> List[str]:
+        """Drop quotes older than the TTL. Returns the expired codes."""
+        seen = self._seen
+        expired: List[str] = []
+        while seen:
+            code, seen_at = next(iter(seen.items()))
+            if (now - seen_at) <= self.ttl_seconds:
+                break
+            seen.popitem(last=False)
+            expired.append(code)
+
+        if expired:
+            slots = self.universe.slots_for(expired)
+            self._apply(slots, -1)
+            self.valid[slots] = False
+            for code in expired:
+                self.snapshots.pop(code, None)
+            if not seen:
+                self._reset()
+        return expired
+
+    def metrics(self) -> PulseMetrics:
+        result = empty_pulse_metrics()
+        n = self._sample_size
+        if n <= 0:
+            return result
+
+        result.update(self._counts)  # type: ignore[typeddict-item]
+        result["sample_size"] = n
+        result["total_amount"] = self._total_amount
+        mean = self._pct_sum / n
+        result["mean_pct"] = round(mean, 4)
+        result["pct_dispersion"] = round(float(np.sqrt(max(self._pct_sq_sum / n - mean * mean, 0.0))), 4)
+
+        populated, _, index_std = self._by_index.mean_std()
+        result["index_dispersion"] = {
+            name: round(float(index_std[i]), 4)
+            for i, name in enumerate(self.universe.index_names)
+            if populated[i]
+        }
+
+        _, industry_mean, _ = self._by_industry.mean_std()
+        names = self.universe.industry_names
+        eligible = np.flatnonzero(self._by_industry.n >= MIN_INDUSTRY_MEMBERS)
+        eligible = eligible[[bool(names[i]) for i in eligible]] if eligible.size else eligible
+        if eligible.size >= 2:
+            means = industry_mean[eligible]
+            result["industry_spread"] = round(float(means.std()), 4)
+            order = np.argsort(means)
+            result["leading_industries"] = [
+                (names[eligible[i]], round(float(means[i]), 3)) for i in order[::-1][:3]
+            ]
+            result["lagging_industries"] = [
+                (names[eligible[i]], round(float(means[i]), 3)) for i in order[:3]
+            ]
+        return result
+
+    def quote_ages(self, now: float) -> np.ndarray:
+        """Seconds since each cached quote was fetched (monotonic clock)."""
+        seen_at = np.fromiter(self._seen.values(), dtype=np.float64, count=len(self._seen))
+        return now - seen_at
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class RegimeThresholds(TypedDict):
+    min_sample: int
+    ema_alpha: float
+    # Surge (either direction). Count triggers are max(min, int(sample * ratio)).
+    limit_up_ratio: float
+    limit_up_min: int
+    strong_up_ratio: float
+    strong_up_min: int
+    explosive_ratio: float
+    explosive_min: int
+    limit_down_ratio: float
+    limit_down_min: int
+    strong_down_ratio: float
+    strong_down_min: int
+    breadth_extreme: float
+    turnover_surge_ratio: float
+    turnover_surge_floor: float
+    industry_spread_trigger: float
+    # Calm / very calm (downgrade path)
+    calm_limit_ratio: float
+    calm_limit_min: int
+    calm_strong_ratio: float
+    calm_strong_min: int
+    calm_turnover_ratio: float
+    very_calm_limit_ratio: float
+    very_calm_limit_min: int
+    very_calm_strong_ratio: float
+    very_calm_strong_min: int
+    very_calm_turnover_ratio: float
+    rebound_strong_ratio: float
+    rebound_strong_min: int
+    rebound_turnover_ratio: float
+    # Hysteresis
+    surge_hold_seconds: float
+    calm_cycles: int
+    very_calm_cycles: int
+
+
+DEFAULT_REGIME_THRESHOLDS: RegimeThresholds = {
+    "min_sample": 30,
+    "ema_alpha": 0.18,
+    "limit_up_ratio": 0.007,
+    "limit_up_min": 6,
+    "strong_up_ratio": 0.03,
+    "strong_up_min": 24,
+    "explosive_ratio": 0.015,
+    "explosive_min": 10,
+    "limit_down_ratio": 0.007,
+    "limit_down_min": 6,
+    "strong_down_ratio": 0.03,
+    "strong_down_min": 24,
+    "breadth_extreme": 0.85,
+    "turnover_surge_ratio": 1.55,
+    "turnover_surge_floor": 2e8,
+    "industry_spread_trigger": 2.5,
+    "calm_limit_ratio": 0.0025,
+    "calm_limit_min": 2,
+    "calm_strong_ratio": 0.012,
+    "calm_strong_min": 9,
+    "calm_turnover_ratio": 1.08,
+    "very_calm_limit_ratio": 0.0015,
+    "very_calm_limit_min": 1,
+    "very_calm_strong_ratio": 0.008,
+    "very_calm_strong_min": 5,
+    "very_calm_turnover_ratio": 0.95,
+    "rebound_strong_ratio": 0.018,
+    "rebound_strong_min": 12,
+    "rebound_turnover_ratio": 1.18,
+    "surge_hold_seconds": 120.0,
+    "calm_cycles": 4,
+    "very_calm_cycles": 8,
+}
+
+
+# Share-of-sample ratios (turnover ratios are multiples of the EMA and may exceed 1).
+_FRACTION_THRESHOLDS = frozenset(
+    key for key in DEFAULT_REGIME_THRESHOLDS
+    if (key.endswith("_ratio") and "turnover" not in key) or key == "breadth_extreme"
+)
+
+
+def _coerce_threshold(key: str, value: object) -> float | int:
+    """Validate one threshold value and convert it to the default's type. Raises ValueError."""
+    if isinstance(value, bool):
+        raise ValueError(f"{key} must be a number")
+    number = float(value)  # type: ignore[arg-type]
+    if not math.isfinite(number):
+        raise ValueError(f"{key} must be finite")
+    if key == "ema_alpha":
+        if not 0.0 < number <= 1.0:
+            raise ValueError(f"{key} must be in (0, 1]")
+    elif key in _FRACTION_THRESHOLDS:
+        if not 0.0 <= number <= 1.0:
+            raise ValueError(f"{key} must be in [0, 1]")
+    elif number < 0:
+        raise ValueError(f"{key} must be >= 0")
+    if isinstance(DEFAULT_REGIME_THRESHOLDS[key], int):  # type: ignore[literal-required]
+        if not number.is_integer():
+            raise ValueError(f"{key} must be an integer")
+        return int(number)
+    return number
+
+
+def _load_thresholds_from_env() -> RegimeThresholds:
+    """Every threshold can be overridden with REGIME_<KEY_UPPER>."""
+    thresholds: RegimeThresholds = {**DEFAULT_REGIME_THRESHOLDS}
+    for key in DEFAULT_REGIME_THRESHOLDS:
+        raw = os.getenv(f"REGIME_{key.upper()}")
+        if raw is not None:
+            thresholds[key] = _coerce_threshold(key, raw)  # type: ignore[literal-required]
+    return thresholds
+
+
+def _trigger(sample_size: int, ratio: float, minimum: int) -> int:
+    return max(int(minimum), int(sample_size * ratio))
+
+
+class MarketRegimeController:
+    """State machine for automatic profile switching."""
+
+    def __init__(self, thresholds: RegimeThresholds | None = None, log_size: int = 200):
+        self.thresholds: RegimeThresholds = thresholds or _load_thresholds_from_env()
+        self.ema_turnover: float | None = None
+        self.calm_counter = 0
+        self.very_calm_counter = 0
+        self.aggressive_hold_until = 0.0
+        self.last_metrics: PulseMetrics = empty_pulse_metrics()
+        self.decision_log: Deque[Dict[str, object]] = deque(maxlen=log_size)
+        self._last_logged: Tuple[str, str] = ("", "")
+
+    def update_thresholds(self, overrides: Dict[str, float]) -> RegimeThresholds:
+        unknown = set(overrides) - set(DEFAULT_REGIME_THRESHOLDS)
+        if unknown:
+            raise ValueError(f"Unknown regime thresholds: {sorted(unknown)}")
+        merged: RegimeThresholds = {**self.thresholds}
+        for key, value in overrides.items():
+            merged[key] = _coerce_threshold(key, value)  # type: ignore[literal-required]
+        self.thresholds = merged
+        logger.info("Regime thresholds updated: %s", overrides)
+        return merged
+
+    def _surge_reason(self, metrics: PulseMetrics, total_amount: float, ema_turnover: float) -> str | None:
+        t = self.thresholds
+        n = metrics["sample_size"]
+
+        if metrics["limit_up_count"] >= _trigger(n, t["limit_up_ratio"], t["limit_up_min"]) \
+                or metrics["strong_up_count"] >= _trigger(n, t["strong_up_ratio"], t["strong_up_min"]) \
+                or metrics["explosive_up_count"] >= _trigger(n, t["explosive_ratio"], t["explosive_min"]):
+            return (
+                f"surge lu={metrics['limit_up_count']} su={metrics['strong_up_count']} "
+                f"ex={metrics['explosive_up_count']} amt={total_amount:.0f}"
+            )
+        if metrics["limit_down_count"] >= _trigger(n, t["limit_down_ratio"], t["limit_down_min"]) \
+                or metrics["strong_down_count"] >= _trigger(n, t["strong_down_ratio"], t["strong_down_min"]):
+            return (
+                f"selloff ld={metrics['limit_down_count']} sd={metrics['strong_down_count']} "
+                f"amt={total_amount:.0f}"
+            )
+        breadth = max(metrics["advance_count"], metrics["decline_count"]) / n
+        if breadth >= t["breadth_extreme"]:
+            side = "up" if metrics["advance_count"] >= metrics["decline_count"] else "down"
+            return f"breadth_{side} adv={metrics['advance_count']} dec={metrics['decline_count']}"
+        if metrics["industry_spread"] >= t["industry_spread_trigger"]:
+            leader = metrics["leading_industries"][0][0] if metrics["leading_industries"] else "-"
+            laggard = metrics["lagging_industries"][0][0] if metrics["lagging_industries"] else "-"
+            return f"rotation spread={metrics['industry_spread']:.2f} lead={leader} lag={laggard}"
+        if total_amount >= max(t["turnover_surge_floor"], ema_turnover * t["turnover_surge_ratio"]):
+            return f"turnover amt={total_amount:.0f} ema={ema_turnover:.0f}"
+        return None
+
+    def decide(self, metrics: PulseMetrics, current_profile: str, now: float | None = None) -> Tuple[str, str]:
+        """Decide the target profile from aggregates maintained by MarketPulseTracker."""
+        self.last_metrics = metrics
+        t = self.thresholds
+
+        sample_size = metrics["sample_size"]
+        if sample_size < t["min_sample"]:
+            return current_profile, "insufficient_sample"
+
+        total_amount = metrics["total_amount"]
+
+        if self.ema_turnover is None:
+            self.ema_turnover = total_amount
+        else:
+            alpha = t["ema_alpha"]
+            self.ema_turnover = alpha * total_amount + (1 - alpha) * self.ema_turnover
+
+        ema_turnover = max(1.0, self.ema_turnover)
+        now_mono = time.monotonic() if now is None else now
+
+        surge_reason = self._surge_reason(metrics, total_amount, ema_turnover)
+        if surge_reason:
+            self.calm_counter = 0
+            self.very_calm_counter = 0
+            self.aggressive_hold_until = now_mono + t["surge_hold_seconds"]
+            return "aggressive", surge_reason
+
+        if now_mono < self.aggressive_hold_until:
+            return "aggressive", "surge_cooldown"
+
+        # Calm requires quiet on both sides of the tape.
+        up_extreme = metrics["limit_up_count"]
+        down_extreme = metrics["limit_down_count"]
+        up_strong = metrics["strong_up_count"]
+        down_strong = metrics["strong_down_count"]
+
+        calm = (
+            max(up_extreme, down_extreme) <= _trigger(sample_size, t["calm_limit_ratio"], t["calm_limit_min"])
+            and max(up_strong, down_strong) <= _trigger(sample_size, t["calm_strong_ratio"], t["calm_strong_min"])
+            and total_amount <= ema_turnover * t["calm_turnover_ratio"]
+        )
+        very_calm = (
+            max(up_extreme, down_extreme) <= _trigger(sample_size, t["very_calm_limit_ratio"], t["very_calm_limit_min"])
+            and max(up_strong, down_strong) <= _trigger(sample_size, t["very_calm_strong_ratio"], t["very_calm_strong_min"])
+            and total_amount <= ema_turnover * t["very_calm_turnover_ratio"]
+        )
+
+        self.calm_counter = self.calm_counter + 1 if calm else 0
+        self.very_calm_counter = self.very_calm_counter + 1 if very_calm else 0
+
+        rebound = (
+            max(up_strong, down_strong) >= _trigger(sample_size, t["rebound_strong_ratio"], t["rebound_strong_min"])
+            or total_amount >= ema_turnover * t["rebound_turnover_ratio"]
+        )
+
+        if current_profile == "aggressive" and self.calm_counter >= t["calm_cycles"]:
+            return "balanced", f"calm_{self.calm_counter}_cycles"
+
+        if current_profile == "balanced" and self.very_calm_counter >= t["very_calm_cycles"]:
+            return "conservative", f"very_calm_{self.very_calm_counter}_cycles"
+
+        if current_profile == "conservative" and rebound:
+            return "balanced", "activity_rebound"
+
+        return current_profile, "no_change"
+
+    def record_decision(self, current_profile: str, target_profile: str, reason: str) -> None:
+        """Append to the decision log on profile changes and on changes of reason kind."""
+        reason_kind = reason.split(" ", 1)[0]
+        key = (target_profile, reason_kind)
+        if key == self._last_logged and target_profile == current_profile:
+            return
+        self._last_logged = key
+        m = self.last_metrics
+        self.decision_log.append({
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "from": current_profile,
+            "to": target_profile,
+            "reason": reason,
+            "sample": m["sample_size"],
+            "adv": m["advance_count"],
+            "dec": m["decline_count"],
+            "lu": m["limit_up_count"],
+            "ld": m["limit_down_count"],
+            "spread": m["industry_spread"],
+            "amount": round(m["total_amount"], 0),
+        })
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "thresholds": dict(self.thresholds),
+            "ema_turnover": self.ema_turnover,
+            "calm_counter": self.calm_counter,
+            "very_calm_counter": self.very_calm_counter,
+            "aggressive_hold_remaining": round(max(0.0, self.aggressive_hold_until - time.monotonic()), 1),
+            "metrics": dict(self.last_metrics),
+            "decision_log": list(self.decision_log),
+        }
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backend.app.models.stock import StockAlert, StockData
+
+# (etag, encoded body, snapshot version)
+EncodedBody = Tuple[str, bytes, int]
+
+MARKET_BULK_MAX_CODES = int(os.getenv("MARKET_BULK_MAX_CODES", "500"))
+
+# Versions restart with the process; the start time keeps old ETags from matching new state.
+_EPOCH = format(int(time.time()), "x")
+
+
+def _quote_dict(stock: StockData, alert: Optional[StockAlert]) -> Dict[str, object]:
+    return {
+        "code": stock.code,
+        "name": stock.name,
+        "price": stock.price,
+        "pct_chg": stock.pct_chg,
+        "volume": stock.volume,
+        "amount": stock.amount,
+        "index_code": stock.index_code,
+        "industry": stock.industry,
+        "concept": stock.concept,
+        "timestamp": stock.timestamp.isoformat(),
+        "alert": alert.model_dump() if alert is not None else None,
+    }
+
+
+class MarketView:
+    """
+    Read-side view of the producer's caches for the REST API.
+
+    The producer attaches its live `alert_cache` and the market snapshot cache
+    (`MarketPulseTracker.snapshots`) and reports which codes each fetch touched.
+    Every fetch bumps `version`; each code remembers the version of its last
+    update, so ETags are derived from version numbers and encoded bodies are
+    cached until the code changes again. A fetch is reported only after its
+    alerts are in the cache, so a new version always covers the alert that
+    goes with the quote. Accessed from the event loop only.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.code_versions: Dict[str, int] = {}
+        self.alerts: Dict[str, StockAlert] = {}
+        self.quotes: Dict[str, StockData] = {}
+        self._encoded: Dict[str, EncodedBody] = {}
+        self._selection_version = -1
+        self._selection: Dict[str, EncodedBody] = {}
+
+    def attach(self, alerts: Dict[str, StockAlert], quotes: Dict[str, StockData]) -> None:
+        self.alerts = alerts
+        self.quotes = quotes
+        self._encoded.clear()
+
+    def update_quotes(self, snapshot: List[StockData]) -> None:
+        if not snapshot:
+            return
+        self.version += 1
+        version = self.version
+        code_versions = self.code_versions
+        encoded = self._encoded
+        for stock in snapshot:
+            code_versions[stock.code] = version
+            encoded.pop(stock.code, None)
+
+    def expire(self, codes: Iterable[str]) -> None:
+        for code in codes:
+            self.code_versions.pop(code, None)
+            self._encoded.pop(code, None)
+
+    def _state_tag(self, code: str) -> str:
+        # Alerts can also expire by TTL without a new quote, so their presence is part of the tag.
+        return f"{code}:{self.code_versions.get(code, 0)}:{1 if code in self.alerts else 0}"
+
+    def quote(self, code: str) -> Optional[EncodedBody]:
+        stock = self.quotes.get(code)
+        if stock is None:
+            return None
+        etag = f'"q-{_EPOCH}-{self._state_tag(code)}"'
+        cached = self._encoded.get(code)
+        if cached is not None and cached[0] == etag:
+            return cached
+        version = self.code_versions.get(code, 0)
+        body = json.dumps({"version": version, **_quote_dict(stock, self.alerts.get(code))}, ensure_ascii=False)
+        cached = (etag, body.encode("utf-8"), version)
+        self._encoded[code] = cached
+        return cached
+
+    def bulk_etag(self, codes: List[str]) -> str:
+        digest = hashlib.sha1("|".join(self._state_tag(code) for code in codes).encode("utf-8")).hexdigest()
+        return f'"b-{_EPOCH}-{digest[:20]}"'
+
+    def quotes_body(self, codes: List[str]) -> EncodedBody:
+        parts = []
+        missing = []
+        version = 0
+        for code in codes:
+            item = self.quote(code)
+            if item is None:
+                missing.append(code)
+                continue
+            # Per-code bodies are already encoded; splice them instead of re-serializing.
+            parts.append(json.dumps(code) + ":" + item[1].decode("utf-8"))
+            version = max(version, item[2])
+        body = (
+            '{"version":' + str(version)
+            + ',"count":' + str(len(parts))
+            + ',"quotes":{' + ",".join(parts) + "}"
+            + ',"missing":' + json.dumps(missing)
+            + "}"
+        )
+        return self.bulk_etag(codes), body.encode("utf-8"), version
+
+    def selection(self, payloads: List[str], version: int, updated_at: Optional[str], index_code: Optional[str]) -> EncodedBody:
+        """Current broadcast selection (pre-encoded alert JSON), optionally for one index."""
+        if self._selection_version != version:
+            grouped: Dict[str, List[str]] = {"all": list(payloads)}
+            for payload in payloads:
+                grouped.setdefault(json.loads(payload).get("index_code") or "unknown", []).append(payload)
+            self._selection = {}
+            for key, items in grouped.items():
+                body = (
+                    '{"version":' + str(version)
+                    + ',"updated_at":' + json.dumps(updated_at)
+                    + ',"count":' + str(len(items))
+                    + ',"alerts":[' + ",".join(items) + "]}"
+                )
+                self._selection[key] = (f'"s-{_EPOCH}-{version}-{key}"', body.encode("utf-8"), version)
+            self._selection_version = version
+        key = index_code or "all"
+        cached = self._selection.get(key)
+        if cached is None:
+            body = '{"version":' + str(version) + ',"updated_at":' + json.dumps(updated_at) + ',"count":0,"alerts":[]}'
+            cached = (f'"s-{_EPOCH}-{version}-{key}"', body.encode("utf-8"), version)
+        return cached
+
+
+market_view = MarketView()
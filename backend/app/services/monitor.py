@@ -1,25 +1,67 @@
-import redis
 import json
-import pandas as pd
+import math
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
 import numpy as np
-from typing import List
+
 from backend.app.models.stock import StockData, StockAlert
 from backend.app.core.config import settings
+from backend.app.services.features import FEATURE_NAMES, FEATURE_SPIKE_PCT, FEATURE_VOLUME_ACCEL, FeatureEngine
+from backend.app.services.universe import UniverseIndex
+
+# Minimum turnover (CNY) per index for a stock to qualify as an alert.
+DEFAULT_MIN_AMOUNTS: Dict[str, float] = {
+    "HS300": 20_000_000,
+    "ZZ500": 20_000_000,
+    "ZZ1000": 10_000_000,
+    "ZZ2000": 3_000_000, # Much lower for microcaps
+}
+DEFAULT_MIN_VOLUME = 100
+# Startup probe: fail fast instead of redis-py's default retry/backoff (~3 s when Redis is down).
+REDIS_CONNECT_TIMEOUT_SECONDS = float(os.getenv("REDIS_CONNECT_TIMEOUT_SECONDS", "1.0"))
 
 class MarketMonitor:
-    def __init__(self):
+    def __init__(
+        self,
+        min_amounts: Optional[Dict[str, float]] = None,
+        min_volume: int = DEFAULT_MIN_VOLUME,
+        use_redis: bool = True,
+        universe: Optional[UniverseIndex] = None,
+    ):
+        # Thresholds are overridable so the replay engine can sweep them.
+        self.min_amounts: Dict[str, float] = {**DEFAULT_MIN_AMOUNTS, **(min_amounts or {})}
+        self.min_volume = min_volume
+        # With a universe, per-stock thresholds and baselines are slot-aligned arrays.
+        self.universe = universe
+        self._baseline_by_slot: Optional[np.ndarray] = None
+        self._baseline_source: Optional[dict] = None
+        # Latest pct_chg per index group (index feed); alerts carry their excess over it.
+        self.index_returns: Dict[str, float] = {}
+        # Rolling per-symbol indicators (returns, VWAP deviation, volume acceleration); needs slots.
+        self.features: Optional[FeatureEngine] = FeatureEngine(universe.size) if universe is not None else None
+
         # Redis connection
-        try:
-            self.redis_client = redis.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=settings.REDIS_DB,
-                decode_responses=True
-            )
-            self.redis_client.ping() # Check connection immediately
-        except Exception as e:
-            print(f"Warning: Redis connection failed: {e}. Running in standalone mode.")
-            self.redis_client = None
+        self.redis_client = None
+        if use_redis:
+            try:
+                import redis
+                from redis.backoff import NoBackoff
+                from redis.retry import Retry
+
+                self.redis_client = redis.Redis(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.REDIS_DB,
+                    decode_responses=True,
+                    socket_connect_timeout=REDIS_CONNECT_TIMEOUT_SECONDS,
+                    retry=Retry(NoBackoff(), 0),
+                )
+                self.redis_client.ping() # Check connection immediately
+            except Exception as e:
+                print(f"Warning: Redis connection failed: {e}. Running in standalone mode.")
+                self.redis_client = None
 
         # Cache for historical averages
         # Key: Stock Code, Value: Baseline Volume (e.g. 5-day average for current minute)
@@ -78,7 +120,7 @@ class MarketMonitor:
         # 2. Fallback: Return -1 to indicate "Data Missing"
         return -1.0
 
-    def _get_trading_minutes(self, dt: pd.Timestamp) -> int:
+    def _get_trading_minutes(self, dt: datetime) -> int:
         """
         Calculate trading minutes elapsed since 9:30 today.
         Trading Hours: 9:30-11:30 (120m), 13:00-15:00 (120m).
@@ -87,13 +129,6 @@ class MarketMonitor:
         # Normalize to today's date to avoid date diff issues
         t = dt.time()
         
-        start_am = pd.Timestamp("09:30").time()
-        end_am = pd.Timestamp("11:30").time()
-        start_pm = pd.Timestamp("13:00").time()
-        end_pm = pd.Timestamp("15:00").time()
-        
-        minutes = 0
-        
         # Simple Logic: Convert to minutes from midnight
         current_min = t.hour * 60 + t.minute
         
@@ -119,63 +154,102 @@ class MarketMonitor:
             
         return 240 # Closed
 
+    def _min_amount_array(self, snapshot: List[StockData], slots: Optional[np.ndarray]) -> np.ndarray:
+        """Turnover threshold per quote (inf outside the target indices; the lowest when in several)."""
+        if slots is None:
+            return np.fromiter((self.min_amounts.get(s.index_code, np.inf) for s in snapshot), dtype=np.float64, count=len(snapshot))
+        universe = self.universe
+        by_slot = np.full(universe.size + 1, np.inf)  # last entry: codes outside the universe (slot -1)
+        for index_code, min_amount in self.min_amounts.items():
+            member = universe.member_mask((index_code,))
+            by_slot[:-1][member] = np.minimum(by_slot[:-1][member], min_amount)
+        return by_slot[slots]
+
+    def _baseline_array(self, snapshot: List[StockData], slots: Optional[np.ndarray]) -> np.ndarray:
+        """Baseline 5-min volume per quote (-1 when missing)."""
+        if slots is None:
+            return np.fromiter((self._get_baseline_volume(s.code) for s in snapshot), dtype=np.float64, count=len(snapshot))
+        if self._baseline_by_slot is None or self._baseline_source is not self.baseline_volumes:
+            baselines = self.baseline_volumes
+            by_slot = np.fromiter((baselines.get(code, -1.0) for code in self.universe.codes), dtype=np.float64, count=self.universe.size)
+            self._baseline_by_slot = np.append(by_slot, -1.0)
+            self._baseline_source = baselines
+        return self._baseline_by_slot[slots]
+
+    def _index_return_array(self, snapshot: List[StockData], slots: Optional[np.ndarray], hits: np.ndarray) -> np.ndarray:
+        """Index pct_chg for each hit's index group (nan when unknown)."""
+        returns = self.index_returns
+        if slots is None:
+            return np.fromiter((returns.get(snapshot[i].index_code, np.nan) for i in hits.tolist()), dtype=np.float64, count=hits.size)
+        names = self.universe.index_names
+        by_group = np.full(len(names) + 1, np.nan)  # last entry: codes outside the universe
+        for group_id, name in enumerate(names):
+            if name in returns:
+                by_group[group_id] = returns[name]
+        group_ids = np.append(self.universe.index_ids, len(names))
+        return by_group[group_ids[slots[hits]]]
+
     def detect_anomalies(self, snapshot: List[StockData]) -> List[StockAlert]:
+        """
+        Filters run on whole-snapshot arrays: index group / turnover threshold,
+        minimum volume and the volume ratio. Alert objects are only built for
+        the quotes that pass.
+        """
         alerts = []
-        
-        target_indices = {"HS300", "ZZ500", "ZZ1000", "ZZ2000"}
-        
+        if not snapshot:
+            return alerts
+
         # Get minutes elapsed for WR calculation
         # Use simple current time or timestamp from first stock
-        if snapshot:
-            ref_time = snapshot[0].timestamp
-            minutes_elapsed = self._get_trading_minutes(ref_time)
-            # Avoid division by zero
-            minutes_elapsed = max(1, minutes_elapsed)
+        ref_time = snapshot[0].timestamp
+        # Avoid division by zero
+        minutes_elapsed = max(1, self._get_trading_minutes(ref_time))
+
+        n = len(snapshot)
+        slots = self.universe.slots_for(s.code for s in snapshot) if self.universe is not None else None
+        amount = np.fromiter((s.amount for s in snapshot), dtype=np.float64, count=n)
+        volume = np.fromiter((s.volume for s in snapshot), dtype=np.float64, count=n)
+        if self.features is not None:
+            price = np.fromiter((s.price for s in snapshot), dtype=np.float64, count=n)
+            self.features.update(slots, price, volume, amount, ref_time)
+
+        # 1. Filter Index + 2. Dynamic turnover threshold per index (inf = not a target index)
+        # Condition A: Volume Ratio (Check Raw Volume first)
+        passed = (amount > self._min_amount_array(snapshot, slots)) & (volume >= self.min_volume)
+        hits = np.flatnonzero(passed)
+        if not hits.size:
+            return alerts
+
+        # Condition A: Volume Ratio Calculation
+        # Baseline is "Average 5-min Vol" from history_updater.
+        # Avg_1min_Vol = Baseline / 5
+        # Current_1min_Vol = Current_Vol / Minutes_Elapsed
+        # VR = Current_1min_Vol / Avg_1min_Vol (1.0 if no history)
+        baseline_5min = self._baseline_array(snapshot, slots)[hits]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.where(baseline_5min > 0, (volume[hits] / minutes_elapsed) / (baseline_5min / 5.0), 1.0)
+
+        # Excess return versus the stock's own index (idiosyncratic vs. market-wide move)
+        pct_chg = np.fromiter((snapshot[i].pct_chg for i in hits.tolist()), dtype=np.float64, count=hits.size)
+        excess = np.round(pct_chg - self._index_return_array(snapshot, slots, hits), 2)
+
+        # Rolling features for the hits, one dict per alert (nan = not enough history yet)
+        if self.features is not None:
+            columns = self.features.at(slots[hits])
+            rows = zip(*(np.round(columns[name], 2).tolist() for name in FEATURE_NAMES))
+            hit_features = [{name: value for name, value in zip(FEATURE_NAMES, row) if not math.isnan(value)} or None for row in rows]
         else:
-            minutes_elapsed = 240
-            
-        # Debug Log once per cycle
-        # print(f"[Monitor] Calculation Cycle. Minutes Elapsed: {minutes_elapsed}")
-        
-        for stock in snapshot:
-            # 1. Filter Index
-            if stock.index_code not in target_indices:
-                continue
-
-            # 2. Dynamic Filtering Logic based on Index
-            min_amount = 20_000_000 # Default for HS300/ZZ500
-            if stock.index_code == "ZZ1000":
-                min_amount = 10_000_000
-            elif stock.index_code == "ZZ2000":
-                min_amount = 3_000_000 # Much lower for microcaps
-
-            if stock.amount <= min_amount:
-                continue
-
-            # Condition A: Volume Ratio (Check Raw Volume first)
-            if stock.volume < 100:
-                continue
-
-            # Condition A: Volume Ratio Calculation
-            # Formula: (Current Vol / Minutes) / (Baseline 5-Day Avg Vol / 240 mins) ? 
-            # NO. Baseline is "Average 5-min Vol" from history_updater.
-            # Avg_1min_Vol = Baseline / 5
-            # Current_1min_Vol = Current_Vol / Minutes_Elapsed
-            # VR = Current_1min_Vol / Avg_1min_Vol
-            
-            baseline_5min = self._get_baseline_volume(stock.code)
-            
-            volume_ratio = 1.0
-            
-            if baseline_5min > 0:
-                avg_1min = baseline_5min / 5.0
-                curr_1min = stock.volume / minutes_elapsed
-                if avg_1min > 0:
-                     volume_ratio = curr_1min / avg_1min
-            else:
-                # If no history, assume 1.0
-                volume_ratio = 1.0
+            hit_features = [None] * hits.size
 
+        for i, volume_ratio, excess_pct, features in zip(hits.tolist(), ratios.tolist(), excess.tolist(), hit_features):
+            stock = snapshot[i]
+            reason = f"量比:{volume_ratio:.1f}|金额:{stock.amount/10000:.0f}万|涨幅:{stock.pct_chg}%"
+            if features:
+                # Short-term rules: a fast 1-minute move and/or an accelerating tape.
+                if abs(features.get("ret_1m", 0.0)) >= FEATURE_SPIKE_PCT:
+                    reason += f"|1分钟:{features['ret_1m']:+.2f}%"
+                if features.get("vol_accel", 0.0) >= FEATURE_VOLUME_ACCEL:
+                    reason += f"|放量加速x{features['vol_accel']:.1f}"
             # HIT!
             alert = StockAlert(
                 code=stock.code,
@@ -188,7 +262,9 @@ class MarketMonitor:
                 industry=stock.industry,
                 concept=stock.concept,
                 timestamp=stock.timestamp.isoformat(),
-                reason=f"量比:{volume_ratio:.1f}|金额:{stock.amount/10000:.0f}万|涨幅:{stock.pct_chg}%"
+                reason=reason,
+                excess_pct=None if math.isnan(excess_pct) else excess_pct,
+                features=features,
             )
             alerts.append(alert)
             self._publish_alert(alert)
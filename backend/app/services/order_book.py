@@ -0,0 +1,155 @@
+import concurrent.futures
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, TypedDict
+
+from backend.app.core.metrics import metrics
+from backend.app.models.stock import StockAlert
+from backend.app.services.biying_source import RollingRateLimiter
+
+ORDER_BOOK_ENABLED = os.getenv("ORDER_BOOK_ENABLED", "true").lower() == "true"
+# Top-ranked hot-tier alerts per index that get an order book.
+ORDER_BOOK_TOP_PER_INDEX = int(os.getenv("ORDER_BOOK_TOP_PER_INDEX", "3"))
+ORDER_BOOK_TTL_SECONDS = float(os.getenv("ORDER_BOOK_TTL_SECONDS", "3.0"))
+# Own slice of the provider budget, on top of which the shared limiter must have headroom.
+ORDER_BOOK_BUDGET_PER_MINUTE = int(os.getenv("ORDER_BOOK_BUDGET_PER_MINUTE", "120"))
+ORDER_BOOK_HEADROOM_RATIO = float(os.getenv("ORDER_BOOK_HEADROOM_RATIO", "0.8"))
+ORDER_BOOK_MAX_CONCURRENCY = int(os.getenv("ORDER_BOOK_MAX_CONCURRENCY", "4"))
+
+metrics.describe_counter("tidesonar_order_book_requests_total", "hsstock/real/five requests by outcome.")
+metrics.describe_counter("tidesonar_order_book_skipped_total", "Order books not refreshed, by reason (budget / headroom / circuit_open / in_flight).")
+
+
+class OrderBookSummary(TypedDict):
+    bid1: float
+    ask1: float
+    spread: float
+    spread_bps: float
+    # (bid volume - ask volume) / (bid volume + ask volume) over five levels, in [-1, 1]
+    imbalance: float
+    bid_volume: int
+    ask_volume: int
+    fetched_at: float
+
+
+def summarize(book: Dict[str, object], fetched_at: float) -> Optional[OrderBookSummary]:
+    """Five-level book (`pb`/`vb` bids, `ps`/`vs` asks, best first) -> spread and imbalance."""
+    try:
+        bids = [float(p) for p in book.get("pb") or []]
+        asks = [float(p) for p in book.get("ps") or []]
+        bid_volumes = [int(float(v)) for v in book.get("vb") or []]
+        ask_volumes = [int(float(v)) for v in book.get("vs") or []]
+    except (TypeError, ValueError):
+        return None
+    if not bids or not asks or bids[0] <= 0 or asks[0] <= 0:
+        # One-sided book (e.g. sealed at a price limit): nothing meaningful to report.
+        return None
+    bid_volume = sum(bid_volumes)
+    ask_volume = sum(ask_volumes)
+    total = bid_volume + ask_volume
+    spread = asks[0] - bids[0]
+    mid = (asks[0] + bids[0]) / 2.0
+    return {
+        "bid1": bids[0],
+        "ask1": asks[0],
+        "spread": round(spread, 4),
+        "spread_bps": round(spread / mid * 10_000, 1),
+        "imbalance": round((bid_volume - ask_volume) / total, 3) if total else 0.0,
+        "bid_volume": bid_volume,
+        "ask_volume": ask_volume,
+        "fetched_at": fetched_at,
+    }
+
+
+class OrderBookEnricher:
+    """
+    Short-TTL cache of five-level order books for the top hot-tier alerts.
+
+    `refresh` runs in a worker thread started by the producer and never
+    awaited by the cycle: books fetched now are attached from the next
+    broadcast on. Requests are non-blocking on both the enricher's own budget
+    slice and the shared provider limiter, so when quota is tight books are
+    skipped (and the last cached one expires) rather than delaying snapshots.
+    """
+
+    def __init__(self):
+        self.enabled = ORDER_BOOK_ENABLED
+        self.cache: Dict[str, OrderBookSummary] = {}
+        self._source = None
+        self._budget = None
+        self._running = threading.Lock()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=ORDER_BOOK_MAX_CONCURRENCY, thread_name_prefix="order-book")
+
+    def attach(self, source) -> None:
+        self._source = source
+        # Kept across producer restarts so a crash loop cannot refill the budget window.
+        if self._budget is None:
+            self._budget = RollingRateLimiter(ORDER_BOOK_BUDGET_PER_MINUTE, 60.0)
+
+    def select_codes(self, selection: List[StockAlert], hot_codes: Set[str]) -> List[str]:
+        """Best-ranked hot codes per index (selection is ordered by index, best first)."""
+        taken: Dict[str, int] = {}
+        codes = []
+        for alert in selection:
+            if alert.code not in hot_codes or taken.get(alert.index_code, 0) >= ORDER_BOOK_TOP_PER_INDEX:
+                continue
+            taken[alert.index_code] = taken.get(alert.index_code, 0) + 1
+            codes.append(alert.code)
+        return codes
+
+    def refresh(self, codes: Iterable[str]) -> int:
+        """Fetch books whose cache entry is older than the TTL. Returns books fetched."""
+        if self._source is None or not self._running.acquire(blocking=False):
+            metrics.inc("tidesonar_order_book_skipped_total", reason="in_flight")
+            return 0
+        try:
+            now = time.monotonic()
+            stale = [code for code in codes if code not in self.cache or now - self.cache[code]["fetched_at"] >= ORDER_BOOK_TTL_SECONDS]
+            allowed = []
+            for code in stale:
+                if not self._budget.try_acquire():
+                    metrics.inc("tidesonar_order_book_skipped_total", len(stale) - len(allowed), reason="budget")
+                    break
+                allowed.append(code)
+            futures = [(code, self._pool.submit(self._source.get_order_book, code, ORDER_BOOK_HEADROOM_RATIO)) for code in allowed]
+            fetched = 0
+            for code, future in futures:
+                outcome, book = future.result()
+                if outcome in ("headroom", "circuit_open"):
+                    metrics.inc("tidesonar_order_book_skipped_total", reason=outcome)
+                    continue
+                summary = summarize(book, time.monotonic()) if book is not None else None
+                metrics.inc("tidesonar_order_book_requests_total", outcome=outcome if outcome != "ok" or summary else "one_sided")
+                if summary is not None:
+                    self.cache[code] = summary
+                    fetched += 1
+                elif outcome == "ok":
+                    # Sealed at a limit: drop the stale two-sided book rather than show it.
+                    self.cache.pop(code, None)
+            self._evict(time.monotonic())
+            return fetched
+        finally:
+            self._running.release()
+
+    def _evict(self, now: float) -> None:
+        for code in [code for code, book in self.cache.items() if now - book["fetched_at"] > 2 * ORDER_BOOK_TTL_SECONDS]:
+            self.cache.pop(code, None)
+
+    def enrich(self, selection: List[StockAlert]) -> List[StockAlert]:
+        """Copies of the alerts that have a fresh book, with `order_book` set; others unchanged."""
+        if not self.cache:
+            return selection
+        now = time.monotonic()
+        enriched = []
+        for alert in selection:
+            book = self.cache.get(alert.code)
+            if book is not None and now - book["fetched_at"] <= 2 * ORDER_BOOK_TTL_SECONDS:
+                view = {key: value for key, value in book.items() if key != "fetched_at"}
+                view["age_seconds"] = round(now - book["fetched_at"], 1)
+                alert = alert.model_copy(update={"order_book": view})
+            enriched.append(alert)
+        return enriched
+
+
+order_book_enricher = OrderBookEnricher()
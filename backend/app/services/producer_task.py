@@ -1,244 +1,62 @@
 ﻿import asyncio
 import logging
 import os
-import threading
 import time
 from collections import defaultdict
 from datetime import datetime, time as dt_time
-from typing import Dict, List, Set, Tuple, TypedDict
+from operator import attrgetter
+from typing import Dict, List, Mapping, Optional, Set, Tuple
 
-from backend.app.models.stock import StockAlert, StockData
+import numpy as np
+
+from backend.app.core.metrics import metrics
+from backend.app.core.startup import startup_timer
+from backend.app.models.stock import StockAlert
 from backend.app.services.biying_source import BiyingDataSource
+from backend.app.services.market_regime import MarketPulseTracker, MarketRegimeController
 from backend.app.services.market_schedule import MarketSchedule
 from backend.app.services.monitor import MarketMonitor
-from backend.app.services.websocket_manager import manager
+from backend.app.services.sector_heatmap import SectorHeatmap
+from backend.app.services.tick_store import TICK_STORE_ENABLED, tick_store
+from backend.app.services.universe import UniverseIndex
+from backend.app.services.health import health
+from backend.app.services.index_feed import index_feed
+from backend.app.services.limit_state import LIMIT_EVENTS_ENABLED, LIMIT_POOL_SEED, LimitStateTracker
+from backend.app.services.market_view import market_view
+from backend.app.services.scoring import scoring_registry
+from backend.app.services.order_book import order_book_enricher
+from backend.app.services.runtime_policy import AUTO_PROFILE_SWITCH, PolicySnapshot, runtime_policy
+from backend.app.services.ranking_views import (
+    DEFAULT_ITEMS_PER_INDEX,
+    INDEX_ORDER,
+    RANKING_CANDIDATES_PER_INDEX,
+    PayloadCache,
+    scoring_context,
+)
+from backend.app.services.websocket_manager import heatmap_manager, manager
 
 logger = logging.getLogger(__name__)
 
-INDEX_ORDER = ("HS300", "ZZ500", "ZZ1000", "ZZ2000")
-MAX_ITEMS_PER_INDEX = 30
-AUTO_PROFILE_SWITCH = os.getenv("AUTO_PROFILE_SWITCH", "true").lower() == "true"
+metrics.describe_histogram("tidesonar_cycle_fetch_seconds", "Wall time of the snapshot fetch stage per producer cycle.")
+metrics.describe_histogram("tidesonar_detect_seconds", "Wall time of detect_anomalies per producer cycle.")
+metrics.describe_histogram("tidesonar_rank_seconds", "Wall time of tier selection and final ranking.")
+metrics.describe_histogram("tidesonar_serialize_seconds", "Wall time to score and JSON-encode the broadcast candidates.")
+metrics.describe_histogram("tidesonar_broadcast_seconds", "Wall time to fan the selection out to all WebSocket clients.")
+metrics.describe_histogram("tidesonar_cycle_seconds", "Wall time of a full producer cycle (excluding sleep).")
+metrics.describe_counter("tidesonar_cycle_codes_total", "Codes requested per polling tier.")
+metrics.describe_gauge("tidesonar_alert_cache_size", "Alerts currently held in the producer cache.")
+metrics.describe_gauge("tidesonar_ws_clients", "Connected WebSocket clients.")
+
+MAX_ITEMS_PER_INDEX = DEFAULT_ITEMS_PER_INDEX
 OPENING_AGGRESSIVE_START = dt_time(9, 30)
 OPENING_AGGRESSIVE_END = dt_time(10, 0)
 SNAPSHOT_CACHE_TTL_SECONDS = float(os.getenv("SNAPSHOT_CACHE_TTL_SECONDS", "90.0"))
+# Codes a cycle missed are fetched again on the next loop, once, up to this many.
+FETCH_REQUEUE_MAX_CODES = int(os.getenv("FETCH_REQUEUE_MAX_CODES", "200"))
 
 
-class RuntimePolicy(TypedDict):
-    hot_per_index: int
-    warm_per_index: int
-    hot_interval_seconds: float
-    warm_interval_seconds: float
-    cold_interval_seconds: float
-    alert_ttl_seconds: float
-    loop_sleep_seconds: float
-    max_requests_per_minute: int
-    pct_weight: float
-    volume_weight: float
-
-
-class PulseMetrics(TypedDict):
-    sample_size: int
-    total_amount: float
-    limit_up_count: int
-    strong_up_count: int
-    explosive_up_count: int
-
-
-DEFAULT_POLICY: RuntimePolicy = {
-    "hot_per_index": int(os.getenv("HOT_PER_INDEX", "10")),
-    "warm_per_index": int(os.getenv("WARM_PER_INDEX", "30")),
-    "hot_interval_seconds": float(os.getenv("HOT_INTERVAL_SECONDS", "1.0")),
-    "warm_interval_seconds": float(os.getenv("WARM_INTERVAL_SECONDS", "10.0")),
-    "cold_interval_seconds": float(os.getenv("COLD_INTERVAL_SECONDS", "60.0")),
-    "alert_ttl_seconds": float(os.getenv("ALERT_TTL_SECONDS", "120.0")),
-    "loop_sleep_seconds": float(os.getenv("PRODUCER_LOOP_SLEEP_SECONDS", "0.5")),
-    "max_requests_per_minute": int(os.getenv("BIYING_MAX_REQUESTS_PER_MINUTE", "2400")),
-    "pct_weight": float(os.getenv("SORT_PCT_WEIGHT", "0.55")),
-    "volume_weight": float(os.getenv("SORT_VOLUME_WEIGHT", "0.18")),
-}
-
-PROFILE_PRESETS: Dict[str, RuntimePolicy] = {
-    "conservative": {
-        **DEFAULT_POLICY,
-        "hot_per_index": 8,
-        "warm_per_index": 24,
-        "hot_interval_seconds": 1.2,
-        "warm_interval_seconds": 12.0,
-        "cold_interval_seconds": 60.0,
-        "max_requests_per_minute": 1800,
-        "pct_weight": 0.45,
-        "volume_weight": 0.15,
-    },
-    "balanced": {
-        **DEFAULT_POLICY,
-        "hot_per_index": 10,
-        "warm_per_index": 30,
-        "hot_interval_seconds": 1.0,
-        "warm_interval_seconds": 10.0,
-        "cold_interval_seconds": 60.0,
-        "max_requests_per_minute": 2400,
-        "pct_weight": 0.55,
-        "volume_weight": 0.18,
-    },
-    "aggressive": {
-        **DEFAULT_POLICY,
-        "hot_per_index": 12,
-        "warm_per_index": 40,
-        "hot_interval_seconds": 0.8,
-        "warm_interval_seconds": 6.0,
-        "cold_interval_seconds": 45.0,
-        "max_requests_per_minute": 2700,
-        "pct_weight": 0.72,
-        "volume_weight": 0.22,
-    },
-}
-
-_profile_env = os.getenv("POLLING_PROFILE", "balanced").lower()
-_runtime_profile = _profile_env if _profile_env in PROFILE_PRESETS else "balanced"
-_runtime_policy: RuntimePolicy = {**PROFILE_PRESETS[_runtime_profile]}
-_runtime_lock = threading.Lock()
-_runtime_last_reason = "init"
-_runtime_last_switch_time = datetime.now().isoformat(timespec="seconds")
-
-
-class MarketRegimeController:
-    """State machine for automatic profile switching."""
-
-    def __init__(self):
-        self.ema_turnover: float | None = None
-        self.calm_counter = 0
-        self.very_calm_counter = 0
-        self.aggressive_hold_until = 0.0
-        self.last_metrics: PulseMetrics = {
-            "sample_size": 0,
-            "total_amount": 0.0,
-            "limit_up_count": 0,
-            "strong_up_count": 0,
-            "explosive_up_count": 0,
-        }
-
-    @staticmethod
-    def _compute_metrics(snapshot: List[StockData]) -> PulseMetrics:
-        if not snapshot:
-            return {
-                "sample_size": 0,
-                "total_amount": 0.0,
-                "limit_up_count": 0,
-                "strong_up_count": 0,
-                "explosive_up_count": 0,
-            }
-
-        total_amount = 0.0
-        limit_up_count = 0
-        strong_up_count = 0
-        explosive_up_count = 0
-
-        for item in snapshot:
-            pct = float(item.pct_chg)
-            amt = max(0.0, float(item.amount))
-            total_amount += amt
-
-            if pct >= 9.5:
-                limit_up_count += 1
-            if pct >= 5.0:
-                strong_up_count += 1
-            if pct >= 7.0:
-                explosive_up_count += 1
-
-        return {
-            "sample_size": len(snapshot),
-            "total_amount": total_amount,
-            "limit_up_count": limit_up_count,
-            "strong_up_count": strong_up_count,
-            "explosive_up_count": explosive_up_count,
-        }
-
-    def decide(self, snapshot: List[StockData], current_profile: str) -> Tuple[str, str]:
-        metrics = self._compute_metrics(snapshot)
-        self.last_metrics = metrics
-
-        sample_size = metrics["sample_size"]
-        if sample_size < 30:
-            return current_profile, "insufficient_sample"
-
-        total_amount = metrics["total_amount"]
-
-        if self.ema_turnover is None:
-            self.ema_turnover = total_amount
-        else:
-            alpha = 0.18
-            self.ema_turnover = alpha * total_amount + (1 - alpha) * self.ema_turnover
-
-        ema_turnover = max(1.0, self.ema_turnover)
-
-        limit_up_trigger = max(6, int(sample_size * 0.007))
-        strong_up_trigger = max(24, int(sample_size * 0.03))
-        explosive_trigger = max(10, int(sample_size * 0.015))
-
-        turnover_surge = total_amount >= max(2e8, ema_turnover * 1.55)
-
-        surge = (
-            metrics["limit_up_count"] >= limit_up_trigger
-            or metrics["strong_up_count"] >= strong_up_trigger
-            or metrics["explosive_up_count"] >= explosive_trigger
-            or turnover_surge
-        )
-
-        calm_limit_up = max(2, int(sample_size * 0.0025))
-        calm_strong_up = max(9, int(sample_size * 0.012))
-        calm = (
-            metrics["limit_up_count"] <= calm_limit_up
-            and metrics["strong_up_count"] <= calm_strong_up
-            and total_amount <= ema_turnover * 1.08
-        )
-
-        very_calm_limit_up = max(1, int(sample_size * 0.0015))
-        very_calm_strong_up = max(5, int(sample_size * 0.008))
-        very_calm = (
-            metrics["limit_up_count"] <= very_calm_limit_up
-            and metrics["strong_up_count"] <= very_calm_strong_up
-            and total_amount <= ema_turnover * 0.95
-        )
-
-        now_mono = time.monotonic()
-
-        if surge:
-            self.calm_counter = 0
-            self.very_calm_counter = 0
-            self.aggressive_hold_until = now_mono + 120.0
-            return "aggressive", (
-                f"surge lu={metrics['limit_up_count']} su={metrics['strong_up_count']} "
-                f"ex={metrics['explosive_up_count']} amt={total_amount:.0f}"
-            )
-
-        if now_mono < self.aggressive_hold_until:
-            return "aggressive", "surge_cooldown"
-
-        if calm:
-            self.calm_counter += 1
-        else:
-            self.calm_counter = 0
-
-        if very_calm:
-            self.very_calm_counter += 1
-        else:
-            self.very_calm_counter = 0
-
-        rebound = (
-            metrics["strong_up_count"] >= max(12, int(sample_size * 0.018))
-            or total_amount >= ema_turnover * 1.18
-        )
-
-        if current_profile == "aggressive" and self.calm_counter >= 4:
-            return "balanced", "calm_4_cycles"
-
-        if current_profile == "balanced" and self.very_calm_counter >= 8:
-            return "conservative", "very_calm_8_cycles"
-
-        if current_profile == "conservative" and rebound:
-            return "balanced", "activity_rebound"
-
-        return current_profile, "no_change"
+# Shared with /api/runtime/regime (thresholds, last metrics, decision log).
+regime_controller = MarketRegimeController()
 
 
 def get_available_profiles() -> List[Dict[str, str]]:
@@ -249,97 +67,84 @@ def get_available_profiles() -> List[Dict[str, str]]:
     ]
 
 
-def get_runtime_policy() -> Dict[str, float | int | str | bool]:
-    with _runtime_lock:
-        return {
-            "profile": _runtime_profile,
-            "auto_profile_switch": AUTO_PROFILE_SWITCH,
-            "last_switch_reason": _runtime_last_reason,
-            "last_switch_time": _runtime_last_switch_time,
-            **_runtime_policy,
-        }
-
-
-def set_runtime_profile(profile: str, reason: str = "manual") -> Dict[str, float | int | str | bool]:
-    normalized = (profile or "").strip().lower()
-    if normalized not in PROFILE_PRESETS:
-        raise ValueError(f"Unknown profile: {profile}")
-
-    with _runtime_lock:
-        global _runtime_profile, _runtime_policy, _runtime_last_reason, _runtime_last_switch_time
-        if normalized == _runtime_profile:
-            return {
-                "profile": _runtime_profile,
-                "auto_profile_switch": AUTO_PROFILE_SWITCH,
-                "last_switch_reason": _runtime_last_reason,
-                "last_switch_time": _runtime_last_switch_time,
-                **_runtime_policy,
-            }
+def get_runtime_policy() -> Dict[str, object]:
+    """The current policy as a plain dict (API responses); the loop reads `runtime_policy.current`."""
+    return runtime_policy.current.to_dict()
 
-        _runtime_profile = normalized
-        _runtime_policy = {**PROFILE_PRESETS[normalized]}
-        _runtime_last_reason = reason
-        _runtime_last_switch_time = datetime.now().isoformat(timespec="seconds")
 
-    logger.info("Runtime polling profile switched to: %s (reason=%s)", normalized, reason)
-    return get_runtime_policy()
+def set_runtime_profile(profile: str, reason: str = "manual") -> Dict[str, object]:
+    return runtime_policy.switch(profile, reason).to_dict()
 
 
-def _calculate_score(stock: StockAlert, policy: Dict[str, float | int | str | bool]) -> float:
-    base_amount = max(0.0, float(stock.amount))
-    pct_weight = float(policy["pct_weight"])
-    volume_weight = float(policy["volume_weight"])
+def _calculate_score(stock: StockAlert, policy: Mapping[str, object]) -> float:
+    """Score of one alert with the profile's scoring strategy (ranking scores whole lists at once)."""
+    return float(scoring_registry.score_alerts([stock], policy)[0])
 
-    pct_factor = max(-0.5, min(float(stock.pct_chg) / 10.0, 2.0))
-    volume_factor = max(0.0, min(float(stock.volume_ratio) - 1.0, 3.0))
 
-    score = base_amount * max(0.1, 1.0 + pct_weight * pct_factor + volume_weight * volume_factor)
+_code_of = attrgetter("code")
+_amount_of = attrgetter("amount")
 
-    # Momentum bonus: explicitly push strong gainers forward.
-    if stock.pct_chg >= 8.5:
-        score *= 1.6
-    elif stock.pct_chg >= 5.0:
-        score *= 1.25
-    elif stock.pct_chg <= -3.0:
-        score *= 0.8
 
-    return score
+def _rank_by_index(
+    alert_cache: Dict[str, StockAlert],
+    policy: Mapping[str, object],
+    universe: UniverseIndex,
+    require_amount: bool = False,
+    scoring: Optional[str] = None,
+) -> Dict[str, List[StockAlert]]:
+    """
+    Cached alerts per index group, best score first. Groups are universe masks
+    over alert slots: the display group, restricted to actual index members.
+    """
+    alerts = list(alert_cache.values())
+    ranked: Dict[str, List[StockAlert]] = {k: [] for k in INDEX_ORDER}
+    if not alerts:
+        return ranked
+    slots = universe.slots_for(map(_code_of, alerts))
+    scores = scoring_registry.score_alerts(alerts, policy, scoring)
+    eligible = slots >= 0
+    if require_amount:
+        eligible &= np.fromiter(map(_amount_of, alerts), dtype=np.float64, count=len(alerts)) > 0
+    for index_code in INDEX_ORDER:
+        in_group = universe.group_mask(index_code) & universe.member_mask((index_code,))
+        members = np.flatnonzero(eligible & in_group[slots])
+        order = members[np.argsort(-scores[members], kind="stable")]
+        ranked[index_code] = [alerts[i] for i in order.tolist()]
+    return ranked
 
 
-def _build_final_selection(
+def _build_candidates(
     alert_cache: Dict[str, StockAlert],
-    policy: Dict[str, float | int | str | bool],
+    policy: Mapping[str, object],
+    universe: UniverseIndex,
 ) -> List[StockAlert]:
-    grouped: Dict[str, List[StockAlert]] = {k: [] for k in INDEX_ORDER}
-    for alert in alert_cache.values():
-        if alert.index_code in grouped and alert.amount > 0:
-            grouped[alert.index_code].append(alert)
-
-    final_selection: List[StockAlert] = []
+    """Best RANKING_CANDIDATES_PER_INDEX per index, grouped by index; the first MAX_ITEMS_PER_INDEX are the shared stream."""
+    ranked = _rank_by_index(alert_cache, policy, universe, require_amount=True)
+    candidates: List[StockAlert] = []
     for index_code in INDEX_ORDER:
-        ranked = sorted(grouped[index_code], key=lambda x: _calculate_score(x, policy), reverse=True)
-        final_selection.extend(ranked[:MAX_ITEMS_PER_INDEX])
-    return final_selection
+        candidates.extend(ranked[index_code][:RANKING_CANDIDATES_PER_INDEX])
+    return candidates
 
 
 def _select_hot_warm_codes(
     alert_cache: Dict[str, StockAlert],
-    policy: Dict[str, float | int | str | bool],
+    policy: PolicySnapshot,
+    universe: UniverseIndex,
 ) -> Tuple[Set[str], Set[str]]:
-    grouped: Dict[str, List[StockAlert]] = {k: [] for k in INDEX_ORDER}
-    for alert in alert_cache.values():
-        if alert.index_code in grouped:
-            grouped[alert.index_code].append(alert)
+    return _tier_codes(_rank_by_index(alert_cache, policy, universe), policy)
 
+
+def _tier_codes(ranked_by_index: Mapping[str, List[StockAlert]], policy: PolicySnapshot) -> Tuple[Set[str], Set[str]]:
+    """Hot and warm codes: the top `hot_per_index`, then up to `warm_per_index`, of each index."""
     hot_codes: Set[str] = set()
     warm_codes: Set[str] = set()
 
-    hot_per_index = int(policy["hot_per_index"])
-    warm_per_index = int(policy["warm_per_index"])
+    hot_per_index = policy.hot_per_index
+    warm_per_index = policy.warm_per_index
     warm_limit = max(hot_per_index, warm_per_index)
 
     for index_code in INDEX_ORDER:
-        ranked = sorted(grouped[index_code], key=lambda x: _calculate_score(x, policy), reverse=True)
+        ranked = ranked_by_index[index_code]
         hot_slice = ranked[:hot_per_index]
         warm_slice = ranked[hot_per_index:warm_limit]
         hot_codes.update(a.code for a in hot_slice)
@@ -348,16 +153,92 @@ def _select_hot_warm_codes(
     return hot_codes, warm_codes
 
 
-async def _broadcast_selection(selection: List[StockAlert]) -> None:
-    snapshot_json_list = [alert.model_dump_json() for alert in selection]
-    manager.update_snapshot(snapshot_json_list)
-    for payload in snapshot_json_list:
+class TierSchedule:
+    """Next fetch deadline per polling tier, on the loop's clock (monotonic live, virtual in replay)."""
+
+    def __init__(self):
+        self.next_hot_fetch = 0.0
+        self.next_warm_fetch = 0.0
+        self.next_cold_fetch = 0.0
+
+    def pull_forward(self, now: float, policy: PolicySnapshot) -> None:
+        """A faster profile should not wait out deadlines set under the slower one."""
+        self.next_hot_fetch = min(self.next_hot_fetch, now + policy.hot_interval_seconds)
+        self.next_warm_fetch = min(self.next_warm_fetch, now + policy.warm_interval_seconds)
+        self.next_cold_fetch = min(self.next_cold_fetch, now + policy.cold_interval_seconds)
+
+    def due(
+        self,
+        now: float,
+        policy: PolicySnapshot,
+        hot_codes: Set[str],
+        warm_codes: Set[str],
+        all_codes: Set[str],
+    ) -> Dict[str, List[str]]:
+        """Codes per tier whose interval has elapsed; cold is everything not hot or warm."""
+        due_tiers: Dict[str, List[str]] = {}
+        if hot_codes and now >= self.next_hot_fetch:
+            due_tiers["hot"] = list(hot_codes)
+            self.next_hot_fetch = now + policy.hot_interval_seconds
+        if warm_codes and now >= self.next_warm_fetch:
+            due_tiers["warm"] = list(warm_codes)
+            self.next_warm_fetch = now + policy.warm_interval_seconds
+        if now >= self.next_cold_fetch:
+            cold_codes = all_codes - hot_codes - warm_codes
+            due_tiers["cold"] = list(cold_codes if cold_codes else all_codes)
+            self.next_cold_fetch = now + policy.cold_interval_seconds
+        return due_tiers
+
+
+# Alerts not refreshed since the last cycle reuse their JSON.
+_payload_cache = PayloadCache()
+
+
+async def _broadcast_selection(
+    candidates: List[StockAlert],
+    policy: PolicySnapshot,
+    ranking_context: Dict[str, object],
+) -> None:
+    with metrics.timer("tidesonar_serialize_seconds"):
+        scores = scoring_registry.score_alerts(candidates, policy).tolist()
+        entries = list(zip(candidates, _payload_cache.payloads(candidates), scores))
+    with metrics.timer("tidesonar_broadcast_seconds"):
         try:
-            await manager.broadcast(payload)
+            await manager.broadcast_selection(entries, ranking_context)
         except Exception as exc:
             logger.error("Broadcast error: %s", exc)
 
 
+def _warmup() -> Tuple[BiyingDataSource, MarketMonitor, UniverseIndex]:
+    """Blocking initialisation, run in a worker thread so the event loop keeps serving."""
+    with startup_timer.phase("warmup.universe"):
+        source = BiyingDataSource()
+    with startup_timer.phase("warmup.index"):
+        universe = UniverseIndex(source.stock_index_map, source.index_members)
+    with startup_timer.phase("warmup.baselines"):
+        monitor = MarketMonitor(universe=universe)
+    return source, monitor, universe
+
+
+# Warm state outlives a supervised restart: a crashed producer must not rebuild the
+# source, which would hand it a fresh quota window, a closed breaker and new hedge threads.
+_warm_state: Optional[Tuple[BiyingDataSource, MarketMonitor, UniverseIndex]] = None
+
+
+async def _warm_resources() -> Tuple[BiyingDataSource, MarketMonitor, UniverseIndex]:
+    """Reuse the previous run's warmup; rebuild only when it has no universe to work on."""
+    global _warm_state
+    previous = _warm_state
+    if previous is not None and previous[0].get_all_codes():
+        logger.info("Reusing warmed data source after producer restart")
+        return previous
+    state = await asyncio.to_thread(_warmup)
+    if previous is not None:
+        state[0].adopt_request_state(previous[0])
+    _warm_state = state
+    return state
+
+
 async def run_mock_producer():
     """
     Background task:
@@ -369,25 +250,44 @@ async def run_mock_producer():
     logger.info("Starting Data Producer Task...")
     logger.info("Using REAL DATA SOURCE (BiyingAPI)")
 
-    source = BiyingDataSource()
-    monitor = MarketMonitor()
+    source, monitor, universe = await _warm_resources()
+    startup_timer.mark_ready()
+    health.attach(source=source, clients=lambda: manager.client_count() + heatmap_manager.client_count())
+    order_book_enricher.attach(source)
+    order_book_refresh: asyncio.Task | None = None
 
     all_codes = source.get_all_codes()
     all_codes_set = set(all_codes)
     if not all_codes_set:
         logger.error("No stocks loaded from data source, producer will idle.")
 
-    policy = get_runtime_policy()
-    source.update_rate_limit(int(policy["max_requests_per_minute"]))
+    policy = runtime_policy.current
+    # The request cap follows profile switches (manual ones arrive from API threads).
+    unsubscribe_rate_limit = runtime_policy.subscribe(lambda snapshot: source.update_rate_limit(snapshot.max_requests_per_minute))
+    metrics.register_gauge_callback(
+        "tidesonar_rate_limiter_usage",
+        "Biying requests issued in the current rolling minute.",
+        source.rate_limit_usage,
+    )
+    metrics.register_gauge_callback(
+        "tidesonar_rate_limiter_capacity",
+        "Configured Biying request cap per minute.",
+        lambda: source.max_requests_per_minute,
+    )
+    metrics.register_gauge_callback(
+        "tidesonar_circuit_state",
+        "Biying circuit breaker state (0 closed, 1 half-open, 2 open).",
+        source.circuit.state_value,
+    )
 
     logger.info(
         "Adaptive polling config: profile=%s hot=%ss warm=%ss cold=%ss hot_top=%s warm_top=%s universe=%s auto=%s",
-        policy["profile"],
-        policy["hot_interval_seconds"],
-        policy["warm_interval_seconds"],
-        policy["cold_interval_seconds"],
-        policy["hot_per_index"],
-        policy["warm_per_index"],
+        policy.profile,
+        policy.hot_interval_seconds,
+        policy.warm_interval_seconds,
+        policy.cold_interval_seconds,
+        policy.hot_per_index,
+        policy.warm_per_index,
         len(all_codes_set),
         AUTO_PROFILE_SWITCH,
     )
@@ -396,33 +296,40 @@ async def run_mock_producer():
     alert_last_seen: Dict[str, float] = {}
 
     # Cache recent market snapshots to avoid profile decisions on tiny samples.
-    market_snapshot_cache: Dict[str, StockData] = {}
-    market_snapshot_seen: Dict[str, float] = {}
-
-    regime_controller = MarketRegimeController()
-
-    next_hot_fetch = 0.0
-    next_warm_fetch = 0.0
-    next_cold_fetch = 0.0
+    # Aggregates are maintained incrementally as quotes arrive and expire.
+    market_pulse = MarketPulseTracker(universe, SNAPSHOT_CACHE_TTL_SECONDS)
+    sector_heatmap = SectorHeatmap(universe)
+    limit_tracker = LimitStateTracker(universe)
+    if LIMIT_EVENTS_ENABLED and LIMIT_POOL_SEED and MarketSchedule.is_market_open():
+        await asyncio.to_thread(limit_tracker.seed, source.license)
+    market_view.attach(alert_cache, market_pulse.snapshots)
+    health.attach(pulse=market_pulse)
+    if TICK_STORE_ENABLED:
+        tick_store.start()
+
+    schedule = TierSchedule()
     loop_count = 0
+    requeue_codes: Set[str] = set()
+    applied_version = 0
+    ranking_context: Dict[str, object] = {}
 
     try:
         while True:
             loop_count += 1
-            policy = get_runtime_policy()
-
-            max_rpm = int(policy["max_requests_per_minute"])
-            if source.max_requests_per_minute != max_rpm:
-                source.update_rate_limit(max_rpm)
-
-            hot_interval_seconds = float(policy["hot_interval_seconds"])
-            warm_interval_seconds = float(policy["warm_interval_seconds"])
-            cold_interval_seconds = float(policy["cold_interval_seconds"])
-            alert_ttl_seconds = float(policy["alert_ttl_seconds"])
-            loop_sleep_seconds = float(policy["loop_sleep_seconds"])
+            # One snapshot per cycle; a switch made during the cycle applies from the next one.
+            policy = runtime_policy.current
+            if policy.version != applied_version:
+                # Derived state is rebuilt only when the version changes.
+                if applied_version:
+                    schedule.pull_forward(time.monotonic(), policy)
+                    logger.info("Runtime policy v%s applied (profile=%s)", policy.version, policy.profile)
+                ranking_context = scoring_context(policy)
+                applied_version = policy.version
 
             # No active client and already has cache, keep backend lightweight.
-            if len(manager.active_connections) == 0 and manager.has_data():
+            no_clients = not manager.client_count() and not heatmap_manager.client_count()
+            health.heartbeat(idle=no_clients and manager.has_data())
+            if no_clients and manager.has_data():
                 await asyncio.sleep(2)
                 continue
 
@@ -433,103 +340,138 @@ async def run_mock_producer():
                     logger.info("Market closed (fresh cache). Sleeping 60s...")
                     await asyncio.sleep(60)
                     continue
-                due_codes = list(all_codes_set)
+                due_tiers: Dict[str, List[str]] = {"full": list(all_codes_set)}
             else:
                 now_mono = time.monotonic()
-                hot_codes, warm_codes = _select_hot_warm_codes(alert_cache, policy)
-                cold_codes = all_codes_set - hot_codes - warm_codes
-                due_set: Set[str] = set()
-
-                if hot_codes and now_mono >= next_hot_fetch:
-                    due_set.update(hot_codes)
-                    next_hot_fetch = now_mono + hot_interval_seconds
-
-                if warm_codes and now_mono >= next_warm_fetch:
-                    due_set.update(warm_codes)
-                    next_warm_fetch = now_mono + warm_interval_seconds
-
-                if now_mono >= next_cold_fetch:
-                    due_set.update(cold_codes if cold_codes else all_codes_set)
-                    next_cold_fetch = now_mono + cold_interval_seconds
-
-                if not due_set:
-                    await asyncio.sleep(loop_sleep_seconds)
+                with metrics.timer("tidesonar_rank_seconds", stage="tiers"):
+                    hot_codes, warm_codes = _select_hot_warm_codes(alert_cache, policy, universe)
+                # Codes watched by WebSocket subscribers are refreshed at least at warm cadence.
+                watched_codes = manager.subscriptions.watched_codes() & all_codes_set
+                if watched_codes:
+                    warm_codes = warm_codes | (watched_codes - hot_codes)
+                due_tiers = schedule.due(now_mono, policy, hot_codes, warm_codes, all_codes_set)
+
+                if requeue_codes:
+                    scheduled = set().union(*due_tiers.values())
+                    retry_codes = sorted(requeue_codes - scheduled)[:FETCH_REQUEUE_MAX_CODES]
+                    requeue_codes.clear()
+                    if retry_codes:
+                        due_tiers["requeue"] = retry_codes
+
+                if not due_tiers:
+                    await asyncio.sleep(policy.loop_sleep_seconds)
                     continue
 
-                due_codes = list(due_set)
-
                 if loop_count % 30 == 0:
                     logger.info(
                         "Adaptive cycle: profile=%s fetch=%s hot=%s warm=%s cold=%s cache=%s",
-                        policy["profile"],
-                        len(due_codes),
+                        policy.profile,
+                        sum(len(codes) for codes in due_tiers.values()),
                         len(hot_codes),
                         len(warm_codes),
-                        len(cold_codes),
+                        len(all_codes_set) - len(hot_codes) - len(warm_codes),
                         len(alert_cache),
                     )
 
+            cycle_started = time.perf_counter()
+            for tier, codes in due_tiers.items():
+                metrics.inc("tidesonar_cycle_codes_total", len(codes), tier=tier)
+
+            # Index quotes ride along with fetching cycles (hot cadence), throttled by the feed interval.
+            index_due = index_feed.due()
+            index_quotes = {}
             try:
-                snapshot = await asyncio.to_thread(source.get_snapshot_for_codes, due_codes)
+                with metrics.timer("tidesonar_cycle_fetch_seconds"):
+                    if index_due:
+                        snapshot, index_quotes = await asyncio.gather(
+                            asyncio.to_thread(source.get_snapshot_for_tiers, due_tiers),
+                            asyncio.to_thread(source.get_index_quotes, index_feed.codes),
+                        )
+                    else:
+                        snapshot = await asyncio.to_thread(source.get_snapshot_for_tiers, due_tiers)
+                report = source.last_fetch_report
+                # Re-queue misses for the next loop instead of waiting a full tier interval.
+                # Not while the breaker is open (that would just hammer a degraded provider),
+                # and codes that already failed a re-queue wait for their tier again.
+                if market_open and report and report["circuit"] == "closed":
+                    for tier, codes in report["missed"].items():
+                        if tier != "requeue":
+                            requeue_codes.update(codes)
             except Exception as exc:
                 logger.error("Snapshot fetch error: %s", exc)
                 snapshot = []
 
-            now_mono = time.monotonic()
+            if snapshot:
+                startup_timer.milestone("first_snapshot")
 
-            # Update market snapshot cache for profile auto-switch decisions.
-            for stock in snapshot:
-                market_snapshot_cache[stock.code] = stock
-                market_snapshot_seen[stock.code] = now_mono
+            index_changed = index_due and index_feed.update(index_quotes)
+            if index_changed:
+                monitor.index_returns = index_feed.returns()
 
-            stale_market_codes = [
-                code
-                for code, seen_at in market_snapshot_seen.items()
-                if (now_mono - seen_at) > SNAPSHOT_CACHE_TTL_SECONDS
-            ]
-            for code in stale_market_codes:
-                market_snapshot_cache.pop(code, None)
-                market_snapshot_seen.pop(code, None)
+            # Intraday history: hand off to the tick store writer thread (never blocks the loop).
+            if TICK_STORE_ENABLED and market_open:
+                tick_store.submit(snapshot)
 
-            market_view = list(market_snapshot_cache.values())
+            now_mono = time.monotonic()
+
+            # Update market snapshot cache for profile auto-switch decisions.
+            market_pulse.update(snapshot, now_mono)
+            expired_codes = market_pulse.expire(now_mono)
+            market_view.expire(expired_codes)
+            sector_heatmap.update_quotes(snapshot)
+            sector_heatmap.remove_quotes(expired_codes)
 
             if AUTO_PROFILE_SWITCH and market_open:
                 now_dt = datetime.now()
-                current_profile = str(policy["profile"])
+                current_profile = policy.profile
 
                 if OPENING_AGGRESSIVE_START <= now_dt.time() < OPENING_AGGRESSIVE_END:
                     target_profile = "aggressive"
                     switch_reason = "auto:opening_window_0930_1000"
                 else:
-                    target_profile, reason = regime_controller.decide(market_view, current_profile)
+                    target_profile, reason = regime_controller.decide(market_pulse.metrics(), current_profile)
                     switch_reason = f"auto:{reason}"
 
+                regime_controller.record_decision(current_profile, target_profile, switch_reason)
                 if target_profile != current_profile:
-                    policy = set_runtime_profile(target_profile, reason=switch_reason)
-                    source.update_rate_limit(int(policy["max_requests_per_minute"]))
+                    runtime_policy.switch(target_profile, reason=switch_reason)
 
                 if loop_count % 30 == 0 and regime_controller.last_metrics["sample_size"] > 0:
                     m = regime_controller.last_metrics
                     logger.info(
-                        "Market pulse sample=%s lu=%s su=%s ex=%s amount=%.0f profile=%s",
+                        "Market pulse sample=%s adv=%s dec=%s lu=%s ld=%s su=%s sd=%s ex=%s spread=%.2f amount=%.0f profile=%s",
                         m["sample_size"],
+                        m["advance_count"],
+                        m["decline_count"],
                         m["limit_up_count"],
+                        m["limit_down_count"],
                         m["strong_up_count"],
+                        m["strong_down_count"],
                         m["explosive_up_count"],
+                        m["industry_spread"],
                         m["total_amount"],
-                        policy["profile"],
+                        policy.profile,
                     )
 
             updated_codes = {item.code for item in snapshot}
+            health.record_fetch(due_tiers, updated_codes)
 
             try:
-                alerts = await asyncio.to_thread(monitor.detect_anomalies, snapshot)
+                with metrics.timer("tidesonar_detect_seconds"):
+                    alerts = await asyncio.to_thread(monitor.detect_anomalies, snapshot)
             except Exception as exc:
                 logger.error("Monitor error: %s", exc)
                 alerts = []
 
             now_mono = time.monotonic()
             fresh_alert_map = {alert.code: alert for alert in alerts}
+            await manager.send_quotes(snapshot, fresh_alert_map)
+            if index_changed:
+                await manager.send_index(index_feed.message())
+            if LIMIT_EVENTS_ENABLED and market_open:
+                limit_events = limit_tracker.update(snapshot)
+                if limit_events:
+                    await manager.send_limit_events(limit_tracker.message(limit_events))
 
             # Updated code leaves cache immediately if it no longer matches filters.
             for code in updated_codes:
@@ -545,31 +487,57 @@ async def run_mock_producer():
             stale_codes = [
                 code
                 for code, seen_at in alert_last_seen.items()
-                if (now_mono - seen_at) > alert_ttl_seconds
+                if (now_mono - seen_at) > policy.alert_ttl_seconds
             ]
             for code in stale_codes:
                 alert_cache.pop(code, None)
                 alert_last_seen.pop(code, None)
-
-            final_selection = _build_final_selection(alert_cache, policy)
-            if final_selection:
-                await _broadcast_selection(final_selection)
+            # Bump quote versions only now: a replaced alert must not be served under an ETag cached before it.
+            market_view.update_quotes(snapshot)
+
+            sector_heatmap.update_alerts(updated_codes, fresh_alert_map)
+            sector_heatmap.remove_alerts(stale_codes)
+            heatmap_frame = sector_heatmap.maybe_frame(now_mono)
+            if heatmap_frame:
+                heatmap_manager.update_snapshot([heatmap_frame])
+                await heatmap_manager.broadcast(heatmap_frame)
+
+            with metrics.timer("tidesonar_rank_seconds", stage="final"):
+                candidates = _build_candidates(alert_cache, policy, universe)
+            metrics.set_gauge("tidesonar_alert_cache_size", len(alert_cache))
+            metrics.set_gauge("tidesonar_ws_clients", manager.client_count())
+            if market_open and order_book_enricher.enabled and candidates:
+                # Books fetched by the previous refresh are attached now; the next refresh
+                # runs in the background and is never awaited by the cycle.
+                candidates = order_book_enricher.enrich(candidates)
+                if order_book_refresh is None or order_book_refresh.done():
+                    book_codes = order_book_enricher.select_codes(candidates, hot_codes)
+                    if book_codes:
+                        order_book_refresh = asyncio.create_task(asyncio.to_thread(order_book_enricher.refresh, book_codes))
+            if candidates:
+                await _broadcast_selection(candidates, policy, ranking_context)
                 if loop_count % 30 == 0:
                     sent_counts = defaultdict(int)
-                    for alert in final_selection:
+                    for alert in candidates:
                         sent_counts[alert.index_code] += 1
-                    logger.info("Sent %s alerts. Dist=%s", len(final_selection), dict(sent_counts))
+                    logger.info("Sent %s candidates. Dist=%s", len(candidates), dict(sent_counts))
             elif not market_open:
                 # Closed-market fallback: keep empty snapshot explicit if no valid alerts.
-                manager.update_snapshot([])
+                await manager.broadcast_selection([])
+
+            metrics.observe("tidesonar_cycle_seconds", time.perf_counter() - cycle_started)
 
             if not market_open:
                 logger.info("Market closed one-off fetch complete. Sleeping 60s...")
                 await asyncio.sleep(60)
             else:
-                await asyncio.sleep(loop_sleep_seconds)
+                await asyncio.sleep(policy.loop_sleep_seconds)
 
     except asyncio.CancelledError:
         logger.info("Data Producer Task Cancelled.")
     except Exception as exc:
-        logger.error("Error in Producer: %s", exc)
+        logger.exception("Error in Producer: %s", exc)
+        # Let the supervisor (health.supervise_producer) restart the task with backoff.
+        raise
+    finally:
+        unsubscribe_rate_limit()
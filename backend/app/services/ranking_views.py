@@ -0,0 +1,245 @@
+import math
+import os
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.app.models.stock import StockAlert
+from backend.app.services.scoring import PARAMETERS, scoring_registry
+from backend.app.services.subscriptions import SelectionEntry
+
+# Indices every view covers (when it does not name its own), in display order.
+INDEX_ORDER = ("HS300", "ZZ500", "ZZ1000", "ZZ2000")
+# Items per index on the shared stream (clients without a view).
+DEFAULT_ITEMS_PER_INDEX = 30
+# Ranked candidates per index the producer publishes; the widest view a client can ask for.
+RANKING_CANDIDATES_PER_INDEX = max(DEFAULT_ITEMS_PER_INDEX, int(os.getenv("RANKING_CANDIDATES_PER_INDEX", "100")))
+# Distinct view parameter sets served at once (clients with equal parameters share one).
+RANKING_MAX_VIEWS = int(os.getenv("RANKING_MAX_VIEWS", "32"))
+RANKING_MAX_WEIGHT = 10.0
+RANKING_MAX_INDICES = 8
+
+# One index's part of a view message: new order (when it changed) and alerts to add or replace.
+ViewDelta = Dict[str, object]
+
+
+class ViewKey(NamedTuple):
+    """Parameters of one ranking view; clients with equal keys share its computation."""
+
+    strategy: str  # "" = the strategy selected for the current profile
+    weights: Tuple[Tuple[str, float], ...]
+    per_index: int
+    indices: Tuple[str, ...]  # () = every index
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "strategy": self.strategy or None,
+            "weights": dict(self.weights),
+            "per_index": self.per_index,
+            "indices": list(self.indices),
+        }
+
+
+def parse_view(message: Mapping[str, object]) -> ViewKey:
+    """`{"action": "view", "strategy", "weights", "per_index", "indices"}` -> ViewKey. Raises ValueError."""
+    strategy = message.get("strategy") or ""
+    if not isinstance(strategy, str):
+        raise ValueError("'strategy' must be a string")
+    if strategy:
+        scoring_registry.get(strategy)
+
+    raw_weights = message.get("weights") or {}
+    if not isinstance(raw_weights, dict):
+        raise ValueError("'weights' must be an object")
+    weights = {}
+    for name, value in raw_weights.items():
+        if name not in PARAMETERS:
+            raise ValueError(f"unknown weight '{name}' (weights: {', '.join(PARAMETERS)})")
+        try:
+            weight = float(value)  # type: ignore[arg-type]
+        except (TypeError, ValueError):
+            raise ValueError(f"'{name}' must be a number")
+        if not math.isfinite(weight) or abs(weight) > RANKING_MAX_WEIGHT:
+            raise ValueError(f"'{name}' must be within [-{RANKING_MAX_WEIGHT:g}, {RANKING_MAX_WEIGHT:g}]")
+        weights[name] = weight
+
+    try:
+        per_index = int(message.get("per_index") or DEFAULT_ITEMS_PER_INDEX)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        raise ValueError("'per_index' must be an integer")
+    if not 1 <= per_index <= RANKING_CANDIDATES_PER_INDEX:
+        raise ValueError(f"'per_index' must be within [1, {RANKING_CANDIDATES_PER_INDEX}]")
+
+    indices = message.get("indices") or []
+    if isinstance(indices, str):
+        indices = [indices]
+    if not isinstance(indices, list) or not all(isinstance(v, str) for v in indices) or len(indices) > RANKING_MAX_INDICES:
+        raise ValueError(f"'indices' must be a list of at most {RANKING_MAX_INDICES} index codes")
+    return ViewKey(strategy, tuple(sorted(weights.items())), per_index, tuple(sorted({v.strip() for v in indices if v.strip()})))
+
+
+def scoring_context(policy: Mapping[str, object]) -> Dict[str, object]:
+    """The part of the runtime policy ranking depends on (shipped with the candidates to web workers)."""
+    return {"profile": policy.get("profile", ""), **{name: policy[name] for name in PARAMETERS if name in policy}}
+
+
+def default_selection(candidates: Sequence[SelectionEntry], per_index: int = DEFAULT_ITEMS_PER_INDEX) -> List[SelectionEntry]:
+    """The shared stream: the first `per_index` candidates of each index (candidates are best first)."""
+    taken: Dict[str, int] = {}
+    selection = []
+    for entry in candidates:
+        index_code = entry[0].index_code or ""
+        if taken.get(index_code, 0) < per_index:
+            taken[index_code] = taken.get(index_code, 0) + 1
+            selection.append(entry)
+    return selection
+
+
+class PayloadCache:
+    """Alert JSON by code, re-serialized only when the alert object changed since the last cycle."""
+
+    def __init__(self):
+        self._payloads: Dict[str, Tuple[StockAlert, str]] = {}
+
+    def payloads(self, alerts: Sequence[StockAlert]) -> List[str]:
+        previous = self._payloads
+        current: Dict[str, Tuple[StockAlert, str]] = {}
+        result = []
+        for alert in alerts:
+            cached = previous.get(alert.code)
+            if cached is None or cached[0] is not alert:
+                cached = (alert, alert.model_dump_json())
+            current[alert.code] = cached
+            result.append(cached[1])
+        self._payloads = current
+        return result
+
+
+class ClientView:
+    def __init__(self, key: ViewKey):
+        self.key = key
+        self.sent_version = 0  # 0 = nothing sent yet: the next message is a full one
+        self.sent: Dict[str, List[SelectionEntry]] = {}
+
+
+class RankingViews:
+    """
+    Per-client ranked views over the shared candidate set of one cycle.
+
+    The producer ranks the alert cache once and publishes the best
+    RANKING_CANDIDATES_PER_INDEX per index. A client that sends a view gets
+    its own ordering of those candidates (strategy, weight overrides, items
+    per index, indices) instead of the shared stream. Work is shared at every
+    step: column arrays are extracted once per cycle for all views, each
+    distinct ViewKey is scored and sorted once per cycle, and the delta from
+    one (key, version) state to the current one is built once for all
+    clients that were sent that state. Messages only carry what changed: an
+    index's order when it moved, and the alerts whose payload differs from
+    what the client has.
+    """
+
+    def __init__(self):
+        self.candidates: List[SelectionEntry] = []
+        self.context: Dict[str, object] = {}
+        self.version = 0
+        self.clients: Dict[int, ClientView] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._groups: Optional[Dict[str, np.ndarray]] = None
+        self._ranked: Dict[ViewKey, Dict[str, List[SelectionEntry]]] = {}
+        self._deltas: Dict[Tuple[ViewKey, int], Optional[ViewDelta]] = {}
+
+    def update(self, candidates: List[SelectionEntry], context: Mapping[str, object]) -> None:
+        self.candidates = candidates
+        self.context = dict(context)
+        self.version += 1
+        self._columns = {}
+        self._groups = None
+        self._ranked = {}
+        self._deltas = {}
+
+    def set(self, client_id: int, message: Mapping[str, object]) -> ViewKey:
+        key = parse_view(message)
+        keys = {view.key for other, view in self.clients.items() if other != client_id}
+        if key not in keys and len(keys) >= RANKING_MAX_VIEWS:
+            raise ValueError("Server view capacity reached")
+        self.clients[client_id] = ClientView(key)
+        return key
+
+    def remove(self, client_id: int) -> None:
+        self.clients.pop(client_id, None)
+
+    def has_view(self, client_id: int) -> bool:
+        return client_id in self.clients
+
+    def describe(self, client_id: int) -> Optional[Dict[str, object]]:
+        view = self.clients.get(client_id)
+        return view.key.to_dict() if view else None
+
+    def _index_groups(self) -> Dict[str, np.ndarray]:
+        if self._groups is None:
+            positions: Dict[str, List[int]] = {}
+            for position, (alert, _, _) in enumerate(self.candidates):
+                positions.setdefault(alert.index_code or "", []).append(position)
+            self._groups = {index_code: np.asarray(members, dtype=np.int64) for index_code, members in positions.items()}
+        return self._groups
+
+    def ranked(self, key: ViewKey) -> Dict[str, List[SelectionEntry]]:
+        """Entries per index for a view, best first; computed once per cycle and key."""
+        lists = self._ranked.get(key)
+        if lists is not None:
+            return lists
+        groups = self._index_groups()
+        scores = scoring_registry.score_alerts(
+            [alert for alert, _, _ in self.candidates],
+            {**self.context, **dict(key.weights)},
+            key.strategy or None,
+            columns=self._columns,
+        )
+        lists = {}
+        # Indices without candidates this cycle still get an (empty) list, so clients clear them.
+        for index_code in key.indices or tuple(dict.fromkeys(INDEX_ORDER + tuple(groups))):
+            members = groups.get(index_code)
+            if members is None:
+                lists[index_code] = []
+                continue
+            order = members[np.argsort(-scores[members], kind="stable")][:key.per_index]
+            lists[index_code] = [self.candidates[i] for i in order.tolist()]
+        self._ranked[key] = lists
+        return lists
+
+    def delta(self, client_id: int) -> Optional[ViewDelta]:
+        """View message bringing the client to the current cycle (None when nothing changed)."""
+        view = self.clients.get(client_id)
+        if view is None or view.sent_version == self.version:
+            return None
+        lists = self.ranked(view.key)
+        cache_key = (view.key, view.sent_version)
+        if cache_key not in self._deltas:
+            self._deltas[cache_key] = self._diff(view, lists)
+        view.sent_version = self.version
+        view.sent = lists
+        return self._deltas[cache_key]
+
+    def _diff(self, view: ClientView, lists: Dict[str, List[SelectionEntry]]) -> Optional[ViewDelta]:
+        full = view.sent_version == 0
+        parts: Dict[str, Dict[str, object]] = {}
+        emptied = {index_code: [] for index_code in view.sent if index_code not in lists}
+        for index_code, entries in {**lists, **emptied}.items():
+            codes = [alert.code for alert, _, _ in entries]
+            old_entries = view.sent.get(index_code, [])
+            if full:
+                parts[index_code] = {"order": codes, "upsert": entries}
+                continue
+            old_payloads = {alert.code: payload for alert, payload, _ in old_entries}
+            upsert = [entry for entry in entries if old_payloads.get(entry[0].code) != entry[1]]
+            part: Dict[str, object] = {"upsert": upsert}
+            if len(codes) != len(old_entries) or any(code != old[0].code for code, old in zip(codes, old_entries)):
+                part["order"] = codes
+            if upsert or "order" in part:
+                parts[index_code] = part
+        if not parts and not full:
+            return None
+        message: ViewDelta = {"type": "view", "seq": self.version, "full": full, "lists": parts}
+        if full:
+            message["view"] = view.key.to_dict()
+        return message
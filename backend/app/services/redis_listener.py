@@ -1,7 +1,6 @@
 import asyncio
 import json
 import logging
-import redis.asyncio as redis
 from backend.app.core.config import settings
 from backend.app.services.websocket_manager import manager
 
@@ -14,6 +13,8 @@ async def redis_listener():
     redis_url = f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}"
     
     try:
+        import redis.asyncio as redis  # lazy: keeps redis off the startup import path
+
         r = redis.from_url(redis_url, decode_responses=True)
         async with r.pubsub() as pubsub:
             await pubsub.subscribe(settings.REDIS_CHANNEL)
@@ -24,7 +25,7 @@ async def redis_listener():
                     data = message["data"]
                     # Log for debug
                     # logger.info(f"Received from Redis: {data[:50]}...") 
-                    await manager.broadcast(data)
+                    await manager.publish_alert(data)
                     
     except Exception as e:
         # Suppress verbose connection errors for local/standalone mode
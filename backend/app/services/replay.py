@@ -0,0 +1,516 @@
+"""
+Offline replay of a recorded trading day (see tick_store.py).
+
+Usage:
+    python -m backend.app.services.replay --date 20260224
+    python -m backend.app.services.replay --date 20260224 \
+        --grid policy.pct_weight=0.45,0.55,0.72 --grid min_amounts.ZZ2000=2e6,3e6 --workers 4
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as dt_time
+from typing import Dict, List, Mapping, Optional, Set, Tuple, TypedDict
+
+import numpy as np
+
+from backend.app.models.stock import StockAlert, StockData
+from backend.app.services.biying_source import CACHE_FILE, SNAPSHOT_BATCH_SIZE
+from backend.app.services.market_regime import (
+    DEFAULT_REGIME_THRESHOLDS,
+    MarketPulseTracker,
+    MarketRegimeController,
+)
+from backend.app.services.monitor import MarketMonitor
+from backend.app.services.producer_task import (
+    INDEX_ORDER,
+    MAX_ITEMS_PER_INDEX,
+    OPENING_AGGRESSIVE_END,
+    OPENING_AGGRESSIVE_START,
+    SNAPSHOT_CACHE_TTL_SECONDS,
+    TierSchedule,
+    _rank_by_index,
+    _tier_codes,
+)
+from backend.app.services.runtime_policy import PROFILE_PRESETS, PolicySnapshot, RuntimePolicy
+from backend.app.services.scoring import scoring_registry
+from backend.app.services.tick_store import TICK_STORE_DIR, TickDay
+from backend.app.services.universe import UniverseIndex
+
+logger = logging.getLogger(__name__)
+
+SESSIONS = ((dt_time(9, 30), dt_time(11, 30)), (dt_time(13, 0), dt_time(15, 0)))
+
+
+class ReplayParams(TypedDict, total=False):
+    profile: str  # starting profile
+    auto_profile_switch: bool
+    policy: Dict[str, float]  # RuntimePolicy overrides, kept across profile switches
+    min_amounts: Dict[str, float]  # MarketMonitor thresholds per index
+    regime: Dict[str, float]  # MarketRegimeController threshold overrides
+    mover_pct: float  # pct_chg defining a "big mover" for detection latency
+    scoring: str  # scoring strategy name ("" = the one selected for the current profile)
+
+
+class ReplayReport(TypedDict):
+    day: str
+    params: ReplayParams
+    wall_seconds: float
+    simulated_seconds: float
+    speedup: float
+    cycles: int
+    fetches: Dict[str, int]
+    alerts: Dict[str, object]
+    movers: Dict[str, object]
+    budget: Dict[str, object]
+    profiles: Dict[str, object]
+
+
+DEFAULT_PARAMS: ReplayParams = {
+    "profile": "balanced",
+    "auto_profile_switch": True,
+    "policy": {},
+    "min_amounts": {},
+    "regime": {},
+    "mover_pct": 5.0,
+    "scoring": "",
+}
+
+
+def load_stock_map(path: str = CACHE_FILE) -> Dict[str, Dict[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class _Tape:
+    """
+    As-of view over a recorded day: `advance(t)` applies every recorded row with
+    ts <= t to per-code state, `snapshot()` serves a simulated fetch from it.
+    """
+
+    def __init__(self, tick_day: TickDay, stock_map: Mapping[str, Mapping[str, str]]):
+        _, cols = tick_day.view()
+        self.ts = cols["ts"]
+        self.slot = cols["slot"]
+        self.rec_price = cols["price"]
+        self.rec_pct = cols["pct_chg"]
+        self.rec_volume = cols["volume"]
+        self.rec_amount = cols["amount"]
+        self.codes = list(tick_day.codes)
+        self.slot_of = dict(tick_day.slot_of)
+        # Only codes with metadata are part of the simulated universe (as in BiyingDataSource).
+        self.stock_map = {code: stock_map[code] for code in self.codes if code in stock_map}
+
+        size = len(self.codes)
+        self.price = np.zeros(size, dtype=np.float64)
+        self.pct = np.zeros(size, dtype=np.float64)
+        self.volume = np.zeros(size, dtype=np.int64)
+        self.amount = np.zeros(size, dtype=np.float64)
+        self.seen = np.zeros(size, dtype=bool)
+        self.cursor = 0
+        self._objects: List[Optional[StockData]] = [None] * size
+
+        self.meta: List[Tuple[str, Optional[str], Optional[str], Optional[str]]] = []
+        for code in self.codes:
+            meta = self.stock_map.get(code) or {}
+            industry = meta.get("industry") or meta.get("block") or ""
+            self.meta.append((meta.get("name") or code, meta.get("index", "OTHER"), industry, meta.get("concept") or ""))
+
+    @property
+    def start_ts(self) -> float:
+        return float(self.ts[0]) if self.ts.size else 0.0
+
+    @property
+    def end_ts(self) -> float:
+        return float(self.ts[-1]) if self.ts.size else 0.0
+
+    def advance(self, t: float) -> None:
+        end = int(np.searchsorted(self.ts, t, side="right"))
+        if end <= self.cursor:
+            return
+        rows = slice(self.cursor, end)
+        slots = self.slot[rows]
+        # Rows are in time order, so the last write per slot wins.
+        self.price[slots] = np.round(self.rec_price[rows], 3)
+        self.pct[slots] = np.round(self.rec_pct[rows], 3)
+        self.volume[slots] = self.rec_volume[rows]
+        self.amount[slots] = self.rec_amount[rows]
+        self.seen[slots] = True
+        self.cursor = end
+
+    def snapshot(self, codes: List[str], t: float) -> List[StockData]:
+        slot_of = self.slot_of
+        slots = np.fromiter((slot_of[c] for c in codes if c in slot_of), dtype=np.int64)
+        slots = slots[self.seen[slots]]
+        timestamp = datetime.fromtimestamp(t)
+        objects = self._objects
+        snapshot = []
+        # One StockData per slot, refreshed in place: pipeline stages only read
+        # snapshot objects within the cycle, and construction dominated replay time.
+        for slot, price, pct, volume, amount in zip(
+            slots.tolist(),
+            self.price[slots].tolist(),
+            self.pct[slots].tolist(),
+            self.volume[slots].tolist(),
+            self.amount[slots].tolist(),
+        ):
+            stock = objects[slot]
+            if stock is None:
+                name, index_code, industry, concept = self.meta[slot]
+                stock = StockData.model_construct(
+                    code=self.codes[slot],
+                    name=name,
+                    price=price,
+                    pct_chg=pct,
+                    volume=volume,
+                    amount=amount,
+                    timestamp=timestamp,
+                    index_code=index_code,
+                    industry=industry,
+                    concept=concept,
+                )
+                objects[slot] = stock
+            else:
+                stock.__dict__.update(price=price, pct_chg=pct, volume=volume, amount=amount, timestamp=timestamp)
+            snapshot.append(stock)
+        return snapshot
+
+    def first_crossings(self, threshold: float, codes: Set[str]) -> Dict[str, float]:
+        """First recorded time each code reached pct_chg >= threshold."""
+        rows = np.flatnonzero(self.rec_pct >= threshold)
+        if rows.size == 0:
+            return {}
+        slots, first = np.unique(self.slot[rows], return_index=True)
+        crossed = self.ts[rows[first]]
+        return {
+            self.codes[slot]: float(ts)
+            for slot, ts in zip(slots.tolist(), crossed.tolist())
+            if self.codes[slot] in codes
+        }
+
+    def session_clock(self, day: datetime) -> List[Tuple[float, float]]:
+        """Trading session windows clipped to the recorded range."""
+        windows = []
+        for start, end in SESSIONS:
+            lo = max(datetime.combine(day.date(), start).timestamp(), self.start_ts)
+            hi = min(datetime.combine(day.date(), end).timestamp(), self.end_ts)
+            if hi > lo:
+                windows.append((lo, hi))
+        return windows
+
+
+def _policy_for(profile: str, overrides: Mapping[str, float], version: int = 1) -> PolicySnapshot:
+    values: Dict[str, object] = {**PROFILE_PRESETS[profile]}
+    for key, value in overrides.items():
+        if key not in RuntimePolicy.__annotations__:
+            raise ValueError(f"Unknown policy key: {key}")
+        values[key] = value
+    return PolicySnapshot(version, profile, values, "replay")
+
+
+def _percentiles(values: List[float]) -> Dict[str, float | None]:
+    if not values:
+        return {"p50": None, "p90": None, "max": None}
+    arr = np.asarray(values)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 2),
+        "p90": round(float(np.percentile(arr, 90)), 2),
+        "max": round(float(arr.max()), 2),
+    }
+
+
+def replay_day(
+    day_dir: str,
+    params: Optional[ReplayParams] = None,
+    stock_map: Optional[Mapping[str, Mapping[str, str]]] = None,
+) -> ReplayReport:
+    """
+    Stream one recorded day through the live pipeline stages on a virtual clock:
+    tier scheduling and ranking (the producer's own TierSchedule and
+    _rank_by_index), MarketMonitor.detect_anomalies, alert cache/TTL and the
+    regime controller. A simulated fetch returns the
+    latest recorded quote per code at that time, so results are bounded by
+    how often the code was polled while recording.
+    """
+    wall_started = time.perf_counter()
+    p: ReplayParams = {**DEFAULT_PARAMS, **(params or {})}
+    day_key = os.path.basename(os.path.normpath(day_dir))
+
+    tape = _Tape(TickDay(day_dir, writable=False), stock_map if stock_map is not None else load_stock_map())
+    universe = UniverseIndex(tape.stock_map)
+    all_codes_set = set(tape.stock_map)
+
+    profile = str(p["profile"])
+    policy = _policy_for(profile, p["policy"])
+    scoring = str(p["scoring"]) or None
+    if scoring is not None:
+        scoring_registry.get(scoring)  # unknown names fail before the tape is read
+    if any(value < 0 for value in p["min_amounts"].values()):
+        # Keeps every alert at amount > 0, which the final selection filter assumes.
+        raise ValueError("min_amounts must be >= 0")
+    monitor = MarketMonitor(min_amounts=p["min_amounts"], use_redis=False, universe=universe)
+    controller = MarketRegimeController({**DEFAULT_REGIME_THRESHOLDS})
+    if p["regime"]:
+        controller.update_thresholds(p["regime"])
+    market_pulse = MarketPulseTracker(universe, SNAPSHOT_CACHE_TTL_SECONDS)
+
+    target_codes = {code for code, meta in tape.stock_map.items() if meta.get("index") in INDEX_ORDER}
+    mover_pct = float(p["mover_pct"])
+    movers = tape.first_crossings(mover_pct, target_codes)
+    detected_at: Dict[str, float] = {}
+
+    alert_cache: Dict[str, StockAlert] = {}
+    # Refreshed codes move to the end, so stale alerts are always at the front.
+    alert_last_seen: "OrderedDict[str, float]" = OrderedDict()
+
+    fetches: Dict[str, int] = defaultdict(int)
+    requests_per_minute: Dict[int, int] = defaultdict(int)
+    budget_per_minute: Dict[int, int] = {}
+    time_in_profile: Dict[str, float] = defaultdict(float)
+    switches: List[Dict[str, object]] = []
+    alert_events = 0
+    alerted_codes: Set[str] = set()
+    per_index_events: Dict[str, int] = defaultdict(int)
+    cache_size_sum = 0
+    cycles = 0
+    simulated = 0.0
+
+    hot_codes: Set[str] = set()
+    warm_codes: Set[str] = set()
+    schedule = TierSchedule()
+
+    for session_start, session_end in tape.session_clock(datetime.fromtimestamp(tape.start_ts)):
+        t = session_start
+        while t <= session_end:
+            step = policy.loop_sleep_seconds
+            time_in_profile[profile] += step
+            tape.advance(t)
+
+            due_tiers = schedule.due(t, policy, hot_codes, warm_codes, all_codes_set)
+            if not due_tiers:
+                t += step
+                continue
+
+            cycles += 1
+            minute = int(t // 60)
+            budget_per_minute[minute] = policy.max_requests_per_minute
+            due_codes: List[str] = []
+            for tier, codes in due_tiers.items():
+                fetches[tier] += 1
+                requests_per_minute[minute] += math.ceil(len(codes) / SNAPSHOT_BATCH_SIZE)
+                due_codes.extend(codes)
+
+            snapshot = tape.snapshot(due_codes, t)
+            market_pulse.update(snapshot, t)
+            market_pulse.expire(t)
+
+            if p["auto_profile_switch"]:
+                if OPENING_AGGRESSIVE_START <= datetime.fromtimestamp(t).time() < OPENING_AGGRESSIVE_END:
+                    target_profile, reason = "aggressive", "opening_window_0930_1000"
+                else:
+                    target_profile, reason = controller.decide(market_pulse.metrics(), profile, now=t)
+                if target_profile != profile:
+                    switches.append({
+                        "time": datetime.fromtimestamp(t).strftime("%H:%M:%S"),
+                        "from": profile,
+                        "to": target_profile,
+                        "reason": reason,
+                    })
+                    profile = target_profile
+                    policy = _policy_for(profile, p["policy"], policy.version + 1)
+                    schedule.pull_forward(t, policy)
+
+            alerts = monitor.detect_anomalies(snapshot)
+            fresh_alert_map = {alert.code: alert for alert in alerts}
+            for stock in snapshot:
+                code = stock.code
+                fresh_alert = fresh_alert_map.get(code)
+                if fresh_alert:
+                    if code not in alert_cache:
+                        alert_events += 1
+                        alerted_codes.add(code)
+                        per_index_events[fresh_alert.index_code] += 1
+                    alert_cache[code] = fresh_alert
+                    alert_last_seen[code] = t
+                    alert_last_seen.move_to_end(code)
+                elif code in alert_cache:
+                    del alert_cache[code]
+                    del alert_last_seen[code]
+
+            alert_ttl_seconds = policy.alert_ttl_seconds
+            while alert_last_seen:
+                code, seen_at = next(iter(alert_last_seen.items()))
+                if (t - seen_at) <= alert_ttl_seconds:
+                    break
+                del alert_last_seen[code]
+                del alert_cache[code]
+
+            # One ranking pass serves both the final selection and next cycle's hot/warm tiers.
+            # (Every alert has amount > 0 here, so the amount filter does not change the tiers.)
+            ranked = _rank_by_index(alert_cache, policy, universe, require_amount=True, scoring=scoring)
+            hot_codes, warm_codes = _tier_codes(ranked, policy)
+            for index_code in INDEX_ORDER:
+                for alert in ranked[index_code][:MAX_ITEMS_PER_INDEX]:
+                    crossed_at = movers.get(alert.code)
+                    if crossed_at is not None and alert.code not in detected_at \
+                            and alert.pct_chg >= mover_pct and t >= crossed_at:
+                        detected_at[alert.code] = t
+
+            cache_size_sum += len(alert_cache)
+            t += step
+        simulated += session_end - session_start
+
+    wall_seconds = time.perf_counter() - wall_started
+    latencies = [detected_at[code] - movers[code] for code in detected_at]
+    minute_usage = list(requests_per_minute.values())
+    return {
+        "day": day_key,
+        "params": p,
+        "wall_seconds": round(wall_seconds, 2),
+        "simulated_seconds": round(simulated, 0),
+        "speedup": round(simulated / wall_seconds, 1) if wall_seconds > 0 else 0.0,
+        "cycles": cycles,
+        "fetches": dict(fetches),
+        "alerts": {
+            "events": alert_events,
+            "unique_codes": len(alerted_codes),
+            "per_index": {k: per_index_events.get(k, 0) for k in INDEX_ORDER},
+            "avg_cache_size": round(cache_size_sum / cycles, 1) if cycles else 0.0,
+        },
+        "movers": {
+            "threshold_pct": mover_pct,
+            "total": len(movers),
+            "detected": len(detected_at),
+            "missed": sorted(set(movers) - set(detected_at)),
+            "latency_seconds": _percentiles(latencies),
+        },
+        "budget": {
+            "requests_total": sum(minute_usage),
+            "peak_per_minute": max(minute_usage) if minute_usage else 0,
+            "avg_per_minute": round(sum(minute_usage) / len(minute_usage), 1) if minute_usage else 0.0,
+            "minutes_over_budget": sum(
+                1 for minute, used in requests_per_minute.items() if used > budget_per_minute[minute]
+            ),
+        },
+        "profiles": {
+            "seconds": {k: round(v, 0) for k, v in time_in_profile.items()},
+            "switches": switches,
+        },
+    }
+
+
+def _parse_value(raw: str) -> object:
+    lowered = raw.strip().lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    try:
+        return float(raw)
+    except ValueError:
+        return raw.strip()
+
+
+def _assign(params: ReplayParams, dotted_key: str, value: object) -> None:
+    """'policy.pct_weight' -> params['policy']['pct_weight']."""
+    section, _, key = dotted_key.partition(".")
+    if section not in DEFAULT_PARAMS:
+        raise ValueError(f"Unknown replay parameter: {dotted_key}")
+    if key:
+        params[section] = {**params.get(section, {}), key: value}  # type: ignore[literal-required]
+    else:
+        params[section] = value  # type: ignore[literal-required]
+
+
+def expand_grid(base: ReplayParams, grid: Mapping[str, List[object]]) -> List[ReplayParams]:
+    """Cartesian product of `grid` values applied on top of `base`."""
+    keys = list(grid.keys())
+    param_sets: List[ReplayParams] = []
+    for combo in itertools.product(*(grid[k] for k in keys)):
+        params: ReplayParams = json.loads(json.dumps(base))
+        for key, value in zip(keys, combo):
+            _assign(params, key, value)
+        param_sets.append(params)
+    return param_sets or [base]
+
+
+def run_grid(
+    day_dir: str,
+    param_sets: List[ReplayParams],
+    workers: int = 1,
+    stock_map: Optional[Mapping[str, Mapping[str, str]]] = None,
+) -> List[ReplayReport]:
+    """Replay every parameter set; one process per set when workers > 1."""
+    stock_map = stock_map if stock_map is not None else load_stock_map()
+    if workers <= 1 or len(param_sets) == 1:
+        return [replay_day(day_dir, params, stock_map) for params in param_sets]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        count = len(param_sets)
+        return list(executor.map(replay_day, [day_dir] * count, param_sets, [stock_map] * count))
+
+
+def _summary_row(report: ReplayReport, grid_keys: List[str]) -> str:
+    def lookup(key: str) -> object:
+        section, _, sub = key.partition(".")
+        value = report["params"].get(section)  # type: ignore[misc]
+        return value.get(sub) if sub and isinstance(value, dict) else value
+
+    latency = report["movers"]["latency_seconds"]
+    cells = [f"{key}={lookup(key)}" for key in grid_keys]
+    cells += [
+        f"alerts={report['alerts']['events']}",
+        f"unique={report['alerts']['unique_codes']}",
+        f"movers={report['movers']['detected']}/{report['movers']['total']}",
+        f"lat_p50={latency['p50']}s",
+        f"lat_p90={latency['p90']}s",
+        f"req={report['budget']['requests_total']}",
+        f"peak_rpm={report['budget']['peak_per_minute']}",
+        f"over={report['budget']['minutes_over_budget']}",
+        f"switches={len(report['profiles']['switches'])}",
+        f"wall={report['wall_seconds']}s",
+    ]
+    return "  ".join(cells)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded trading day through the alert pipeline.")
+    parser.add_argument("--date", required=True, help="Trading day YYYYMMDD")
+    parser.add_argument("--dir", default=TICK_STORE_DIR, help="Tick store root")
+    parser.add_argument("--stock-map", default=CACHE_FILE, help="index_constituents.json")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Fixed parameter, e.g. profile=aggressive or regime.calm_cycles=6")
+    parser.add_argument("--grid", action="append", default=[], metavar="KEY=V1,V2",
+                        help="Swept parameter, e.g. policy.pct_weight=0.45,0.55,0.72")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", action="store_true", help="Print full JSON reports")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    base: ReplayParams = json.loads(json.dumps(DEFAULT_PARAMS))
+    for item in args.set:
+        key, _, raw = item.partition("=")
+        _assign(base, key.strip(), _parse_value(raw))
+    grid: Dict[str, List[object]] = {}
+    for item in args.grid:
+        key, _, raw = item.partition("=")
+        grid[key.strip()] = [_parse_value(v) for v in raw.split(",") if v.strip()]
+
+    day_dir = os.path.join(args.dir, args.date)
+    if not os.path.exists(os.path.join(day_dir, "meta.json")):
+        parser.error(f"No recorded ticks in {day_dir}")
+
+    param_sets = expand_grid(base, grid)
+    reports = run_grid(day_dir, param_sets, args.workers, load_stock_map(args.stock_map))
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return
+    for report in reports:
+        print(_summary_row(report, list(grid.keys())))
+
+
+if __name__ == "__main__":
+    main()
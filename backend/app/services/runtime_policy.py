@@ -0,0 +1,216 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Mapping, Tuple, TypedDict
+
+from backend.app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+AUTO_PROFILE_SWITCH = os.getenv("AUTO_PROFILE_SWITCH", "true").lower() == "true"
+
+metrics.describe_gauge("tidesonar_policy_version", "Version of the active runtime policy snapshot.")
+metrics.describe_counter("tidesonar_policy_switches_total", "Runtime profile switches by target profile.")
+
+
+class RuntimePolicy(TypedDict):
+    hot_per_index: int
+    warm_per_index: int
+    hot_interval_seconds: float
+    warm_interval_seconds: float
+    cold_interval_seconds: float
+    alert_ttl_seconds: float
+    loop_sleep_seconds: float
+    max_requests_per_minute: int
+    pct_weight: float
+    volume_weight: float
+    momentum_weight: float
+
+
+DEFAULT_POLICY: RuntimePolicy = {
+    "hot_per_index": int(os.getenv("HOT_PER_INDEX", "10")),
+    "warm_per_index": int(os.getenv("WARM_PER_INDEX", "30")),
+    "hot_interval_seconds": float(os.getenv("HOT_INTERVAL_SECONDS", "1.0")),
+    "warm_interval_seconds": float(os.getenv("WARM_INTERVAL_SECONDS", "10.0")),
+    "cold_interval_seconds": float(os.getenv("COLD_INTERVAL_SECONDS", "60.0")),
+    "alert_ttl_seconds": float(os.getenv("ALERT_TTL_SECONDS", "120.0")),
+    "loop_sleep_seconds": float(os.getenv("PRODUCER_LOOP_SLEEP_SECONDS", "0.5")),
+    "max_requests_per_minute": int(os.getenv("BIYING_MAX_REQUESTS_PER_MINUTE", "2400")),
+    "pct_weight": float(os.getenv("SORT_PCT_WEIGHT", "0.55")),
+    "volume_weight": float(os.getenv("SORT_VOLUME_WEIGHT", "0.18")),
+    "momentum_weight": float(os.getenv("SORT_MOMENTUM_WEIGHT", "0.12")),
+}
+
+PROFILE_PRESETS: Dict[str, RuntimePolicy] = {
+    "conservative": {
+        **DEFAULT_POLICY,
+        "hot_per_index": 8,
+        "warm_per_index": 24,
+        "hot_interval_seconds": 1.2,
+        "warm_interval_seconds": 12.0,
+        "cold_interval_seconds": 60.0,
+        "max_requests_per_minute": 1800,
+        "pct_weight": 0.45,
+        "volume_weight": 0.15,
+    },
+    "balanced": {
+        **DEFAULT_POLICY,
+        "hot_per_index": 10,
+        "warm_per_index": 30,
+        "hot_interval_seconds": 1.0,
+        "warm_interval_seconds": 10.0,
+        "cold_interval_seconds": 60.0,
+        "max_requests_per_minute": 2400,
+        "pct_weight": 0.55,
+        "volume_weight": 0.18,
+    },
+    "aggressive": {
+        **DEFAULT_POLICY,
+        "hot_per_index": 12,
+        "warm_per_index": 40,
+        "hot_interval_seconds": 0.8,
+        "warm_interval_seconds": 6.0,
+        "cold_interval_seconds": 45.0,
+        "max_requests_per_minute": 2700,
+        "pct_weight": 0.72,
+        "volume_weight": 0.22,
+    },
+}
+
+POLICY_FIELDS: Tuple[str, ...] = tuple(RuntimePolicy.__annotations__)
+# Keys of the mapping view, in the order /api/runtime/polling-config has always used.
+_KEYS: Tuple[str, ...] = ("version", "profile", "auto_profile_switch", "last_switch_reason", "last_switch_time") + POLICY_FIELDS
+
+
+class PolicySnapshot(Mapping[str, object]):
+    """
+    One immutable, versioned runtime policy.
+
+    Values are typed once at construction (`policy.hot_interval_seconds` is a
+    float), so hot paths read attributes instead of converting dict entries
+    every loop. It is also a read-only Mapping with the keys the policy dict
+    always had (plus `version`), for code that takes a policy mapping
+    (scoring, replay, the runtime API).
+    """
+
+    __slots__ = _KEYS
+
+    version: int
+    profile: str
+    auto_profile_switch: bool
+    last_switch_reason: str
+    last_switch_time: str
+    hot_per_index: int
+    warm_per_index: int
+    hot_interval_seconds: float
+    warm_interval_seconds: float
+    cold_interval_seconds: float
+    alert_ttl_seconds: float
+    loop_sleep_seconds: float
+    max_requests_per_minute: int
+    pct_weight: float
+    volume_weight: float
+    momentum_weight: float
+
+    def __init__(self, version: int, profile: str, values: Mapping[str, object], reason: str):
+        assign = object.__setattr__
+        assign(self, "version", version)
+        assign(self, "profile", profile)
+        assign(self, "auto_profile_switch", AUTO_PROFILE_SWITCH)
+        assign(self, "last_switch_reason", reason)
+        assign(self, "last_switch_time", datetime.now().isoformat(timespec="seconds"))
+        for name, kind in RuntimePolicy.__annotations__.items():
+            assign(self, name, kind(values[name]))
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("PolicySnapshot is immutable; switch profiles through runtime_policy")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("PolicySnapshot is immutable")
+
+    def __getitem__(self, key: str) -> object:
+        if key not in _KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_KEYS)
+
+    def __len__(self) -> int:
+        return len(_KEYS)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {key: getattr(self, key) for key in _KEYS}
+
+
+PolicySubscriber = Callable[[PolicySnapshot], None]
+
+
+class RuntimePolicyStore:
+    """
+    Holder of the current PolicySnapshot.
+
+    Readers take `current`: one attribute read, no lock, no copy, and the
+    object they get never changes underneath them. A profile switch builds
+    the next version and swaps the reference under a writers-only lock.
+    Subscribers are then called outside that lock, in version order, so
+    consumers recompute derived state once per switch (the rate limiter
+    resizes, the producer loop re-derives deadlines and ranking context)
+    instead of re-reading the policy on every loop.
+    """
+
+    def __init__(self, profile: str):
+        self._lock = threading.Lock()
+        self._notify_lock = threading.Lock()
+        self._subscribers: List[PolicySubscriber] = []
+        self._notified_version = 1
+        self.current = PolicySnapshot(1, profile, PROFILE_PRESETS[profile], "init")
+        metrics.set_gauge("tidesonar_policy_version", 1)
+
+    def switch(self, profile: str, reason: str = "manual") -> PolicySnapshot:
+        normalized = (profile or "").strip().lower()
+        if normalized not in PROFILE_PRESETS:
+            raise ValueError(f"Unknown profile: {profile}")
+        with self._lock:
+            previous = self.current
+            if normalized == previous.profile:
+                return previous
+            snapshot = PolicySnapshot(previous.version + 1, normalized, PROFILE_PRESETS[normalized], reason)
+            self.current = snapshot
+        logger.info("Runtime polling profile switched to: %s (reason=%s, version=%s)", normalized, reason, snapshot.version)
+        metrics.set_gauge("tidesonar_policy_version", snapshot.version)
+        metrics.inc("tidesonar_policy_switches_total", profile=normalized)
+        self._notify()
+        return snapshot
+
+    def _notify(self) -> None:
+        # Concurrent switches may finish in any order; subscribers only ever see newer versions.
+        with self._notify_lock:
+            latest = self.current
+            if latest.version <= self._notified_version:
+                return
+            self._notified_version = latest.version
+            subscribers = list(self._subscribers)
+            for callback in subscribers:
+                try:
+                    callback(latest)
+                except Exception:
+                    logger.exception("Runtime policy subscriber failed")
+
+    def subscribe(self, callback: PolicySubscriber) -> Callable[[], None]:
+        """Call `callback` with the current snapshot now and with every new one. Returns an unsubscribe function."""
+        with self._notify_lock:
+            self._subscribers.append(callback)
+            callback(self.current)
+
+        def unsubscribe() -> None:
+            with self._notify_lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+
+_profile_env = os.getenv("POLLING_PROFILE", "balanced").lower()
+runtime_policy = RuntimePolicyStore(_profile_env if _profile_env in PROFILE_PRESETS else "balanced")
@@ -0,0 +1,287 @@
+import ast
+import logging
+import os
+import threading
+from operator import attrgetter
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.app.models.stock import StockAlert
+
+logger = logging.getLogger(__name__)
+
+SCORING_MAX_EXPRESSION_LENGTH = 2000
+SCORING_MAX_NODES = 300
+# Values every column takes when a new expression is trial-evaluated (zero, signs, large, unknown).
+_TRIAL_VALUES = np.array([0.0, 1.0, -1.0, 0.5, 1e9, np.nan], dtype=np.float64)
+
+# Per-alert columns an expression can use (nan where unknown, e.g. before the feature engine has history).
+COLUMNS: Dict[str, Callable[[StockAlert], float]] = {
+    "amount": attrgetter("amount"),
+    "pct_chg": attrgetter("pct_chg"),
+    "volume_ratio": attrgetter("volume_ratio"),
+    "price": attrgetter("price"),
+    "excess_pct": lambda a: np.nan if a.excess_pct is None else a.excess_pct,
+    "ret_1m": lambda a: (a.features or {}).get("ret_1m", np.nan),
+    "ret_3m": lambda a: (a.features or {}).get("ret_3m", np.nan),
+    "ret_5m": lambda a: (a.features or {}).get("ret_5m", np.nan),
+    "vwap_dev": lambda a: (a.features or {}).get("vwap_dev", np.nan),
+    "vol_accel": lambda a: (a.features or {}).get("vol_accel", np.nan),
+}
+# Scalars taken from the runtime policy.
+PARAMETERS = ("pct_weight", "volume_weight", "momentum_weight")
+
+
+def _fill(values, fallback):
+    return np.where(np.isnan(values), fallback, values)
+
+
+FUNCTIONS: Dict[str, Callable] = {
+    "abs": np.abs,
+    "clip": np.clip,
+    "where": np.where,
+    "maximum": np.maximum,
+    "minimum": np.minimum,
+    "log1p": np.log1p,
+    "sqrt": np.sqrt,
+    "sign": np.sign,
+    "fill": _fill,  # fill(x, v): v where x is nan
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.USub, ast.UAdd,
+    ast.BitAnd, ast.BitOr, ast.Invert,
+    ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq,
+)
+
+BUILTIN_STRATEGIES: Dict[str, Tuple[str, str]] = {
+    "default": (
+        "maximum(amount, 0) * maximum(0.1, 1 + pct_weight * clip(pct_chg / 10, -0.5, 2)"
+        " + volume_weight * clip(volume_ratio - 1, 0, 3) + momentum_weight * clip(fill(ret_3m, 0) / 3, -1, 1))"
+        " * where(pct_chg >= 8.5, 1.6, where(pct_chg >= 5, 1.25, where(pct_chg <= -3, 0.8, 1)))",
+        "Turnover scaled by gain, volume ratio and 3-minute momentum, with a bonus for strong gainers.",
+    ),
+    "momentum": (
+        "maximum(amount, 0) * maximum(0.1, 1 + 0.6 * clip(fill(ret_1m, 0) / 1.5, -1, 2)"
+        " + 0.4 * clip(fill(ret_5m, 0) / 3, -1, 2) + 0.2 * clip(fill(vol_accel, 1) - 1, 0, 4))",
+        "Short-term movers: 1- and 5-minute returns and volume acceleration.",
+    ),
+    "excess": (
+        "maximum(amount, 0) * maximum(0.1, 1 + clip(fill(excess_pct, 0) / 5, -0.5, 2) + volume_weight * clip(volume_ratio - 1, 0, 3))",
+        "Idiosyncratic moves: gain over the stock's own index.",
+    ),
+    "turnover": (
+        "maximum(amount, 0)",
+        "Turnover only.",
+    ),
+}
+
+
+def _parse_profile_strategies(raw: Optional[str]) -> Dict[str, str]:
+    """SCORING_PROFILE_STRATEGIES="aggressive=momentum,..." (profiles not listed use "default")."""
+    mapping: Dict[str, str] = {}
+    for part in (raw or "").split(","):
+        profile, _, name = part.partition("=")
+        if profile.strip() and name.strip():
+            mapping[profile.strip().lower()] = name.strip()
+    return mapping
+
+
+class ScoringStrategy:
+    """One named expression, validated and compiled once."""
+
+    def __init__(self, name: str, expression: str, description: str = "", builtin: bool = False):
+        self.name = name
+        self.expression = expression
+        self.description = description
+        self.builtin = builtin
+        self.code, self.columns, self.parameters = compile_expression(expression)
+        try:
+            self.evaluate({name: _TRIAL_VALUES for name in self.columns}, {name: 0.5 for name in self.parameters}, _TRIAL_VALUES.size)
+        except Exception as exc:
+            raise ValueError(f"expression fails on sample data: {type(exc).__name__}: {exc}") from exc
+
+    def evaluate(self, columns: Mapping[str, np.ndarray], params: Mapping[str, float], size: int) -> np.ndarray:
+        namespace = {**FUNCTIONS, **{name: params.get(name, 0.0) for name in self.parameters}}
+        namespace.update({name: columns[name] for name in self.columns})
+        with np.errstate(all="ignore"):
+            result = eval(self.code, {"__builtins__": {}}, namespace)  # validated AST, no builtins
+        scores = np.broadcast_to(np.asarray(result, dtype=np.float64), (size,)).copy()
+        scores[~np.isfinite(scores)] = 0.0
+        return scores
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "name": self.name,
+            "expression": self.expression,
+            "description": self.description,
+            "builtin": self.builtin,
+            "columns": sorted(self.columns),
+            "parameters": sorted(self.parameters),
+        }
+
+
+def compile_expression(expression: str) -> Tuple[object, Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Validate a scoring expression and compile it. Returns (code, columns, parameters).
+
+    Only arithmetic, comparisons, numeric constants, the names in COLUMNS /
+    PARAMETERS and calls to FUNCTIONS are accepted (no attributes, subscripts
+    or builtins), so an expression can only compute over arrays. Constants are
+    made floats, so `9**9**9**9` overflows at once instead of building a huge
+    integer. Raises ValueError otherwise.
+    """
+    if not isinstance(expression, str) or not expression.strip():
+        raise ValueError("expression must be a non-empty string")
+    if len(expression) > SCORING_MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"expression longer than {SCORING_MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as exc:
+        raise ValueError(f"invalid expression: {exc.msg}") from exc
+
+    columns: List[str] = []
+    parameters: List[str] = []
+    nodes = list(ast.walk(tree))
+    if len(nodes) > SCORING_MAX_NODES:
+        raise ValueError(f"expression has more than {SCORING_MAX_NODES} nodes")
+    callees = {id(node.func) for node in nodes if isinstance(node, ast.Call)}
+    for node in nodes:
+        if isinstance(node, ast.IfExp):
+            raise ValueError("use where(cond, a, b) instead of 'a if cond else b' (it must work element-wise)")
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"'{type(node).__name__}' is not allowed in scoring expressions")
+        if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            raise ValueError("only numeric constants are allowed")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise ValueError(f"allowed functions: {', '.join(sorted(FUNCTIONS))} (positional arguments only)")
+        elif isinstance(node, ast.Name) and id(node) not in callees:
+            if node.id in COLUMNS:
+                columns.append(node.id)
+            elif node.id in PARAMETERS:
+                parameters.append(node.id)
+            else:
+                raise ValueError(f"unknown name '{node.id}' (columns: {', '.join(COLUMNS)}; parameters: {', '.join(PARAMETERS)})")
+    for node in nodes:
+        if isinstance(node, ast.Constant):
+            node.value = float(node.value)
+    code = compile(tree, "<scoring>", "eval")
+    return code, tuple(dict.fromkeys(columns)), tuple(dict.fromkeys(parameters))
+
+
+class ScoringRegistry:
+    """
+    Named scoring strategies, selectable per profile or per caller.
+
+    Ranking builds only the columns the chosen expression references, one array
+    per column over all alerts, and evaluates the compiled expression once, so
+    scoring the whole alert cache is a single vectorized pass whatever the
+    formula. Strategies can be added, replaced or removed at runtime (the
+    swap is a single dict assignment under a lock; evaluations in flight keep
+    the strategy object they started with).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.strategies: Dict[str, ScoringStrategy] = {
+            name: ScoringStrategy(name, expression, description, builtin=True)
+            for name, (expression, description) in BUILTIN_STRATEGIES.items()
+        }
+        self.by_profile: Dict[str, str] = {}
+        # Strategies that raised at run time (logged once each; scoring falls back to "default").
+        self._failed: set = set()
+        for profile, name in _parse_profile_strategies(os.getenv("SCORING_PROFILE_STRATEGIES")).items():
+            if name in self.strategies:
+                self.by_profile[profile] = name
+            else:
+                logger.warning("Unknown scoring strategy %s for profile %s, using default.", name, profile)
+
+    def get(self, name: str) -> ScoringStrategy:
+        strategy = self.strategies.get(name)
+        if strategy is None:
+            raise ValueError(f"Unknown scoring strategy: {name}")
+        return strategy
+
+    def register(self, name: str, expression: str, description: str = "") -> ScoringStrategy:
+        name = (name or "").strip()
+        if not name.replace("_", "").replace("-", "").isalnum():
+            raise ValueError("strategy names are letters, digits, '-' and '_'")
+        with self._lock:
+            existing = self.strategies.get(name)
+            if existing is not None and existing.builtin:
+                raise ValueError(f"'{name}' is a built-in strategy")
+            strategy = ScoringStrategy(name, expression, description)
+            self.strategies[name] = strategy
+            self._failed.discard(name)
+        logger.info("Scoring strategy %s %s: %s", name, "replaced" if existing else "added", expression)
+        return strategy
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            strategy = self.get(name)
+            if strategy.builtin:
+                raise ValueError(f"'{name}' is a built-in strategy")
+            in_use = sorted(profile for profile, selected in self.by_profile.items() if selected == name)
+            if in_use:
+                raise ValueError(f"'{name}' is selected for profiles: {', '.join(in_use)}")
+            del self.strategies[name]
+            self._failed.discard(name)
+
+    def select_for_profiles(self, mapping: Mapping[str, str]) -> Dict[str, str]:
+        with self._lock:
+            for name in mapping.values():
+                self.get(name)
+            self.by_profile.update({profile.strip().lower(): name for profile, name in mapping.items()})
+            return dict(self.by_profile)
+
+    def strategy_for(self, policy: Mapping[str, object], name: Optional[str] = None) -> ScoringStrategy:
+        if name is None:
+            name = self.by_profile.get(str(policy.get("profile", "")), "default")
+        return self.get(name)
+
+    def score_alerts(
+        self,
+        alerts: Sequence[StockAlert],
+        policy: Mapping[str, object],
+        name: Optional[str] = None,
+        columns: Optional[Dict[str, np.ndarray]] = None,
+    ) -> np.ndarray:
+        """
+        Score per alert with the named strategy (default: the one selected for the
+        policy's profile). `columns` is an optional cache of column arrays over the
+        same alerts, filled as needed, so several strategies share the extraction.
+        """
+        strategy = self.strategy_for(policy, name)
+        count = len(alerts)
+        if not count:
+            return np.zeros(0, dtype=np.float64)
+        columns = {} if columns is None else columns
+        for column in strategy.columns:
+            if column not in columns:
+                columns[column] = np.fromiter(map(COLUMNS[column], alerts), dtype=np.float64, count=count)
+        params = {key: float(policy.get(key, 0.0)) for key in strategy.parameters}  # type: ignore[arg-type]
+        try:
+            return strategy.evaluate(columns, params, count)
+        except Exception as exc:
+            if strategy.name == "default":
+                raise
+            if strategy.name not in self._failed:
+                self._failed.add(strategy.name)
+                logger.error("Scoring strategy %s failed (%s: %s); using default.", strategy.name, type(exc).__name__, exc)
+            return self.score_alerts(alerts, policy, "default", columns)
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "strategies": [strategy.to_dict() for strategy in self.strategies.values()],
+            "by_profile": dict(self.by_profile),
+            "default": "default",
+            "columns": list(COLUMNS),
+            "parameters": list(PARAMETERS),
+            "functions": sorted(FUNCTIONS),
+        }
+
+
+scoring_registry = ScoringRegistry()
@@ -0,0 +1,183 @@
+import json
+import os
+from datetime import datetime
+from typing import Iterable, List, Mapping, Optional
+
+import numpy as np
+
+from backend.app.models.stock import StockAlert, StockData
+from backend.app.services.universe import UniverseIndex
+
+HEATMAP_INTERVAL_SECONDS = float(os.getenv("HEATMAP_INTERVAL_SECONDS", "2.0"))
+HEATMAP_MAX_CONCEPTS = int(os.getenv("HEATMAP_MAX_CONCEPTS", "60"))
+
+# Volume ratio histogram bin edges for alerting members: [0,1) [1,2) [2,3) [3,5) [5,inf)
+VOLUME_RATIO_BINS = np.array([1.0, 2.0, 3.0, 5.0])
+
+HEATMAP_FIELDS = ("name", "members", "amount", "avg_pct", "alerts", "vr_bins")
+
+
+class _GroupAggregate:
+    """Running per-group sums for one categorical dimension (industry or concept)."""
+
+    def __init__(self, names: List[str], group_ids: np.ndarray):
+        self.names = names
+        self.group_ids = group_ids
+        count = len(names)
+        self.members = np.zeros(count, dtype=np.int64)
+        self.amount = np.zeros(count, dtype=np.float64)
+        self.pct_sum = np.zeros(count, dtype=np.float64)
+        self.alerts = np.zeros(count, dtype=np.int64)
+        self.vr_hist = np.zeros((count, VOLUME_RATIO_BINS.size + 1), dtype=np.int64)
+
+    def apply_quotes(self, slots: np.ndarray, amount: np.ndarray, pct: np.ndarray, sign: int) -> None:
+        ids = self.group_ids[slots]
+        np.add.at(self.members, ids, sign)
+        np.add.at(self.amount, ids, sign * amount)
+        np.add.at(self.pct_sum, ids, sign * pct)
+
+    def apply_alerts(self, slots: np.ndarray, volume_ratio: np.ndarray, sign: int) -> None:
+        ids = self.group_ids[slots]
+        np.add.at(self.alerts, ids, sign)
+        np.add.at(self.vr_hist, (ids, np.digitize(volume_ratio, VOLUME_RATIO_BINS)), sign)
+
+    def rows(self, limit: Optional[int] = None) -> List[list]:
+        populated = np.flatnonzero(self.members > 0)
+        populated = populated[[bool(self.names[i]) for i in populated]] if populated.size else populated
+        if limit is not None and populated.size > limit:
+            top = np.argpartition(self.amount[populated], -limit)[-limit:]
+            populated = populated[top]
+        order = populated[np.argsort(-self.amount[populated])]
+        avg_pct = self.pct_sum[order] / self.members[order]
+        return [
+            [
+                self.names[g],
+                int(self.members[g]),
+                round(float(self.amount[g]), 0),
+                round(float(avg), 3),
+                int(self.alerts[g]),
+                self.vr_hist[g].tolist(),
+            ]
+            for g, avg in zip(order, avg_pct)
+        ]
+
+
+class SectorHeatmap:
+    """
+    Server-side industry / concept aggregation for the heat map feed.
+
+    Quote and alert state is held per universe slot; group totals are updated
+    with np.add.at on the slots that changed (subtract old contribution, add
+    new), so each cycle costs O(updated codes). Frames are built at most once
+    per `interval_seconds` and only when something changed.
+    """
+
+    def __init__(self, universe: UniverseIndex, interval_seconds: float = HEATMAP_INTERVAL_SECONDS):
+        self.universe = universe
+        self.interval_seconds = interval_seconds
+        size = universe.size
+        self.amount = np.zeros(size, dtype=np.float64)
+        self.pct = np.zeros(size, dtype=np.float64)
+        self.quoted = np.zeros(size, dtype=bool)
+        self.volume_ratio = np.zeros(size, dtype=np.float64)
+        self.alerting = np.zeros(size, dtype=bool)
+        self.industry = _GroupAggregate(universe.industry_names, universe.industry_ids)
+        self.concept = _GroupAggregate(universe.concept_names, universe.concept_ids)
+        self.seq = 0
+        self._dirty = False
+        self._next_frame_at = 0.0
+
+    def _apply_quotes(self, slots: np.ndarray, sign: int) -> None:
+        if slots.size == 0:
+            return
+        amount = self.amount[slots]
+        pct = self.pct[slots]
+        self.industry.apply_quotes(slots, amount, pct, sign)
+        self.concept.apply_quotes(slots, amount, pct, sign)
+
+    def _apply_alerts(self, slots: np.ndarray, sign: int) -> None:
+        if slots.size == 0:
+            return
+        volume_ratio = self.volume_ratio[slots]
+        self.industry.apply_alerts(slots, volume_ratio, sign)
+        self.concept.apply_alerts(slots, volume_ratio, sign)
+
+    def update_quotes(self, snapshot: List[StockData]) -> None:
+        latest = {stock.code: stock for stock in snapshot}
+        if not latest:
+            return
+        codes = list(latest.keys())
+        slots = self.universe.slots_for(codes)
+        known = slots >= 0
+        slots = slots[known]
+        stocks = [latest[code] for code, ok in zip(codes, known) if ok]
+
+        self._apply_quotes(slots[self.quoted[slots]], -1)
+        self.amount[slots] = np.fromiter((max(0.0, s.amount) for s in stocks), dtype=np.float64, count=len(stocks))
+        self.pct[slots] = np.fromiter((s.pct_chg for s in stocks), dtype=np.float64, count=len(stocks))
+        self.quoted[slots] = True
+        self._apply_quotes(slots, +1)
+        self._dirty = True
+
+    def remove_quotes(self, codes: Iterable[str]) -> None:
+        slots = self.universe.slots_for(codes)
+        slots = slots[slots >= 0]
+        slots = slots[self.quoted[slots]]
+        if slots.size == 0:
+            return
+        self._apply_quotes(slots, -1)
+        self.quoted[slots] = False
+        self._dirty = True
+
+    def update_alerts(self, codes: Iterable[str], alert_map: Mapping[str, StockAlert]) -> None:
+        """Refresh alert membership for re-fetched codes (alert or no longer alerting)."""
+        codes = list(codes)
+        slots = self.universe.slots_for(codes)
+        known = slots >= 0
+        slots = slots[known]
+        if slots.size == 0:
+            return
+        codes = [code for code, ok in zip(codes, known) if ok]
+
+        self._apply_alerts(slots[self.alerting[slots]], -1)
+        hits = np.fromiter((code in alert_map for code in codes), dtype=bool, count=len(codes))
+        hit_slots = slots[hits]
+        self.alerting[slots] = hits
+        if hit_slots.size:
+            self.volume_ratio[hit_slots] = np.fromiter(
+                (alert_map[code].volume_ratio for code, hit in zip(codes, hits) if hit),
+                dtype=np.float64,
+                count=int(hit_slots.size),
+            )
+            self._apply_alerts(hit_slots, +1)
+        self._dirty = True
+
+    def remove_alerts(self, codes: Iterable[str]) -> None:
+        slots = self.universe.slots_for(codes)
+        slots = slots[slots >= 0]
+        slots = slots[self.alerting[slots]]
+        if slots.size == 0:
+            return
+        self._apply_alerts(slots, -1)
+        self.alerting[slots] = False
+        self._dirty = True
+
+    def build_frame(self) -> str:
+        self.seq += 1
+        frame = {
+            "type": "heatmap",
+            "seq": self.seq,
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "fields": HEATMAP_FIELDS,
+            "industry": self.industry.rows(),
+            "concept": self.concept.rows(limit=HEATMAP_MAX_CONCEPTS),
+        }
+        return json.dumps(frame, ensure_ascii=False, separators=(",", ":"))
+
+    def maybe_frame(self, now: float) -> Optional[str]:
+        """Throttled frame: at most one per interval, only when state changed."""
+        if not self._dirty or now < self._next_frame_at:
+            return None
+        self._dirty = False
+        self._next_frame_at = now + self.interval_seconds
+        return self.build_frame()
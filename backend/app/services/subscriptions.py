@@ -0,0 +1,172 @@
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, List, Mapping, Set, Tuple
+
+from backend.app.models.stock import StockAlert
+
+WS_MAX_CODES_PER_CLIENT = int(os.getenv("WS_MAX_CODES_PER_CLIENT", "200"))
+WS_MAX_WATCHED_CODES = int(os.getenv("WS_MAX_WATCHED_CODES", "600"))
+
+FILTER_KEYS = ("codes", "indices", "industries")
+
+# (alert, serialized payload, ranking score) as produced by the producer for one cycle.
+SelectionEntry = Tuple[StockAlert, str, float]
+
+
+class ClientFilter:
+    """One client's subscription. Keys are OR-ed; `min_score` applies on top."""
+
+    def __init__(self):
+        self.codes: Set[str] = set()
+        self.indices: Set[str] = set()
+        self.industries: Set[str] = set()
+        self.min_score = 0.0
+
+    def is_active(self) -> bool:
+        return bool(self.codes or self.indices or self.industries or self.min_score > 0)
+
+    def has_keys(self) -> bool:
+        return bool(self.codes or self.indices or self.industries)
+
+    def matches(self, alert: StockAlert, score: float) -> bool:
+        if score < self.min_score:
+            return False
+        if not self.has_keys():
+            return True
+        return (
+            alert.code in self.codes
+            or alert.index_code in self.indices
+            or (alert.industry or "") in self.industries
+        )
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "codes": sorted(self.codes),
+            "indices": sorted(self.indices),
+            "industries": sorted(self.industries),
+            "min_score": self.min_score,
+        }
+
+
+def _string_list(payload: Mapping[str, object], key: str) -> List[str]:
+    value = payload.get(key) or []
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(v, (str, int)) for v in value):
+        raise ValueError(f"'{key}' must be a list of strings")
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+class SubscriptionIndex:
+    """
+    Inverted index from code / index / industry to subscribed client ids.
+
+    Clients without an active filter keep receiving the full stream. Routing an
+    alert only touches the subscriber sets of its own code, index and industry,
+    so cost follows the number of interested clients, not all connections.
+    """
+
+    def __init__(self):
+        self.filters: Dict[int, ClientFilter] = {}
+        self.by_code: Dict[str, Set[int]] = defaultdict(set)
+        self.by_index: Dict[str, Set[int]] = defaultdict(set)
+        self.by_industry: Dict[str, Set[int]] = defaultdict(set)
+        # Active filters with only `min_score` (no keys) match every alert.
+        self.score_only: Set[int] = set()
+
+    def _tables(self) -> Tuple[Tuple[str, Dict[str, Set[int]]], ...]:
+        return (("codes", self.by_code), ("indices", self.by_index), ("industries", self.by_industry))
+
+    def _unlink(self, client_id: int, client_filter: ClientFilter) -> None:
+        for attr, table in self._tables():
+            for key in getattr(client_filter, attr):
+                subscribers = table.get(key)
+                if subscribers is not None:
+                    subscribers.discard(client_id)
+                    if not subscribers:
+                        del table[key]
+        self.score_only.discard(client_id)
+
+    def _link(self, client_id: int, client_filter: ClientFilter) -> None:
+        for attr, table in self._tables():
+            for key in getattr(client_filter, attr):
+                table[key].add(client_id)
+        if client_filter.is_active() and not client_filter.has_keys():
+            self.score_only.add(client_id)
+
+    def apply(self, client_id: int, message: Mapping[str, object]) -> ClientFilter:
+        """Apply a subscribe / unsubscribe / reset message. Raises ValueError on bad input."""
+        action = message.get("action")
+        current = self.filters.get(client_id) or ClientFilter()
+        updated = ClientFilter()
+        updated.codes, updated.indices, updated.industries = set(current.codes), set(current.indices), set(current.industries)
+        updated.min_score = current.min_score
+
+        if action == "reset":
+            updated = ClientFilter()
+        elif action in ("subscribe", "unsubscribe"):
+            for key in FILTER_KEYS:
+                values = set(_string_list(message, key))
+                target: Set[str] = getattr(updated, key)
+                if action == "subscribe":
+                    target |= values
+                else:
+                    target -= values
+            if "min_score" in message:
+                try:
+                    updated.min_score = max(0.0, float(message["min_score"]))  # type: ignore[arg-type]
+                except (TypeError, ValueError):
+                    raise ValueError("'min_score' must be a number")
+            if len(updated.codes) > WS_MAX_CODES_PER_CLIENT:
+                raise ValueError(f"At most {WS_MAX_CODES_PER_CLIENT} codes per connection")
+            new_codes = updated.codes - current.codes
+            if new_codes and len(self.by_code.keys() | new_codes) > WS_MAX_WATCHED_CODES:
+                raise ValueError("Server watchlist capacity reached")
+        else:
+            raise ValueError(f"Unknown action: {action}")
+
+        self._unlink(client_id, current)
+        if updated.is_active():
+            self.filters[client_id] = updated
+            self._link(client_id, updated)
+        else:
+            self.filters.pop(client_id, None)
+        return updated
+
+    def remove(self, client_id: int) -> None:
+        client_filter = self.filters.pop(client_id, None)
+        if client_filter is not None:
+            self._unlink(client_id, client_filter)
+
+    def is_filtered(self, client_id: int) -> bool:
+        return client_id in self.filters
+
+    def candidates(self, alert: StockAlert) -> Set[int]:
+        """Clients that may want this alert (before `min_score`)."""
+        result = set(self.score_only)
+        for table, key in (
+            (self.by_code, alert.code),
+            (self.by_index, alert.index_code),
+            (self.by_industry, alert.industry or ""),
+        ):
+            subscribers = table.get(key)
+            if subscribers:
+                result |= subscribers
+        return result
+
+    def route(self, entries: Iterable[SelectionEntry]) -> Dict[int, List[SelectionEntry]]:
+        """Entries per filtered client, in selection order."""
+        routed: Dict[int, List[SelectionEntry]] = defaultdict(list)
+        filters = self.filters
+        for entry in entries:
+            alert, _, score = entry
+            for client_id in self.candidates(alert):
+                if score >= filters[client_id].min_score:
+                    routed[client_id].append(entry)
+        return routed
+
+    def quote_subscribers(self, code: str) -> Set[int]:
+        return self.by_code.get(code, set())
+
+    def watched_codes(self) -> Set[str]:
+        return set(self.by_code.keys())
@@ -0,0 +1,348 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from backend.app.core.metrics import metrics
+from backend.app.models.stock import StockData
+
+logger = logging.getLogger(__name__)
+
+TICK_STORE_ENABLED = os.getenv("TICK_STORE_ENABLED", "true").lower() == "true"
+TICK_STORE_DIR = os.getenv("TICK_STORE_DIR", os.path.join("backend", "data", "ticks"))
+TICK_STORE_RETENTION_DAYS = int(os.getenv("TICK_STORE_RETENTION_DAYS", "10"))
+TICK_STORE_QUEUE_SIZE = int(os.getenv("TICK_STORE_QUEUE_SIZE", "256"))
+INITIAL_CAPACITY = 1 << 18  # rows; grows by doubling
+
+# One memory-mapped file per field. `slot` indexes the day's codes.json.
+FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("ts", "<f8"),
+    ("slot", "<i4"),
+    ("price", "<f4"),
+    ("pct_chg", "<f4"),
+    ("volume", "<i8"),
+    ("amount", "<f8"),
+)
+
+metrics.describe_histogram("tidesonar_tick_store_append_seconds", "Time to append one producer cycle to the tick store.")
+metrics.describe_counter("tidesonar_tick_store_rows_total", "Rows appended to the intraday tick store.")
+metrics.describe_counter("tidesonar_tick_store_dropped_total", "Producer cycles dropped because the writer queue was full.")
+
+
+class _Column:
+    def __init__(self, path: str, dtype: str, capacity: int, writable: bool):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.writable = writable
+        self.array = self._map(capacity)
+
+    def _map(self, capacity: int) -> np.memmap:
+        if self.writable:
+            needed = capacity * self.dtype.itemsize
+            with open(self.path, "ab") as f:
+                if f.tell() < needed:
+                    f.truncate(needed)
+            return np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(capacity,))
+        capacity = os.path.getsize(self.path) // self.dtype.itemsize
+        return np.memmap(self.path, dtype=self.dtype, mode="r", shape=(capacity,))
+
+    def grow(self, capacity: int) -> None:
+        self.array.flush()
+        self.array = self._map(capacity)
+
+
+class TickDay:
+    """
+    Append-only columnar store for one trading day.
+
+    A writable day is owned by the writer thread. A read-only day never
+    creates or extends files; it re-reads meta.json on every query, so it
+    sees rows appended since (possibly by another process).
+    """
+
+    def __init__(self, directory: str, writable: bool):
+        self.directory = directory
+        self.writable = writable
+        self._lock = threading.Lock()
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+
+        meta = self._read_json("meta.json", {})
+        self.rows: int = int(meta.get("rows", 0))
+        self.capacity: int = max(int(meta.get("capacity", INITIAL_CAPACITY)), self.rows, 1)
+        self.codes: List[str] = self._read_json("codes.json", [])
+        self.slot_of: Dict[str, int] = {code: slot for slot, code in enumerate(self.codes)}
+        self.columns: Dict[str, _Column] = {
+            name: _Column(os.path.join(directory, f"{name}.bin"), dtype, self.capacity, writable)
+            for name, dtype in FIELDS
+        }
+
+    def _read_json(self, name: str, default):
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return default
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_json(self, name: str, payload) -> None:
+        path = os.path.join(self.directory, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    def _slots(self, codes: List[str]) -> np.ndarray:
+        added = False
+        slots = np.empty(len(codes), dtype=np.int32)
+        for i, code in enumerate(codes):
+            slot = self.slot_of.get(code)
+            if slot is None:
+                slot = len(self.codes)
+                self.codes.append(code)
+                self.slot_of[code] = slot
+                added = True
+            slots[i] = slot
+        if added:
+            self._write_json("codes.json", self.codes)
+        return slots
+
+    def append(self, snapshot: List[StockData]) -> int:
+        count = len(snapshot)
+        if count == 0:
+            return 0
+        with self._lock:
+            slots = self._slots([s.code for s in snapshot])
+            start, end = self.rows, self.rows + count
+            if end > self.capacity:
+                while end > self.capacity:
+                    self.capacity *= 2
+                for column in self.columns.values():
+                    column.grow(self.capacity)
+
+            c = self.columns
+            c["ts"].array[start:end] = np.fromiter((s.timestamp.timestamp() for s in snapshot), dtype=np.float64, count=count)
+            c["slot"].array[start:end] = slots
+            c["price"].array[start:end] = np.fromiter((s.price for s in snapshot), dtype=np.float32, count=count)
+            c["pct_chg"].array[start:end] = np.fromiter((s.pct_chg for s in snapshot), dtype=np.float32, count=count)
+            c["volume"].array[start:end] = np.fromiter((s.volume for s in snapshot), dtype=np.int64, count=count)
+            c["amount"].array[start:end] = np.fromiter((s.amount for s in snapshot), dtype=np.float64, count=count)
+
+            self.rows = end
+            # Row count is published after the data so readers never see unwritten rows.
+            self._write_json("meta.json", {"rows": self.rows, "capacity": self.capacity, "fields": dict(FIELDS)})
+        return count
+
+    def flush(self) -> None:
+        with self._lock:
+            for column in self.columns.values():
+                column.array.flush()
+
+    def _refresh(self) -> None:
+        # meta.json is published after the data and codes.json, so everything it counts is readable.
+        rows = int(self._read_json("meta.json", {}).get("rows", 0))
+        if rows <= self.rows:
+            return
+        codes = self._read_json("codes.json", [])
+        for slot in range(len(self.codes), len(codes)):
+            self.slot_of[codes[slot]] = slot
+        self.codes = codes
+        for column in self.columns.values():
+            if column.array.shape[0] < rows:
+                column.array = column._map(rows)
+        self.rows = rows
+
+    def view(self) -> Tuple[int, Dict[str, np.ndarray]]:
+        """Committed rows of every column (zero-copy memmap slices)."""
+        with self._lock:
+            if not self.writable:
+                self._refresh()
+            rows = self.rows
+            return rows, {name: column.array[:rows] for name, column in self.columns.items()}
+
+    def symbol_series(self, code: str, start_ts: float = 0.0, end_ts: float = float("inf")) -> Dict[str, list]:
+        _, cols = self.view()
+        slot = self.slot_of.get(code)
+        if slot is None:
+            return {name: [] for name, _ in FIELDS if name != "slot"}
+        ts = cols["ts"]
+        lo = int(np.searchsorted(ts, start_ts, side="left"))
+        hi = int(np.searchsorted(ts, end_ts, side="right"))
+        idx = lo + np.flatnonzero(cols["slot"][lo:hi] == slot)
+        return {
+            "ts": cols["ts"][idx].tolist(),
+            "price": np.round(cols["price"][idx].astype(np.float64), 3).tolist(),
+            "pct_chg": np.round(cols["pct_chg"][idx].astype(np.float64), 3).tolist(),
+            "volume": cols["volume"][idx].tolist(),
+            "amount": cols["amount"][idx].tolist(),
+        }
+
+    def cross_section(
+        self,
+        at_ts: float,
+        codes: Optional[List[str]] = None,
+        max_age_seconds: Optional[float] = None,
+    ) -> List[Dict[str, object]]:
+        """Latest row per code at or before `at_ts`."""
+        _, cols = self.view()
+        end = int(np.searchsorted(cols["ts"], at_ts, side="right"))
+        if end == 0:
+            return []
+        slots_rev = cols["slot"][:end][::-1]
+        unique_slots, first_rev = np.unique(slots_rev, return_index=True)
+        idx = end - 1 - first_rev
+        if codes is not None:
+            wanted = np.array([self.slot_of[c] for c in codes if c in self.slot_of], dtype=np.int32)
+            keep = np.isin(unique_slots, wanted)
+            unique_slots, idx = unique_slots[keep], idx[keep]
+        if max_age_seconds is not None:
+            keep = cols["ts"][idx] >= at_ts - max_age_seconds
+            unique_slots, idx = unique_slots[keep], idx[keep]
+
+        ts = cols["ts"][idx]
+        price = cols["price"][idx]
+        pct = cols["pct_chg"][idx]
+        volume = cols["volume"][idx]
+        amount = cols["amount"][idx]
+        return [
+            {
+                "code": self.codes[int(slot)],
+                "ts": float(ts[i]),
+                "price": round(float(price[i]), 3),
+                "pct_chg": round(float(pct[i]), 3),
+                "volume": int(volume[i]),
+                "amount": float(amount[i]),
+            }
+            for i, slot in enumerate(unique_slots)
+        ]
+
+    def iter_batches(self) -> Iterator[Tuple[float, Dict[str, np.ndarray]]]:
+        """Yield (ts, columns) per recorded fetch timestamp, in time order (used by replay)."""
+        rows, cols = self.view()
+        if rows == 0:
+            return
+        ts = cols["ts"]
+        boundaries = np.flatnonzero(np.diff(ts)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [rows]))
+        for start, end in zip(starts, ends):
+            yield float(ts[start]), {name: col[start:end] for name, col in cols.items()}
+
+
+class TickStore:
+    """
+    Per-day tick history (`<TICK_STORE_DIR>/<YYYYMMDD>/<field>.bin`).
+
+    The producer hands each cycle's snapshot to `submit()`; a dedicated writer
+    thread converts it to columns and appends in bulk, so the event loop never
+    waits on disk. Queries read the memory-mapped columns directly: through
+    the writer's own TickDay when this process records the day, otherwise
+    through a read-only one (API workers never create day directories).
+    """
+
+    def __init__(self, root: str = TICK_STORE_DIR, retention_days: int = TICK_STORE_RETENTION_DAYS):
+        self.root = root
+        self.retention_days = retention_days
+        self._days: Dict[str, TickDay] = {}  # writable, owned by the writer thread
+        self._readers: Dict[str, TickDay] = {}
+        self._days_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[List[StockData]]]" = queue.Queue(maxsize=TICK_STORE_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._current_day: Optional[str] = None
+
+    @staticmethod
+    def day_key(value: Optional[date] = None) -> str:
+        return (value or date.today()).strftime("%Y%m%d")
+
+    def available_days(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if d.isdigit() and len(d) == 8)
+
+    def day(self, key: Optional[str] = None, writable: bool = False) -> Optional[TickDay]:
+        """The day's store; None for a read when nothing was recorded that day."""
+        key = key or self.day_key()
+        with self._days_lock:
+            tick_day = self._days.get(key)
+            if tick_day is not None:
+                return tick_day
+            directory = os.path.join(self.root, key)
+            if writable:
+                tick_day = self._days[key] = TickDay(directory, writable=True)
+                return tick_day
+            tick_day = self._readers.get(key)
+            if tick_day is None:
+                if not os.path.exists(os.path.join(directory, "meta.json")):
+                    return None
+                tick_day = self._readers[key] = TickDay(directory, writable=False)
+            return tick_day
+
+    # --- Writer ---
+
+    def start(self) -> None:
+        if self._writer and self._writer.is_alive():
+            return
+        self._writer = threading.Thread(target=self._write_loop, name="tick-store-writer", daemon=True)
+        self._writer.start()
+        logger.info("Tick store writer started (dir=%s, retention=%sd)", self.root, self.retention_days)
+
+    def stop(self) -> None:
+        if self._writer and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    def submit(self, snapshot: List[StockData]) -> bool:
+        """Non-blocking hand-off from the producer loop."""
+        if not snapshot:
+            return True
+        try:
+            self._queue.put_nowait(snapshot)
+            return True
+        except queue.Full:
+            metrics.inc("tidesonar_tick_store_dropped_total")
+            return False
+
+    def _write_loop(self) -> None:
+        while True:
+            snapshot = self._queue.get()
+            if snapshot is None:
+                break
+            try:
+                key = self.day_key(snapshot[0].timestamp.date())
+                if key != self._current_day:
+                    self._roll_day(key)
+                with metrics.timer("tidesonar_tick_store_append_seconds"):
+                    written = self.day(key, writable=True).append(snapshot)
+                metrics.inc("tidesonar_tick_store_rows_total", written)
+            except Exception as exc:
+                logger.error("Tick store append failed: %s", exc)
+        with self._days_lock:
+            for tick_day in self._days.values():
+                if tick_day.writable:
+                    tick_day.flush()
+
+    def _roll_day(self, key: str) -> None:
+        previous = self._current_day
+        self._current_day = key
+        with self._days_lock:
+            if previous and previous in self._days:
+                self._days.pop(previous).flush()
+        cutoff = self.day_key(date.today() - timedelta(days=self.retention_days))
+        for old in self.available_days():
+            if old < cutoff:
+                shutil.rmtree(os.path.join(self.root, old), ignore_errors=True)
+                logger.info("Tick store: removed expired day %s", old)
+
+
+def parse_day_time(day_key: str, hhmmss: str) -> float:
+    """'20260224' + '10:03' / '10:03:15' -> epoch seconds (local time)."""
+    fmt = "%Y%m%d %H:%M:%S" if hhmmss.count(":") == 2 else "%Y%m%d %H:%M"
+    return datetime.strptime(f"{day_key} {hhmmss}", fmt).timestamp()
+
+
+tick_store = TickStore()
@@ -0,0 +1,126 @@
+import os
+from itertools import repeat
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+# Daily price limit bands in percent. Main-board ST shares went from 5% to 10% on 2025-07-07.
+PRICE_LIMIT_MAIN_PCT = float(os.getenv("PRICE_LIMIT_MAIN_PCT", "10"))
+PRICE_LIMIT_ST_PCT = float(os.getenv("PRICE_LIMIT_ST_PCT", "10"))
+PRICE_LIMIT_GROWTH_PCT = float(os.getenv("PRICE_LIMIT_GROWTH_PCT", "20"))
+PRICE_LIMIT_BJ_PCT = float(os.getenv("PRICE_LIMIT_BJ_PCT", "30"))
+# Band of a stock that trades without a limit (limit tests are false for it).
+NO_PRICE_LIMIT = float("nan")
+
+GROWTH_BOARD_PREFIXES = ("300", "301", "688", "689")
+
+
+def _new_listing_tag(name: str, tag: str) -> bool:
+    # Exchange name prefix for new listings, e.g. "N" + the Chinese name.
+    return len(name) > 1 and name[0] == tag and not name[1].isascii()
+
+
+def price_limit_pct(code: str, name: str = "") -> float:
+    """
+    Daily price limit in percent from the board (code prefix) and name:
+    ChiNext (300/301) and STAR (688/689) PRICE_LIMIT_GROWTH_PCT, Beijing
+    (4xx/8xx/92x) PRICE_LIMIT_BJ_PCT, main-board ST PRICE_LIMIT_ST_PCT, other
+    main-board shares PRICE_LIMIT_MAIN_PCT. New listings in their unlimited
+    first days ("N" names on day one, "C" names on ChiNext/STAR days 2-5) get
+    NO_PRICE_LIMIT.
+    """
+    name = (name or "").strip()
+    growth = code.startswith(GROWTH_BOARD_PREFIXES)
+    if _new_listing_tag(name, "N") or (growth and _new_listing_tag(name, "C")):
+        return NO_PRICE_LIMIT
+    if growth:
+        return PRICE_LIMIT_GROWTH_PCT
+    if code.startswith(("4", "8", "92")):
+        return PRICE_LIMIT_BJ_PCT
+    if "ST" in name.upper():
+        return PRICE_LIMIT_ST_PCT
+    return PRICE_LIMIT_MAIN_PCT
+
+
+class UniverseIndex:
+    """
+    Stable code -> slot mapping for the loaded stock universe.
+    Array-based stages (market pulse, aggregations, feature buffers) index their
+    per-symbol numpy arrays by slot instead of keying dicts by code.
+
+    Index membership is kept as one bool array per index (a stock can belong to
+    several); `index_ids` is the single display group per stock.
+    """
+
+    def __init__(
+        self,
+        stock_map: Mapping[str, Mapping[str, str]],
+        index_members: Optional[Mapping[str, Iterable[str]]] = None,
+    ):
+        self.codes: List[str] = [str(code) for code in stock_map.keys()]
+        self.slot_of: Dict[str, int] = {code: slot for slot, code in enumerate(self.codes)}
+        self.size = len(self.codes)
+        # Categorical metadata as group-id arrays aligned with slots.
+        self.index_names, self.index_ids = self._encode(stock_map, "index")
+        self.industry_names, self.industry_ids = self._encode(stock_map, "industry")
+        self.concept_names, self.concept_ids = self._encode(stock_map, "concept")
+        self.limit_pct = np.fromiter(
+            (price_limit_pct(code, meta.get("name", "") if isinstance(meta, Mapping) else "") for code, meta in zip(self.codes, stock_map.values())),
+            dtype=np.float64,
+            count=self.size,
+        )
+        self.members: Dict[str, np.ndarray] = {}
+        if index_members:
+            for name, codes in index_members.items():
+                self.members[name] = self.mask_for(codes)
+        else:
+            # No official lists (e.g. replay of an old tape): membership = display group.
+            for group_id, name in enumerate(self.index_names):
+                if name:
+                    self.members[name] = self.index_ids == group_id
+        self._group_masks: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def _encode(stock_map: Mapping[str, Mapping[str, str]], field: str) -> Tuple[List[str], np.ndarray]:
+        names: List[str] = []
+        id_of: Dict[str, int] = {}
+        ids = np.empty(len(stock_map), dtype=np.int32)
+        for slot, meta in enumerate(stock_map.values()):
+            value = (meta.get(field) if isinstance(meta, Mapping) else None) or ""
+            group_id = id_of.get(value)
+            if group_id is None:
+                group_id = len(names)
+                id_of[value] = group_id
+                names.append(value)
+            ids[slot] = group_id
+        return names, ids
+
+    def slot(self, code: str) -> int:
+        return self.slot_of.get(code, -1)
+
+    def mask_for(self, codes: Iterable[str]) -> np.ndarray:
+        slots = self.slots_for(codes)
+        mask = np.zeros(self.size, dtype=bool)
+        mask[slots[slots >= 0]] = True
+        return mask
+
+    def member_mask(self, names: Iterable[str]) -> np.ndarray:
+        """Stocks belonging to any of the given indices."""
+        mask = np.zeros(self.size, dtype=bool)
+        for name in names:
+            member = self.members.get(name)
+            if member is not None:
+                mask |= member
+        return mask
+
+    def group_mask(self, name: str) -> np.ndarray:
+        """Stocks whose display group (`index_code`) is `name`."""
+        mask = self._group_masks.get(name)
+        if mask is None:
+            group_id = self.index_names.index(name) if name in self.index_names else -1
+            mask = self._group_masks[name] = self.index_ids == group_id
+        return mask
+
+    def slots_for(self, codes: Iterable[str]) -> np.ndarray:
+        """Slot per code (-1 for codes outside the universe)."""
+        return np.fromiter(map(self.slot_of.get, codes, repeat(-1)), dtype=np.int64)
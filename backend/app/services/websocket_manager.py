@@ -1,47 +1,311 @@
-from typing import List
+from collections import deque
+from typing import Container, Deque, Dict, List, Optional, Union
 from fastapi import WebSocket
 from datetime import datetime
+import asyncio
+import json
 import logging
+import time
+
+from backend.app.core.metrics import metrics
+from backend.app.models.stock import StockAlert, StockData
+from backend.app.services.coalescer import ClientCoalescer, clamp_rate
+from backend.app.services.frame_ring import ring_name_from_env
+from backend.app.services.limit_state import LIMIT_EVENT_HISTORY
+from backend.app.services.ranking_views import RankingViews, default_selection
+from backend.app.services.subscriptions import SelectionEntry, SubscriptionIndex
+from backend.app.services.wire_format import MsgpackEncoder, WireEncoder, encoder_for, negotiate
 
 logger = logging.getLogger(__name__)
 
+metrics.describe_histogram("tidesonar_ws_send_seconds", "Time to hand one message to a single WebSocket client.")
+metrics.describe_counter("tidesonar_ws_send_errors_total", "Failed WebSocket sends.")
+metrics.describe_counter("tidesonar_ws_messages_total", "Messages sent to WebSocket clients by kind.")
+metrics.describe_counter("tidesonar_ws_bytes_total", "Payload bytes handed to WebSocket clients by wire format (before deflate).")
+metrics.describe_counter("tidesonar_ws_coalesced_total", "Pending updates replaced by a newer one for the same code before being sent.")
+
+class ClientSendStats:
+    """Per-connection send lag bookkeeping (exposed via /api/runtime/metrics)."""
+
+    def __init__(self, websocket: WebSocket, wire_format: str = "json"):
+        client = getattr(websocket, "client", None)
+        self.peer = f"{client.host}:{client.port}" if client else "unknown"
+        self.wire_format = wire_format
+        self.bytes_sent = 0
+        self.connected_at = datetime.now().isoformat(timespec="seconds")
+        self.messages_sent = 0
+        self.send_errors = 0
+        self.last_send_ms = 0.0
+        self.max_send_ms = 0.0
+        self.ema_send_ms = 0.0
+
+    def record(self, elapsed_seconds: float) -> None:
+        elapsed_ms = elapsed_seconds * 1000.0
+        self.messages_sent += 1
+        self.last_send_ms = elapsed_ms
+        self.max_send_ms = max(self.max_send_ms, elapsed_ms)
+        self.ema_send_ms = elapsed_ms if self.messages_sent == 1 else 0.2 * elapsed_ms + 0.8 * self.ema_send_ms
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "peer": self.peer,
+            "connected_at": self.connected_at,
+            "wire_format": self.wire_format,
+            "bytes_sent": self.bytes_sent,
+            "messages_sent": self.messages_sent,
+            "send_errors": self.send_errors,
+            "last_send_ms": round(self.last_send_ms, 3),
+            "max_send_ms": round(self.max_send_ms, 3),
+            "ema_send_ms": round(self.ema_send_ms, 3),
+        }
+
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, channel: str = "alerts", binary_capable: bool = False, coalesce: bool = False):
+        self.channel = channel
+        # Set in the producer process of multi-process serving (frame_ring.RingPublisher):
+        # broadcasts are mirrored to the shared-memory ring for the web workers.
+        self.publisher = None
+        # Only channels that can encode alerts natively negotiate the binary subprotocol.
+        self.binary_capable = binary_capable
+        # Coalescing channels merge updates into at most one frame per client per `1 / max_rate` seconds.
+        self.coalesce = coalesce
+        self.encoders: Dict[int, WireEncoder] = {}
+        self.coalescers: Dict[int, ClientCoalescer] = {}
         self.active_connections: List[WebSocket] = []
         self.last_snapshot: List[str] = []
         self.last_update_time: datetime = datetime.min # Initialize with old time
+        # Bumped on every snapshot update; used as the ETag basis of GET /api/market/selection.
+        self.snapshot_version = 0
+        self.client_stats: Dict[int, ClientSendStats] = {}
+        self.subscriptions = SubscriptionIndex()
+        self.last_selection: List[SelectionEntry] = []
+        # Clients that asked for their own ranking over the cycle's candidates.
+        self.views = RankingViews()
+        # Latest {"type": "index"} message, replayed to new clients.
+        self.last_index_message: Optional[Dict[str, object]] = None
+        # Recent limit board break / reseal events, replayed to new clients as one message.
+        self.recent_limit_events: Deque[Dict[str, object]] = deque(maxlen=LIMIT_EVENT_HISTORY)
+        self._limit_seq = 0
+
+    async def _send_cached_messages(self, websocket: WebSocket) -> None:
+        encoder = self._encoder(websocket)
+        try:
+            if self.last_index_message is not None:
+                await self._send(websocket, encoder.message(self.last_index_message))
+            if self.recent_limit_events:
+                await self._send(websocket, encoder.message({"type": "limit", "data": list(self.recent_limit_events)}))
+        except Exception:
+            pass
 
     async def connect(self, websocket: WebSocket):
-        await websocket.accept()
+        subprotocol = None
+        if self.binary_capable:
+            scope = getattr(websocket, "scope", None) or {}
+            subprotocol = negotiate(scope.get("subprotocols") or [])
+        await websocket.accept(subprotocol=subprotocol)
+        encoder = encoder_for(subprotocol)
+        self.encoders[id(websocket)] = encoder
         self.active_connections.append(websocket)
-        logger.info(f"New WebSocket connection. Total: {len(self.active_connections)}")
-        
+        self.client_stats[id(websocket)] = ClientSendStats(websocket, encoder.name)
+        if self.coalesce:
+            query_params = getattr(websocket, "query_params", None) or {}
+            try:
+                max_rate = clamp_rate(query_params.get("max_rate"))
+            except ValueError:
+                max_rate = clamp_rate(None)
+            self.coalescers[id(websocket)] = ClientCoalescer(max_rate)
+        logger.info(f"New WebSocket connection ({encoder.name}). Total: {len(self.active_connections)}")
+
+        hello = encoder.hello()
+        if hello is not None:
+            await self._send(websocket, hello)
+            await self._send_cached_messages(websocket)
+            if self.last_selection:
+                for frame in encoder.alerts(self.last_selection):
+                    await self._send(websocket, frame)
+            return
+
+        await self._send_cached_messages(websocket)
         # Immediate PUSH: Send the last known state so the screen isn't empty (e.g. Closing Data)
-        if self.last_snapshot:
+        if self.last_snapshot and self.coalesce:
+            # One array frame instead of a burst; the frontend accepts both.
+            try:
+                await self._send(websocket, "[" + ",".join(self.last_snapshot) + "]")
+            except Exception:
+                pass
+        elif self.last_snapshot:
              logger.info(f"Pushing cached state ({len(self.last_snapshot)} items, time: {self.last_update_time}) to new client.")
-             # Send in bulk is better but our frontend handles stream. 
+             # Send in bulk is better but our frontend handles stream.
              # Let's send them rapidly.
              for msg in self.last_snapshot:
                  try:
-                    await websocket.send_text(msg)
+                    await self._send(websocket, msg)
                  except:
                     pass
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        self.client_stats.pop(id(websocket), None)
+        self.encoders.pop(id(websocket), None)
+        coalescer = self.coalescers.pop(id(websocket), None)
+        if coalescer is not None and coalescer.flush_handle is not None:
+            coalescer.flush_handle.cancel()
+        self.subscriptions.remove(id(websocket))
+        self.views.remove(id(websocket))
         logger.info(f"WebSocket disconnected. Total: {len(self.active_connections)}")
 
+    def _encoder(self, websocket: WebSocket) -> WireEncoder:
+        return self.encoders.get(id(websocket)) or WireEncoder()
+
+    async def _send(self, websocket: WebSocket, message: Union[str, bytes]) -> None:
+        started = time.perf_counter()
+        stats = self.client_stats.get(id(websocket))
+        try:
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_text(message)
+        except Exception:
+            metrics.inc("tidesonar_ws_send_errors_total")
+            if stats:
+                stats.send_errors += 1
+            raise
+        elapsed = time.perf_counter() - started
+        metrics.observe("tidesonar_ws_send_seconds", elapsed)
+        size = len(message) if isinstance(message, bytes) else len(message.encode("utf-8"))
+        metrics.inc("tidesonar_ws_bytes_total", size, format="msgpack" if isinstance(message, bytes) else "json")
+        if stats:
+            stats.record(elapsed)
+            stats.bytes_sent += size
+
+    def _queue(
+        self,
+        websocket: WebSocket,
+        entries: List[SelectionEntry],
+        messages: Optional[Dict[str, Dict[str, object]]] = None,
+        view: bool = False,
+    ) -> None:
+        coalescer = self.coalescers.get(id(websocket))
+        if coalescer is None:
+            return
+        coalescer.add_alerts(entries)
+        coalescer.view_pending |= view
+        for key, payload in (messages or {}).items():
+            coalescer.add_message(key, payload)
+        if coalescer.has_pending() and coalescer.flush_handle is None:
+            coalescer.flush_handle = asyncio.create_task(self._flush_after(websocket, coalescer, coalescer.delay()))
+
+    async def _flush_after(self, websocket: WebSocket, coalescer: ClientCoalescer, delay: float) -> None:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        coalescer.flush_handle = None
+        entries, messages, superseded, view_pending = coalescer.drain()
+        view = self.views.delta(id(websocket)) if view_pending else None
+        frame = self._encoder(websocket).batch(entries, messages, view)
+        if superseded:
+            metrics.inc("tidesonar_ws_coalesced_total", superseded)
+        if frame is None:
+            return
+        try:
+            await self._send(websocket, frame)
+        except Exception as e:
+            logger.error(f"Error sending coalesced frame: {e}")
+            return
+        metrics.inc("tidesonar_ws_messages_total", len(entries), kind="alert")
+        if messages:
+            metrics.inc("tidesonar_ws_messages_total", len(messages), kind="quote")
+        if view is not None:
+            metrics.inc("tidesonar_ws_messages_total", kind="view")
+
     def update_snapshot(self, alerts_json_list: List[str]):
         """
         Update the cached state with the latest batch.
         """
         self.last_snapshot = alerts_json_list
+        self.last_selection = []
+        self.snapshot_version += 1
         self.last_update_time = datetime.now()
 
+    async def handle_client_message(self, websocket: WebSocket, raw: Optional[Union[str, bytes]]) -> None:
+        """
+        Subscription protocol (JSON text frames, or msgpack binary frames on the
+        binary subprotocol; anything else is treated as a heartbeat):
+        {"action": "subscribe" | "unsubscribe", "codes": [], "indices": [], "industries": [], "min_score": 0}
+        {"action": "reset"} -> back to the full stream
+        {"action": "rate", "max_rate": 1} -> frames per second (coalescing channels only)
+        {"action": "view", "strategy": "", "weights": {}, "per_index": 30, "indices": []} -> own ranking (see RankingViews)
+        {"action": "unview"} -> back to the shared stream
+        """
+        try:
+            message = MsgpackEncoder.decode(raw) if isinstance(raw, bytes) else json.loads(raw or "")
+        except Exception:
+            return
+        if not isinstance(message, dict) or "action" not in message:
+            return
+
+        client_id = id(websocket)
+        encoder = self._encoder(websocket)
+        coalescer = self.coalescers.get(client_id)
+        if message["action"] == "rate" and coalescer is not None:
+            try:
+                coalescer.set_rate(clamp_rate(message.get("max_rate")))
+            except ValueError as exc:
+                await self._send(websocket, encoder.message({"type": "error", "detail": str(exc)}))
+                return
+            await self._send(websocket, encoder.message({"type": "rate", "max_rate": round(coalescer.max_rate, 3)}))
+            return
+        if message["action"] in ("view", "unview"):
+            await self._apply_view(websocket, message)
+            return
+        try:
+            client_filter = self.subscriptions.apply(client_id, message)
+        except ValueError as exc:
+            await self._send(websocket, encoder.message({"type": "error", "detail": str(exc)}))
+            return
+        ack: Dict[str, object] = {"type": "subscription", "filter": client_filter.to_dict()}
+        if client_filter.codes and ring_name_from_env():
+            # Quote messages and warm-tier promotion run in the producer process, which never sees this filter.
+            ack["quotes"] = False
+        await self._send(websocket, encoder.message(ack))
+
+        # Re-send the current selection through the new filter so the view is populated immediately.
+        if self.subscriptions.is_filtered(client_id):
+            matching = [entry for entry in self.last_selection if client_filter.matches(entry[0], entry[2])]
+            if coalescer is not None:
+                self._queue(websocket, matching)
+                return
+            for frame in encoder.alerts(matching):
+                await self._send(websocket, frame)
+
+    async def _apply_view(self, websocket: WebSocket, message: Dict[str, object]) -> None:
+        client_id = id(websocket)
+        encoder = self._encoder(websocket)
+        if client_id not in self.coalescers:
+            await self._send(websocket, encoder.message({"type": "error", "detail": "Ranking views are not available on this channel"}))
+            return
+        if message["action"] == "unview":
+            self.views.remove(client_id)
+            await self._send(websocket, encoder.message({"type": "view", "view": None}))
+            client_filter = self.subscriptions.filters.get(client_id)
+            self._queue(websocket, [entry for entry in self.last_selection if client_filter is None or client_filter.matches(entry[0], entry[2])])
+            return
+        try:
+            self.views.set(client_id, message)
+        except ValueError as exc:
+            await self._send(websocket, encoder.message({"type": "error", "detail": str(exc)}))
+            return
+        # The first view message is a full one, sent on the next flush.
+        self._queue(websocket, [], view=True)
+
+    def client_count(self) -> int:
+        """Connected clients, including those held by web workers in multi-process mode."""
+        remote = self.publisher.remote_clients(self.channel) if self.publisher is not None else 0
+        return len(self.active_connections) + remote
+
     def has_data(self) -> bool:
         return len(self.last_snapshot) > 0
-    
+
     def is_data_stale(self) -> bool:
         """
         Check if data is too old (e.g. from before today's close).
@@ -52,24 +316,165 @@ class ConnectionManager:
         now = datetime.now()
         # Closing time today
         closing_time = now.replace(hour=15, minute=0, second=0, microsecond=0)
-        
+
         # If we are past closing time
         if now > closing_time:
             # If data is older than closing time (e.g. 13:00 vs 15:00), it's stale
             if self.last_update_time < closing_time:
                 return True
-        
+
         return False
 
+    def get_client_stats(self) -> List[Dict[str, object]]:
+        result = []
+        for client_id, stats in self.client_stats.items():
+            client_filter = self.subscriptions.filters.get(client_id)
+            coalescer = self.coalescers.get(client_id)
+            result.append({
+                **stats.to_dict(),
+                "max_rate": round(coalescer.max_rate, 3) if coalescer else None,
+                "subscription": client_filter.to_dict() if client_filter else None,
+                "view": self.views.describe(client_id),
+            })
+        return result
+
     async def broadcast(self, message: str):
+        if self.publisher is not None:
+            self.publisher.publish(self.channel, message)
         # Broadcast message to all connected clients
         # Iterate over a copy to avoid modification issues during iteration if disconnects happen (though remove happened in storage)
         # Actually safe to iterate here usually, but try/except essential for stale connections
         for connection in self.active_connections:
             try:
-                await connection.send_text(message)
+                await self._send(connection, message)
             except Exception as e:
                 logger.error(f"Error sending message: {e}")
                 # Real cleanup might happen in the endpoint handler but safe to just log here
 
-manager = ConnectionManager()
+    async def broadcast_selection(self, candidates: List[SelectionEntry], context: Optional[Dict[str, object]] = None) -> None:
+        """
+        Push one cycle's ranked candidates (grouped by index, best first).
+        The shared stream is the top DEFAULT_ITEMS_PER_INDEX per index:
+        unfiltered clients get every alert of it, subscribed clients only the
+        alerts routed to them by the inverted index. Clients with a ranking
+        view get a view delta over all candidates instead. On coalescing
+        channels the updates are queued and merged per client. `context` is
+        the scoring part of the runtime policy, used by views.
+        """
+        entries = default_selection(candidates)
+        self.update_snapshot([payload for _, payload, _ in entries])
+        self.last_selection = entries
+        self.views.update(candidates, context or {})
+        if self.publisher is not None:
+            self.publisher.publish_selection(self.channel, candidates, context)
+        routed = self.subscriptions.route(entries) if self.subscriptions.filters else {}
+
+        for connection in list(self.active_connections):
+            client_id = id(connection)
+            if self.views.has_view(client_id):
+                self._queue(connection, [], view=True)
+                continue
+            selected = routed.get(client_id, []) if self.subscriptions.is_filtered(client_id) else entries
+            if client_id in self.coalescers:
+                self._queue(connection, selected)
+                continue
+            frames = self._encoder(connection).alerts(selected)
+            for frame in frames:
+                try:
+                    await self._send(connection, frame)
+                except Exception as e:
+                    logger.error(f"Error sending message: {e}")
+                    break
+            metrics.inc("tidesonar_ws_messages_total", len(selected), kind="alert")
+
+    async def send_quotes(self, snapshot: List[StockData], alert_codes: Container[str]) -> None:
+        """Quote messages for explicitly watched codes that are not currently alerts."""
+        if not self.subscriptions.by_code:
+            return
+        by_socket = {id(connection): connection for connection in self.active_connections}
+        for stock in snapshot:
+            subscribers = self.subscriptions.quote_subscribers(stock.code)
+            if not subscribers or stock.code in alert_codes:
+                continue
+            payload = {
+                "type": "quote",
+                "code": stock.code,
+                "name": stock.name,
+                "price": stock.price,
+                "pct_chg": stock.pct_chg,
+                "amount": stock.amount,
+                "volume": stock.volume,
+                "index_code": stock.index_code,
+                "industry": stock.industry,
+                "timestamp": stock.timestamp.isoformat(),
+            }
+            for client_id in subscribers:
+                connection = by_socket.get(client_id)
+                if connection is None:
+                    continue
+                if client_id in self.coalescers:
+                    self._queue(connection, [], {f"quote:{stock.code}": payload})
+                    continue
+                try:
+                    await self._send(connection, self._encoder(connection).message(payload))
+                    metrics.inc("tidesonar_ws_messages_total", kind="quote")
+                except Exception as e:
+                    logger.error(f"Error sending quote: {e}")
+
+    async def send_index(self, payload: Dict[str, object]) -> None:
+        """Index-level ticks: one small message to every client, independent of subscriptions."""
+        self.last_index_message = payload
+        if self.publisher is not None:
+            self.publisher.publish("index", json.dumps(payload, ensure_ascii=False))
+        for connection in list(self.active_connections):
+            if id(connection) in self.coalescers:
+                # Keyed, so a client that is rate-limited only gets the newest ticks.
+                self._queue(connection, [], {"index": payload})
+                continue
+            try:
+                await self._send(connection, self._encoder(connection).message(payload))
+                metrics.inc("tidesonar_ws_messages_total", kind="index")
+            except Exception as e:
+                logger.error(f"Error sending index ticks: {e}")
+
+    async def send_limit_events(self, payload: Dict[str, object]) -> None:
+        """Limit board breaks / reseals: a distinct `{"type": "limit"}` message to every client."""
+        self.recent_limit_events.extend(payload.get("data") or [])
+        if self.publisher is not None:
+            self.publisher.publish("limit", json.dumps(payload, ensure_ascii=False))
+        self._limit_seq += 1
+        for connection in list(self.active_connections):
+            if id(connection) in self.coalescers:
+                # Events are not snapshots: a unique key so coalescing never drops one.
+                self._queue(connection, [], {f"limit:{self._limit_seq}": payload})
+                continue
+            try:
+                await self._send(connection, self._encoder(connection).message(payload))
+                metrics.inc("tidesonar_ws_messages_total", kind="limit")
+            except Exception as e:
+                logger.error(f"Error sending limit events: {e}")
+
+    async def publish_alert(self, data: str) -> None:
+        """Alert JSON from an external publisher (Redis), routed like producer alerts."""
+        if not self.coalesce:
+            await self.broadcast(data)
+            return
+        try:
+            alert = StockAlert.model_validate_json(data)
+        except ValueError:
+            await self.broadcast(data)
+            return
+        # External alerts carry no ranking score, so `min_score` filters skip them.
+        entry: SelectionEntry = (alert, data, 0.0)
+        routed = self.subscriptions.route([entry]) if self.subscriptions.filters else {}
+        for connection in list(self.active_connections):
+            client_id = id(connection)
+            if client_id not in self.coalescers or self.views.has_view(client_id):
+                continue
+            selected = routed.get(client_id, []) if self.subscriptions.is_filtered(client_id) else [entry]
+            if selected:
+                self._queue(connection, selected)
+
+manager = ConnectionManager("alerts", binary_capable=True, coalesce=True)
+# Separate channel for the throttled sector heat map frames (/ws/heatmap).
+heatmap_manager = ConnectionManager("heatmap")
@@ -0,0 +1,174 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Union
+
+try:
+    import msgpack
+except ImportError:  # optional: the binary subprotocol is only offered when installed
+    msgpack = None
+
+from backend.app.services.subscriptions import SelectionEntry
+
+SUBPROTOCOL_JSON = "tidesonar.json"
+SUBPROTOCOL_MSGPACK = "tidesonar.msgpack.v1"
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
+
+# Row layout of binary alert frames. String columns are ids into the per-connection dictionary.
+ALERT_FIELDS = ("code", "name_id", "price", "pct_chg", "amount", "volume_ratio", "index_id", "industry_id", "concept_id", "ts", "excess_pct", "book")
+# "book" is [bid1, ask1, imbalance, spread_bps] for order-book enriched alerts, else nil.
+BOOK_FIELDS = ("bid1", "ask1", "imbalance", "spread_bps")
+
+Frame = Union[str, bytes]
+
+
+def supported_subprotocols() -> List[str]:
+    protocols = [SUBPROTOCOL_JSON]
+    if msgpack is not None:
+        protocols.append(SUBPROTOCOL_MSGPACK)
+    return protocols
+
+
+def negotiate(offered: Sequence[str]) -> Optional[str]:
+    """First supported subprotocol in the client's preference order (None -> plain JSON)."""
+    supported = supported_subprotocols()
+    for protocol in offered:
+        if protocol in supported:
+            return protocol
+    return None
+
+
+class WireEncoder:
+    """Default JSON encoding: one alert per text frame, as the frontend expects."""
+
+    name = "json"
+
+    def hello(self) -> Optional[Frame]:
+        return None
+
+    def alerts(self, entries: List[SelectionEntry]) -> List[Frame]:
+        return [payload for _, payload, _ in entries]
+
+    def message(self, payload: Dict[str, object]) -> Frame:
+        return json.dumps(payload, ensure_ascii=False)
+
+    def batch(self, entries: List[SelectionEntry], messages: List[Dict[str, object]], view: Optional[Dict[str, object]] = None) -> Optional[Frame]:
+        """One coalesced frame: a JSON array of alert objects followed by other messages."""
+        if not entries and not messages and view is None:
+            return None
+        items = [payload for _, payload, _ in entries]
+        items.extend(json.dumps(message, ensure_ascii=False) for message in messages)
+        if view is not None:
+            items.append(self.view(view))
+        return "[" + ",".join(items) + "]"
+
+    def view(self, delta: Dict[str, object]) -> str:
+        """Ranking view message; upserted alerts are spliced in as their cached JSON."""
+        lists = []
+        for index_code, part in delta["lists"].items():  # type: ignore[union-attr]
+            fields = ['"upsert":[' + ",".join(payload for _, payload, _ in part["upsert"]) + "]"]
+            if "order" in part:
+                fields.append('"order":' + json.dumps(part["order"]))
+            lists.append(json.dumps(index_code, ensure_ascii=False) + ":{" + ",".join(fields) + "}")
+        head = json.dumps({key: value for key, value in delta.items() if key != "lists"}, ensure_ascii=False)
+        return head[:-1] + ',"lists":{' + ",".join(lists) + "}}"
+
+
+class MsgpackEncoder(WireEncoder):
+    """
+    Compact binary encoding for one connection.
+
+    A cycle's alerts go out as a single frame `["a", seq, new_strings, rows]`:
+    rows follow ALERT_FIELDS, names/indices/industries/concepts are sent once
+    as `[id, text]` pairs and referenced by id afterwards, floats are single
+    precision and `reason` is omitted (it is derived from the row). Any other
+    message is the msgpack form of its JSON object; coalesced frames append
+    those objects as a fifth element.
+    """
+
+    name = "msgpack"
+
+    def __init__(self):
+        self.strings: Dict[str, int] = {}
+        self.seq = 0
+
+    def _ref(self, value: Optional[str], new_strings: List[list]) -> int:
+        value = value or ""
+        string_id = self.strings.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings[value] = string_id
+            new_strings.append([string_id, value])
+        return string_id
+
+    def _pack(self, payload: object) -> bytes:
+        return msgpack.packb(payload, use_single_float=True)
+
+    def hello(self) -> Frame:
+        return self._pack({"type": "hello", "format": SUBPROTOCOL_MSGPACK, "fields": list(ALERT_FIELDS)})
+
+    def alerts(self, entries: List[SelectionEntry]) -> List[Frame]:
+        if not entries:
+            return []
+        return [self._pack(self._alert_frame(entries))]
+
+    def batch(self, entries: List[SelectionEntry], messages: List[Dict[str, object]], view: Optional[Dict[str, object]] = None) -> Optional[Frame]:
+        if not entries and not messages and view is None:
+            return None
+        if view is not None:
+            messages = messages + [self._view_object(view)]
+        return self._pack(self._alert_frame(entries) + [messages])
+
+    def _view_object(self, delta: Dict[str, object]) -> Dict[str, object]:
+        """View message with upserts as rows; strings first used here come in its own `strings`."""
+        new_strings: List[list] = []
+        lists = {}
+        for index_code, part in delta["lists"].items():  # type: ignore[union-attr]
+            lists[index_code] = {"rows": self._rows(part["upsert"], new_strings)}
+            if "order" in part:
+                lists[index_code]["order"] = part["order"]
+        return {**{key: value for key, value in delta.items() if key != "lists"}, "strings": new_strings, "lists": lists}
+
+    def view(self, delta: Dict[str, object]) -> Frame:
+        return self._pack(self._view_object(delta))
+
+    def _alert_frame(self, entries: List[SelectionEntry]) -> list:
+        self.seq += 1
+        new_strings: List[list] = []
+        return ["a", self.seq, new_strings, self._rows(entries, new_strings)]
+
+    def _rows(self, entries: List[SelectionEntry], new_strings: List[list]) -> List[list]:
+        rows = []
+        for alert, _, _ in entries:
+            try:
+                ts = int(datetime.fromisoformat(alert.timestamp).timestamp())
+            except ValueError:
+                ts = 0
+            rows.append([
+                alert.code,
+                self._ref(alert.name, new_strings),
+                alert.price,
+                alert.pct_chg,
+                int(round(alert.amount)),
+                alert.volume_ratio,
+                self._ref(alert.index_code, new_strings),
+                self._ref(alert.industry, new_strings),
+                self._ref(alert.concept, new_strings),
+                ts,
+                alert.excess_pct,
+                [alert.order_book[key] for key in BOOK_FIELDS] if alert.order_book else None,
+            ])
+        return rows
+
+    def message(self, payload: Dict[str, object]) -> Frame:
+        return self._pack(payload)
+
+    @staticmethod
+    def decode(frame: bytes) -> object:
+        return msgpack.unpackb(frame)
+
+
+def encoder_for(subprotocol: Optional[str]) -> WireEncoder:
+    if subprotocol == SUBPROTOCOL_MSGPACK and msgpack is not None:
+        return MsgpackEncoder()
+    return WireEncoder()
@@ -17,8 +17,12 @@ async def test_websocket_client():
                 try:
                     message = await asyncio.wait_for(websocket.recv(), timeout=10.0)
                     data = json.loads(message)
-                    print(f"[{time.strftime('%H:%M:%S')}] Received Alert: {data['code']} {data['name']} ({data['pct_chg']}%)")
-                    count += 1
+                    # Coalesced frames are JSON arrays of alerts
+                    for item in data if isinstance(data, list) else [data]:
+                        if "code" not in item or "pct_chg" not in item:
+                            continue
+                        print(f"[{time.strftime('%H:%M:%S')}] Received Alert: {item['code']} {item['name']} ({item['pct_chg']}%)")
+                        count += 1
                 except asyncio.TimeoutError:
                     print("Waiting for data...")
             
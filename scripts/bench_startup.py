@@ -0,0 +1,82 @@
+"""
+Startup benchmark: start the backend N times and report how long it takes to
+accept connections and to finish warmup, plus the per-phase breakdown from
+GET /api/runtime/startup.
+
+Usage (from the repository root):
+    python scripts/bench_startup.py --runs 5 --port 8899
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+
+def wait_for(url: str, deadline: float, predicate=lambda resp: resp.status_code == 200):
+    while time.perf_counter() < deadline:
+        try:
+            resp = requests.get(url, timeout=0.5)
+            if predicate(resp):
+                return resp
+        except requests.RequestException:
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def run_once(port: int, timeout: float):
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = started + timeout
+        if wait_for(f"{base}/", deadline) is None:
+            raise RuntimeError("server did not start accepting connections")
+        accepting = time.perf_counter() - started
+        resp = wait_for(f"{base}/api/runtime/startup", deadline, lambda r: r.status_code == 200 and r.json().get("ready"))
+        if resp is None:
+            raise RuntimeError("warmup did not finish")
+        ready = time.perf_counter() - started
+        return accepting, ready, resp.json()
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend startup time")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    accepting_times, ready_times = [], []
+    phase_times = {}
+    for run in range(1, args.runs + 1):
+        accepting, ready, report = run_once(args.port, args.timeout)
+        accepting_times.append(accepting)
+        ready_times.append(ready)
+        for phase in report["phases"]:
+            phase_times.setdefault(phase["name"], []).append(phase["seconds"])
+        print(f"run {run}: accepting {accepting:.3f}s, ready {ready:.3f}s")
+
+    print("-" * 48)
+    print(f"{'accepting connections':<28}{statistics.median(accepting_times):>10.3f}s (median)")
+    print(f"{'warmup finished':<28}{statistics.median(ready_times):>10.3f}s (median)")
+    print("phases (median, in-process):")
+    for name, values in phase_times.items():
+        print(f"  {name:<26}{statistics.median(values):>10.3f}s")
+
+
+if __name__ == "__main__":
+    main()